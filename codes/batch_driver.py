@@ -0,0 +1,181 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+from lists_texts_extractor import extract_lists_texts
+from candidates_extractor_ranker import extract_rank_candidates, read_srqg_ltr_data, read_srqg_gen_data, \
+    prefetch_unranked_kb_terms
+from model_registry import warm_up
+from page_fetcher import PageFetcher
+from page_filter import PageFilter, max_page_bytes
+from html_cache import HTMLCache
+from bing_store import open_bing_store
+from pipeline_metrics import PipelineMetrics
+from warc_reader import WARCArchive
+from utils import read_evaluation_data
+from config import *
+
+# parallel and resumable batch driver: shards the queries of a dataset across worker processes
+# a killed run is simply started again, extraction resumes each query from its manifest at url granularity,
+# ranking skips queries whose result files exist, the failed jobs are saved so that they can be run again alone
+
+datasets = ['eval', 'srqg-ltr', 'srqg-gen']
+stages = ['extract', 'rank']
+
+# per worker process resources of the extract stage, built once by init_worker
+worker_fetcher = None
+worker_html_cache = None
+worker_metrics = None
+worker_archive = None
+worker_bing_stores = {}  # {top results path: Bing store of the dataset or None}
+
+
+def init_worker(stage, warc_index='', page_filter=None):
+    global worker_fetcher, worker_html_cache, worker_metrics, worker_archive
+    if stage != 'extract':
+        return
+    worker_fetcher = PageFetcher(page_filter=page_filter)
+    worker_html_cache = HTMLCache()
+    worker_metrics = PipelineMetrics()  # metrics files of each worker, named by its pid
+    if warc_index != '':
+        worker_archive = WARCArchive(warc_index)
+    Finalize(None, close_worker, exitpriority=10)  # run when the worker process exits
+
+
+def close_worker():
+    worker_fetcher.close()
+    worker_html_cache.close()
+    worker_metrics.close()
+    if worker_archive is not None:
+        worker_archive.close()
+    for bing_store in worker_bing_stores.values():
+        if bing_store is not None:
+            bing_store.close()
+
+
+def get_bing_store(top_results_path):
+    # opened on first use in each worker process, sqlite connections are not shared across processes
+    if top_results_path not in worker_bing_stores:
+        worker_bing_stores[top_results_path] = open_bing_store(top_results_path)
+    return worker_bing_stores[top_results_path]
+
+
+def get_jobs(dataset):
+    # (query, items, top results path, candidates path) of each query of a dataset
+    jobs = []
+    if dataset == 'eval':
+        o_queries, o_items, l_queries, l_items, d_queries, d_items = read_evaluation_data()
+        for i in range(100):
+            jobs.append((o_queries[i], o_items[i], top_results_overall_good_path, overall_good_candidates_path))
+        for i in range(100):
+            jobs.append((l_queries[i], l_items[i], top_results_query_log_path, query_log_candidates_path))
+        for i in range(100):
+            jobs.append((d_queries[i], d_items[i], top_results_query_dimension_path, query_dimension_candidates_path))
+    elif dataset == 'srqg-ltr':
+        query_set, items_set = read_srqg_ltr_data()
+        for i in range(min(400, len(query_set))):
+            jobs.append((query_set[i], items_set[i], top_results_srqg_ltr_path, srqg_ltr_candidates_path))
+    elif dataset == 'srqg-gen':
+        query_set, items_set = read_srqg_gen_data()
+        for i in range(len(query_set)):
+            jobs.append((query_set[i], items_set[i], top_results_srqg_gen_path, srqg_gen_candidates_path))
+    return jobs
+
+
+def run_job(job, stage, dump_files=False, extractor='prettify', full_feature=False, near_duplicates='off',
+            deadline=None, region_target=None, semantic_features=False):
+    query, items, top_results_path, candidates_path = job
+    if stage == 'extract':
+        extract_lists_texts(query, items, top_results_path, worker_fetcher, worker_html_cache, dump_files, extractor,
+                            get_bing_store(top_results_path), worker_metrics, worker_archive, near_duplicates,
+                            deadline, region_target)
+    elif stage == 'rank':
+        extract_rank_candidates(query, items, top_results_path, candidates_path, full_feature, semantic_features)
+    return query
+
+
+def run_batch(jobs, stage='extract', workers=4, dump_files=False, extractor='prettify', full_feature=False,
+              warc_index='', near_duplicates='off', deadline=None, region_target=None, semantic_features=False,
+              page_filter=None):
+    # run stage on all jobs with a pool of worker processes, return the failed jobs
+    # page_filter: PageFilter of the downloaded pages, the default one (no language filter nor byte cap) if None
+    start = time.time()
+    failed = []
+    if stage == 'rank':
+        # knowledge-base descriptions of the queries left and the NLP models are loaded before the pool starts,
+        # forked workers inherit them
+        prefetch_unranked_kb_terms([job[0] for job in jobs], [job[1] for job in jobs], [job[3] for job in jobs])
+        warm_up()
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(stage, warc_index, page_filter)) as executor:
+        futures = {}
+        for job in jobs:
+            future = executor.submit(run_job, job, stage, dump_files, extractor, full_feature, near_duplicates,
+                                     deadline, region_target, semantic_features)
+            futures[future] = job
+        done = 0
+        for future in as_completed(futures):
+            done += 1
+            job = futures[future]
+            try:
+                future.result()
+                print(done, '/', len(jobs), stage, 'finished:', job[0])
+            except Exception as e:
+                failed.append(job)
+                print(done, '/', len(jobs), stage, 'Error:', job[0], type(e).__name__, e)
+    print(stage, len(jobs) - len(failed), 'queries finished,', len(failed), 'failed, time:',
+          format(time.time() - start, '.1f'), 's')
+    return failed
+
+
+def save_jobs(jobs, path):
+    # one job per JSON line, a job list replaces the dataset of a later run with --jobs
+    with open(path, 'w', encoding='utf-8') as f:
+        for job in jobs:
+            f.write(json.dumps(list(job), ensure_ascii=False) + '\n')
+
+
+def load_jobs(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [tuple(json.loads(line)) for line in f if line.strip() != '']
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='extract or rank candidates of a dataset in parallel')
+    arg_parser.add_argument('--dataset', choices=datasets, default='eval')
+    arg_parser.add_argument('--stage', choices=stages, default='extract')
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument('--extractor', choices=['prettify', 'dom'], default='prettify')
+    arg_parser.add_argument('--dump-files', action='store_true')
+    arg_parser.add_argument('--full-feature', action='store_true')
+    arg_parser.add_argument('--semantic-features', action='store_true', help='compute the BERT features of ranking')
+    arg_parser.add_argument('--warc-index', default='', help='url index of WARC crawl dumps, see warc_reader.py')
+    arg_parser.add_argument('--near-duplicates', choices=['skip', 'collapse', 'off'], default='off',
+                            help='collapse near-duplicate pages of a query onto the first one, or skip them '
+                                 '(their regions are lost)')
+    arg_parser.add_argument('--deadline', type=float, default=None, help='seconds per query')
+    arg_parser.add_argument('--region-target', type=int, default=None,
+                            help='stop a query once this many query-text and item-list regions are extracted')
+    arg_parser.add_argument('--english-only', action='store_true', help='drop pages that are not English')
+    arg_parser.add_argument('--max-page-bytes', type=int, default=None,
+                            help='truncate larger pages, e.g. ' + str(max_page_bytes))
+    arg_parser.add_argument('--jobs', default='',
+                            help='run the jobs of a file saved by --failed instead of the dataset')
+    arg_parser.add_argument('--failed', default='',
+                            help='file receiving the failed jobs, ../data/<dataset>_<stage>_failed.jsonl by default')
+    args = arg_parser.parse_args()
+
+    jobs = load_jobs(args.jobs) if args.jobs != '' else get_jobs(args.dataset)
+    failed_path = args.failed if args.failed != '' else '../data/' + args.dataset + '_' + args.stage + '_failed.jsonl'
+    failed = run_batch(jobs, args.stage, args.workers, args.dump_files, args.extractor, args.full_feature,
+                       args.warc_index, args.near_duplicates, args.deadline, args.region_target,
+                       args.semantic_features, PageFilter(args.max_page_bytes, args.english_only))
+    if len(failed) > 0:
+        save_jobs(failed, failed_path)
+        print('failed jobs saved to', failed_path, ', run them again with --jobs', failed_path)
+    elif os.path.exists(failed_path):
+        os.remove(failed_path)  # failures of an earlier run, all done now
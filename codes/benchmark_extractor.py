@@ -0,0 +1,110 @@
+import argparse
+import json
+import time
+from lists_texts_extractor import HTMLAnalyzer, ListExtractor, TextExtractor, iter_pages
+from pipeline_metrics import Histogram
+from replay import ReplayArchive, ReplayFetcher
+
+# benchmark of the extractor on a recorded corpus (see replay.py), repeatable offline:
+# pages/sec of the whole pipeline and time per stage of HTMLAnalyzer, ListExtractor and TextExtractor
+
+benchmark_stages = ['fetch', 'preprocess', 'content', 'segment', 'list_match', 'text_match']
+
+
+def timed(histograms, stage, function, *args):
+    start = time.time()
+    result = function(*args)
+    histograms[stage].add((time.time() - start) * 1000)
+    return result
+
+
+def benchmark_page(query, items, result, modes, histograms, extractor, list_extractor, text_extractor):
+    # the stages of analyze_url and extract_url_regions, each timed on its own
+    query_no_id = query.split('_')[0]
+    html_analyzer = HTMLAnalyzer(result.url, '0', '', query_no_id, items, result.html)
+    if extractor == 'dom':
+        lists, lists_descs, texts = timed(histograms, 'segment', html_analyzer.extract_lists_texts_dom)
+    else:
+        timed(histograms, 'preprocess', html_analyzer.html_pre_process)
+        timed(histograms, 'content', html_analyzer.html_get_content)
+        lists, lists_descs, texts = timed(histograms, 'segment', html_analyzer.extract_lists_texts_of_url)
+    regions = 0
+    for query_or_items, _ in modes:
+        if query_or_items in ['query', 'query_items']:
+            regions += len(timed(histograms, 'text_match', text_extractor.get_query_candidates_region, query_no_id,
+                                 texts))
+        if query_or_items in ['query_items', 'items']:
+            regions += len(timed(histograms, 'list_match', list_extractor.get_items_candidates_region, items, lists,
+                                 lists_descs))
+            regions += len(timed(histograms, 'text_match', text_extractor.get_items_candidates_region, items, texts))
+    return regions
+
+
+def run_benchmark(archive, extractor='prettify', latency=0.0, latency_jitter=0.0, error_rate=0.0, seed=0,
+                  repeat=1, max_queries=0):
+    histograms = {stage: Histogram() for stage in benchmark_stages}
+    fetcher = ReplayFetcher(archive, latency, latency_jitter, error_rate, seed)
+    queries = list(fetcher.archive.queries)
+    if max_queries > 0:
+        queries = queries[:max_queries]
+    pages = 0
+    errors = 0
+    regions = 0
+    start = time.time()
+    for _ in range(repeat):
+        for query in queries:
+            items = fetcher.archive.queries[query]['items']
+            url_modes = fetcher.archive.queries[query]['urls']
+            list_extractor = ListExtractor()
+            text_extractor = TextExtractor()
+            for result in iter_pages(list(url_modes), fetcher):
+                histograms['fetch'].add(result.elapsed * 1000)
+                if result.error is not None:
+                    errors += 1
+                    continue
+                try:
+                    regions += benchmark_page(query, items, result, url_modes[result.url], histograms, extractor,
+                                              list_extractor, text_extractor)
+                    pages += 1
+                except Exception:
+                    errors += 1
+    elapsed = time.time() - start
+    fetcher.close()
+    return {'extractor': extractor, 'queries': len(queries) * repeat, 'pages': pages, 'errors': errors,
+            'regions': regions, 'elapsed_s': round(elapsed, 2),
+            'pages_per_s': round(pages / elapsed, 2) if elapsed > 0 else 0,
+            'stages': {stage: histograms[stage].to_dict() for stage in benchmark_stages}}
+
+
+def print_report(report):
+    print('extractor:', report['extractor'], '  queries:', report['queries'], '  pages:', report['pages'],
+          '  errors:', report['errors'], '  regions:', report['regions'])
+    print('time:', report['elapsed_s'], 's   pages/sec:', report['pages_per_s'])
+    total = sum([report['stages'][stage]['total_ms'] for stage in benchmark_stages if stage != 'fetch'])
+    print('%-12s %8s %10s %9s %8s %8s %7s' % ('stage', 'calls', 'total_s', 'mean_ms', 'p50_ms', 'p90_ms', 'share%'))
+    for stage in benchmark_stages:
+        s = report['stages'][stage]
+        share = '' if stage == 'fetch' or total == 0 else format(100 * s['total_ms'] / total, '.1f')
+        print('%-12s %8d %10.2f %9.2f %8s %8s %7s' % (stage, s['count'], s['total_ms'] / 1000, s['mean_ms'],
+                                                      s['p50_ms'], s['p90_ms'], share))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='benchmark the extractor on a recorded corpus')
+    arg_parser.add_argument('--archive', default='../data/replay_eval.jsonl.gz')
+    arg_parser.add_argument('--extractor', choices=['prettify', 'dom'], default='prettify')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per page')
+    arg_parser.add_argument('--latency-jitter', type=float, default=0.0)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='share of pages failing with a timeout')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    arg_parser.add_argument('--max-queries', type=int, default=0, help='0 for all queries')
+    arg_parser.add_argument('--output', default='', help='also save the report as JSON')
+    args = arg_parser.parse_args()
+
+    report = run_benchmark(ReplayArchive(args.archive), args.extractor, args.latency, args.latency_jitter,
+                           args.error_rate, args.seed, args.repeat, args.max_queries)
+    print_report(report)
+    if args.output != '':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
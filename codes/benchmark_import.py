@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# startup benchmark: wall time, import time (python -X importtime) and peak RSS of importing each module
+# in a fresh interpreter, with the heaviest packages it pulls in, to keep tool and worker startup fast
+
+benchmark_modules = ['candidates_extractor_ranker', 'batch_driver', 'lists_texts_extractor', 'kb_index',
+                     'model_registry']
+import_code = 'import resource, %s; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+
+
+def parse_importtime(stderr):
+    # [(module, cumulative us, nesting depth)] of an -X importtime log
+    imports = []
+    for line in stderr.split('\n'):
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) < 3:
+            continue
+        name = fields[2].strip()
+        imports.append((name, int(fields[1]), (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2))
+    return imports
+
+
+def heaviest_packages(imports, module, count=5):
+    # [(package, cumulative us)] of the slowest packages imported by module, submodules counted in their package
+    packages = {}
+    for name, us, _ in imports:
+        package = name.split('.')[0]
+        if package != module:
+            packages[package] = max(packages.get(package, 0), us)
+    return sorted(packages.items(), key=lambda package: package[1], reverse=True)[:count]
+
+
+def time_import(module):
+    start = time.time()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', import_code % module], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed = time.time() - start
+    if process.returncode != 0:
+        return {'error': process.stderr.strip().split('\n')[-1]}
+    imports = parse_importtime(process.stderr)
+    return {'wall_s': elapsed, 'import_s': sum([us for _, us, depth in imports if depth == 0]) / 1000000,
+            'max_rss_mb': int(process.stdout.split()[-1]) / 1024,  # ru_maxrss is in kB on Linux
+            'heaviest': [[package, us / 1000000] for package, us in heaviest_packages(imports, module)]}
+
+
+def run_benchmark(modules, repeat=3):
+    # best of repeat runs of each module, later runs have warm OS file caches
+    report = {}
+    for module in modules:
+        runs = [time_import(module) for _ in range(repeat)]
+        if 'error' in runs[0]:
+            report[module] = runs[0]
+            continue
+        report[module] = min(runs, key=lambda run: run['wall_s'])
+    return report
+
+
+def print_report(report):
+    print('%-30s %8s %9s %8s   %s' % ('module', 'wall_s', 'import_s', 'rss_mb', 'heaviest imports (s)'))
+    for module in report:
+        r = report[module]
+        if 'error' in r:
+            print('%-30s error: %s' % (module, r['error']))
+            continue
+        heaviest = ', '.join([package + ' ' + format(s, '.2f') for package, s in r['heaviest']])
+        print('%-30s %8.2f %9.2f %8.0f   %s' % (module, r['wall_s'], r['import_s'], r['max_rss_mb'], heaviest))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='benchmark the startup time of the modules')
+    arg_parser.add_argument('--modules', nargs='+', default=benchmark_modules)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--output', default='', help='also save the report as JSON')
+    args = arg_parser.parse_args()
+
+    report = run_benchmark(args.modules, args.repeat)
+    print_report(report)
+    if args.output != '':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,124 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import time
+from get_bing_results import parse_result
+from config import *
+
+# indexed local store of Bing results: all <query>_{q,qi,i}_bing_result.json files of a dataset are ingested once
+# into one SQLite file, then the urls of a query are one indexed lookup instead of three JSON parses
+# the store of a dataset lives next to its result files, a missing query falls back to the JSON files
+
+bing_modes = {'q': 'query', 'qi': 'query_items', 'i': 'items'}
+bing_store_name = 'bing_results.db'
+
+
+def bing_store_path(top_results_path):
+    return top_results_path + bing_store_name
+
+
+def open_bing_store(top_results_path):
+    # the store of a dataset, None if it was never ingested
+    if not os.path.exists(bing_store_path(top_results_path)):
+        return None
+    return BingStore(bing_store_path(top_results_path))
+
+
+def split_result_file_name(file_name):
+    # (query, search mode) of a <query>_<mode>_bing_result.json file name, None for other files
+    name = os.path.basename(file_name)
+    for mode in bing_modes:
+        suffix = '_' + mode + '_bing_result.json'
+        if name.endswith(suffix):
+            return name[:-len(suffix)], bing_modes[mode]
+    return None
+
+
+def read_snippets(file_name):
+    # {url: snippet} of the web pages of a Bing result file
+    try:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        return {page['url']: page.get('snippet', '') for page in result['webPages']['value']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+class BingStore:
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results (query TEXT, mode TEXT, rank INTEGER, url TEXT, '
+                        'snippet TEXT, PRIMARY KEY (query, mode, rank)) WITHOUT ROWID')
+        # status 'ok' or 'error' (parse_result failed), mtime of the ingested file for incremental ingestion
+        self.db.execute('CREATE TABLE IF NOT EXISTS queries (query TEXT, mode TEXT, status TEXT, mtime REAL, '
+                        'PRIMARY KEY (query, mode)) WITHOUT ROWID')
+        self.db.commit()
+
+    def ingest(self, top_results_path):
+        # load all Bing result files of a dataset in one transaction, files unchanged since the last run are skipped
+        start = time.time()
+        mtimes = {(query, mode): mtime for query, mode, mtime in
+                  self.db.execute('SELECT query, mode, mtime FROM queries')}
+        ingested = 0
+        errors = 0
+        with self.db:
+            for file_name in glob.glob(glob.escape(top_results_path) + '*_bing_result.json'):
+                query_mode = split_result_file_name(file_name)
+                if query_mode is None:
+                    continue
+                query, mode = query_mode
+                mtime = os.path.getmtime(file_name)
+                if mtimes.get((query, mode)) == mtime:
+                    continue
+                _, _, _, urls = parse_result(file_name)
+                self.db.execute('DELETE FROM results WHERE query = ? AND mode = ?', (query, mode))
+                if urls == 'error':
+                    status = 'error'
+                    errors += 1
+                else:
+                    status = 'ok'
+                    snippets = read_snippets(file_name)
+                    self.db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?)',
+                                        [(query, mode, i, urls[i], snippets.get(urls[i], ''))
+                                         for i in range(len(urls))])
+                self.db.execute('INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)', (query, mode, status, mtime))
+                ingested += 1
+        print(top_results_path, ingested, 'result files ingested,', errors, 'errors, time:',
+              format(time.time() - start, '.1f'), 's')
+
+    def get_urls(self, query):
+        # {search mode: urls in rank order, or 'error' like parse_result}, None if a mode of the query is missing
+        statuses = dict(self.db.execute('SELECT mode, status FROM queries WHERE query = ?', (query,)).fetchall())
+        if len(statuses) < len(bing_modes):
+            return None
+        urls = {mode: [] if statuses[mode] == 'ok' else 'error' for mode in statuses}
+        for mode, url in self.db.execute('SELECT mode, url FROM results WHERE query = ? ORDER BY mode, rank',
+                                         (query,)):
+            urls[mode].append(url)
+        return urls
+
+    def get_results(self, query, query_or_items):
+        # [(rank, url, snippet)] of a query in a search mode
+        return self.db.execute('SELECT rank, url, snippet FROM results WHERE query = ? AND mode = ? ORDER BY rank',
+                               (query, query_or_items)).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == '__main__':
+    dataset_paths = {'eval': [top_results_overall_good_path, top_results_query_log_path,
+                              top_results_query_dimension_path],
+                     'srqg-ltr': [top_results_srqg_ltr_path],
+                     'srqg-gen': [top_results_srqg_gen_path]}
+    arg_parser = argparse.ArgumentParser(description='ingest the Bing result files of a dataset into its store')
+    arg_parser.add_argument('--dataset', choices=list(dataset_paths), default='eval')
+    args = arg_parser.parse_args()
+
+    for path in dataset_paths[args.dataset]:
+        store = BingStore(bing_store_path(path))
+        store.ingest(path)
+        store.close()
@@ -1,47 +1,85 @@
 import re
 import os
-import inflect
-import stanza
+import heapq
 import numpy as np
-import tensorflow as tf
-from transformers import AutoTokenizer, TFAutoModel
 from utils import tanh, all_in, distance_score, read_evaluation_data, cos_sim
+from candidates_store import candidates_path, read_candidates
+from kb_index import open_kb_index, webisa_index_path, concept_graph_index_path
+from kb_cache import webisa_cache, concept_graph_cache
+from pos_cache import open_pos_cache
+from model_registry import get_parser, get_inflector, get_bert, stanza_documents
+from singular_lexicon import open_singular_lexicon, singular_form
+from pattern_scanner import get_pattern_scanner, space_offsets, word_window
+from ngram_counter import NgramCounter
 from config import *
 
 # candidates extractor and ranker: extracts description candidates from extracted lists and texts files
 # then ranks these description candidates according to several human-designed features
 
+re_non_alnum = re.compile(r'[^A-Za-z0-9 ]+')
+
 # find top 5 descriptions of a query or an item from WebIsA
 class WebisaExtractor:
     def __init__(self):
         self.top_count = 5
 
-    def list_sort(self, descs, freqs):
-        # sort descriptions and frequencies by frequencies
-        length = len(descs)
-        for i in range(length - 1):
-            for j in range(length - 1 - i):
-                if freqs[j] < freqs[j + 1]:
-                    t = freqs[j]
-                    freqs[j] = freqs[j + 1]
-                    freqs[j + 1] = t
-                    t = descs[j]
-                    descs[j] = descs[j + 1]
-                    descs[j + 1] = t
-        return descs[:self.top_count], freqs[:self.top_count]
-
     def find_desc(self, term):
+        # memoized across queries and rankers of the process
+        descs = webisa_cache.get(term)
+        if descs is None:
+            descs = self.lookup_desc(term)
+            webisa_cache.put(term, descs)
+        return list(descs[0]), list(descs[1])
+
+    def find_descs(self, terms):
+        # resolve the uncached terms in one pass over each letter file (or its index), terms without a letter
+        # file are left to find_desc
+        letter_terms = {}  # {initial char: terms}
+        for term in terms:
+            if len(term) == 0 or webisa_cache.contains(term):
+                continue
+            if term[0] not in letter_terms:
+                letter_terms[term[0]] = set()
+            letter_terms[term[0]].add(term)
+        for initial_char in sorted(letter_terms):
+            file_name = webisa_path + initial_char + '_ten.txt'
+            if not os.path.exists(file_name):
+                continue
+            if open_kb_index(webisa_index_path(initial_char), file_name) is not None:
+                for term in letter_terms[initial_char]:
+                    webisa_cache.put(term, self.lookup_desc(term))
+                continue
+            matches = {term: [] for term in letter_terms[initial_char]}
+            with open(file_name, 'r') as fp:
+                content = fp.read().split('\n')[:-1]
+                for line in content:
+                    line = line.split('\t')
+                    if len(line) >= 3 and line[0] in matches:
+                        matches[line[0]].append((line[1], float(line[2])))
+            for term in matches:
+                webisa_cache.put(term, self.top_descs(matches[term]))
+
+    def top_descs(self, matches):
+        matches = heapq.nlargest(self.top_count, matches, key=lambda match: match[1])  # stable like sorted
+        return tuple([desc for desc, _ in matches]), tuple([freq for _, freq in matches])
+
+    def lookup_desc(self, term):
+        # top descriptions by frequency, ties in file order, from the prebuilt index of the letter file if any
         initial_char = term[0]
-        descs = []
-        freqs = []
-        with open(webisa_path + initial_char + '_ten.txt', 'r') as fp:
+        file_name = webisa_path + initial_char + '_ten.txt'
+        index = open_kb_index(webisa_index_path(initial_char), file_name)
+        if index is not None:
+            postings = index.lookup(term, self.top_count)
+            return tuple([desc for desc, _ in postings]), tuple([float(freq) for _, freq in postings])
+
+        matches = []
+        with open(file_name, 'r') as fp:
             content = fp.read().split('\n')[:-1]
             for i in range(len(content)):
                 content[i] = content[i].split('\t')
                 if content[i][0] == term:
-                    descs.append(content[i][1])
-                    freqs.append(float(content[i][2]))
-        return self.list_sort(descs, freqs)
+                    matches.append((content[i][1], float(content[i][2])))
+        return self.top_descs(matches)
 
 
 # find top 5 descriptions of a query or an item from Concept Graph
@@ -49,61 +87,88 @@ class ConceptGraphExtractor:
     def __init__(self):
         self.top_count = 5
 
-    def list_sort(self, descs, freqs):
-        # sort descriptions and frequencies by frequencies
-        length = len(descs)
-        for i in range(length - 1):
-            for j in range(length - 1 - i):
-                if freqs[j] < freqs[j + 1]:
-                    t = freqs[j]
-                    freqs[j] = freqs[j + 1]
-                    freqs[j + 1] = t
-                    t = descs[j]
-                    descs[j] = descs[j + 1]
-                    descs[j + 1] = t
-        return descs[:self.top_count], freqs[:self.top_count]
-
     def find_desc(self, term):
+        # memoized across queries and rankers of the process
+        descs = concept_graph_cache.get(term)
+        if descs is None:
+            descs = self.lookup_desc(term)
+            concept_graph_cache.put(term, descs)
+        return list(descs[0]), list(descs[1])
+
+    def find_descs(self, terms):
+        # resolve the uncached terms in one pass over the Concept Graph (or its index)
+        terms = set([term for term in terms if not concept_graph_cache.contains(term)])
+        if len(terms) == 0:
+            return
+        if open_kb_index(concept_graph_index_path(), concept_graph_path) is not None:
+            for term in terms:
+                concept_graph_cache.put(term, self.lookup_desc(term))
+            return
+        matches = {term: [] for term in terms}
+        with open(concept_graph_path, 'r', encoding='utf-8') as f:
+            content = f.read().split('\n')[:-1]
+        for line in content:
+            line = line.split('\t')
+            if len(line) >= 3 and line[1] in matches:
+                matches[line[1]].append((line[0], int(line[2])))
+        for term in matches:
+            concept_graph_cache.put(term, self.top_descs(matches[term]))
+
+    def top_descs(self, matches):
+        matches = heapq.nlargest(self.top_count, matches, key=lambda match: match[1])  # stable like sorted
+        return tuple([desc for desc, _ in matches]), tuple([freq for _, freq in matches])
+
+    def lookup_desc(self, term):
+        # top concepts by count, ties in file order, from the prebuilt index if any
+        index = open_kb_index(concept_graph_index_path(), concept_graph_path)
+        if index is not None:
+            postings = index.lookup(term, self.top_count)
+            return tuple([desc for desc, _ in postings]), tuple([int(freq) for _, freq in postings])
+
         with open(concept_graph_path, 'r', encoding='utf-8') as f:
             content = f.read().split('\n')[:-1]
-        descs = []
-        freqs = []
+        matches = []
         for i in range(len(content)):
             content[i] = content[i].split('\t')
             if content[i][1] == term:
-                descs.append(content[i][0])
-                freqs.append(int(content[i][2]))
-        return self.list_sort(descs, freqs)
+                matches.append((content[i][0], int(content[i][2])))
+        return self.top_descs(matches)
 
 
 class CandidatesExtractorRanker:
-    def __init__(self, query, items, top_results_path, full_feature=False):
+    def __init__(self, query, items, top_results_path, full_feature=False, semantic_features=False):
+        # semantic_features: compute the BERT features, zeros otherwise (their model is then never loaded)
         print('build a candidates extractor and ranker')
         self.query = query
         self.query_no_id = query.split('_')[0]
         self.items = items
         self.top_results_path = top_results_path
         self.full_feature = full_feature
+        self.semantic_features = semantic_features
 
         self.items_candidates_texts = []
         self.items_candidates_lists = []
         self.query_candidates_texts = []
 
-        # get lists and texts for items
-        with open(top_results_path + query + '_candidates-items.txt', 'r', encoding='utf-8') as f:
-            content = f.read()
-        candidates = content.split('\n')[:-1]
+        # get lists and texts for items and texts for query
+        if os.path.exists(candidates_path(top_results_path, query)):
+            # records of the streaming candidates file: items regions of the query + items search,
+            # query texts of the query search
+            candidates = read_candidates(candidates_path(top_results_path, query))
+            lists_lines = candidates.get(('qi', 'items', 'list'), [])
+            texts_lines = candidates.get(('qi', 'items', 'text'), [])
+            query_lines = candidates.get(('q', 'query', 'text'), [])
+        else:
+            lists_lines, texts_lines, query_lines = self.read_candidates_files(query, top_results_path)
 
-        flag = 0
-        for i in range(len(candidates)):
-            # for judging lists lines (1) or text lines (2)
-            if candidates[i] == '-----------------------------------------------------------':
-                flag += 1
-            candidates[i] = self.preprocess(candidates[i])
-            if 2 < len(candidates[i]) <= 30 and flag == 1:  # from lists
-                self.items_candidates_lists.append(candidates[i])
-            elif len(candidates[i]) > 30 and flag == 2:  # from texts
-                self.items_candidates_texts.append(candidates[i])
+        for i in range(len(lists_lines)):
+            line = self.preprocess(lists_lines[i])
+            if 2 < len(line) <= 30:  # from lists
+                self.items_candidates_lists.append(line)
+        for i in range(len(texts_lines)):
+            line = self.preprocess(texts_lines[i])
+            if len(line) > 30:  # from texts
+                self.items_candidates_texts.append(line)
 
         new_lists = []
         # split by ','
@@ -118,22 +183,19 @@ class CandidatesExtractorRanker:
             self.items_candidates_lists[i] = self.items_candidates_lists[i].replace('!', '')
             self.items_candidates_lists[i] = self.items_candidates_lists[i].replace('?', '')
 
-        # get texts for query
-        with open(top_results_path + query + '_candidates-query.txt', 'r', encoding='utf-8') as f:
-            content = f.read()
-        candidates = content.split('\n')[:-1]
-
-        for i in range(len(candidates)):
-            candidates[i] = self.preprocess(candidates[i])
-            if len(candidates[i]) > 40:
-                self.query_candidates_texts.append(candidates[i])
+        for i in range(len(query_lines)):
+            line = self.preprocess(query_lines[i])
+            if len(line) > 40:
+                self.query_candidates_texts.append(line)
 
-        self.inflector = inflect.engine()  # convert nouns to singular: self.inflector.singular_noun(word)
-        self.parser = stanza.Pipeline('en', stanza_path, use_gpu=True)  # Stanford parser
+        # models shared by the rankers of the process
+        self.inflector = get_inflector()  # convert nouns to singular: self.inflector.singular_noun(word)
+        self.parser = get_parser()  # Stanford parser
+        self.pos_cache = open_pos_cache()  # POS tags of candidate phrases tagged by earlier queries and runs
 
         # read stopwords
         with open(stopword_path, 'r') as f:
-            self.stopwords = f.read().split('\n')[:-1]
+            self.stopwords = set(f.read().split('\n')[:-1])
 
         # candidates
         self.query_candidates = []
@@ -141,6 +203,8 @@ class CandidatesExtractorRanker:
 
         # temp data
         self.title_tuples = []
+        self.singular_texts = {}  # {'query' or 'items': singularized view of the candidates texts}
+        self.query_pattern_matches = None  # (NPhs, NPts) of the patterns in the query texts
 
         self.webisa_query_descs = []
         self.webisa_query_freqs = []
@@ -180,68 +244,80 @@ class CandidatesExtractorRanker:
         self.p_items_sim = 10.0
         self.tau_is = 0.95
 
-    def preprocess(self, line):
-        # remove special characters, just maintain numbers and alphabets
-        line = line.replace('&amp;', 'and')
-        line = line.replace(' ', ' ')
-        line_process = re.sub(r'[^A-Za-z0-9 .,?!\']+', '', line)
+    def read_candidates_files(self, query, top_results_path):
+        # lines of the candidates files written by earlier versions of the lists and texts extractor
+        with open(top_results_path + query + '_candidates-items.txt', 'r', encoding='utf-8') as f:
+            content = f.read()
+        candidates = content.split('\n')[:-1]
 
-        # convert multiple spaces to just one
-        line_process = ' '.join(line_process.split())
-        line_process = line_process.strip()
-        return line_process
+        lists_lines = []
+        texts_lines = []
+        flag = 0
+        for i in range(len(candidates)):
+            # for judging lists lines (1) or text lines (2)
+            if candidates[i] == '-----------------------------------------------------------':
+                flag += 1
+            if flag == 1:
+                lists_lines.append(candidates[i])
+            elif flag == 2:
+                texts_lines.append(candidates[i])
+
+        with open(top_results_path + query + '_candidates-query.txt', 'r', encoding='utf-8') as f:
+            content = f.read()
+        query_lines = content.split('\n')[:-1]
+        return lists_lines, texts_lines, query_lines
+
+    def preprocess(self, line):
+        return preprocess_line(line)
+
+    def get_singular_texts(self, query_or_items):
+        # the query or items candidates texts without '[', converted to singular once on first use
+        # and then shared by the candidates and the features
+        if query_or_items not in self.singular_texts:
+            texts = self.query_candidates_texts if query_or_items == 'query' else self.items_candidates_texts
+            self.singular_texts[query_or_items] = [convert_singular_line(self.inflector, line) for line in texts
+                                                   if line.find('[') == -1]
+        return self.singular_texts[query_or_items]
+
+    def get_query_pattern_matches(self):
+        # (NPhs, NPts) of the pattern hits in the query texts whose NPt contains the query, in 10-word windows,
+        # found once and shared by the query candidates and the pattern features
+        if self.query_pattern_matches is None:
+            matched_NPhs = []
+            matched_NPts = []
+            scanner = get_pattern_scanner(isa_pattern_path)
+            for line_singular in self.get_singular_texts('query'):
+                hits = scanner.find(line_singular)
+                if len(hits) == 0:
+                    continue
+                spaces = space_offsets(line_singular)
+                for i, pos in hits:
+                    match_str, pos_nph, pos_npt = scanner.patterns[i]
+                    start_pos, end_pos = word_window(line_singular, spaces, pos, len(match_str))
+                    before = line_singular[start_pos:pos]
+                    after = line_singular[pos + len(match_str):end_pos + 1]
+                    # NPt is a NPh
+                    if pos_nph > pos_npt and before.find(self.query_no_id) != -1:
+                        matched_NPhs.append(after)
+                        matched_NPts.append(before)
+                    # NPh such as NPt
+                    elif pos_nph < pos_npt and after.find(self.query_no_id) != -1:
+                        matched_NPhs.append(before)
+                        matched_NPts.append(after)
+            self.query_pattern_matches = matched_NPhs, matched_NPts
+        return self.query_pattern_matches
 
     def get_query_candidates(self):
         print('getting query candidates')
         # candidates of query description are tuples extracted from patterns
         # 1. patterns
-        with open(isa_pattern_path, 'r', encoding='utf-8') as f:
-            patterns = f.read().split('\n')[:-1]
-        all_matched_NPhs = []
-        all_matched_NPts = []
-        for line in self.query_candidates_texts:
-            if line.find('[') != -1:
-                continue
-            line_singular = convert_singular_line(self.inflector, line)
-            for pattern in patterns:
-                match_str = pattern.replace('NPt', '').replace('NPh', '')  # is a, such as, et al.
-                pos_nph = pattern.find('NPh')
-                pos_npt = pattern.find('NPt')
-                # match patterns in each text line
-                pos_match = [each.start() for each in re.finditer(match_str, line_singular)]
-                for pos in pos_match:
-                    start_pos = pos - 1
-                    start_space_num = 0
-                    while start_space_num < 10 and start_pos > 0:
-                        start_pos -= 1
-                        if line_singular[start_pos] == ' ':
-                            start_space_num += 1
-
-                    end_pos = pos + len(match_str) + 1
-                    end_space_num = 0
-                    while end_space_num < 10 and end_pos < len(line_singular) - 1:
-                        end_pos += 1
-                        if line_singular[end_pos] == ' ':
-                            end_space_num += 1
-
-                    if start_pos < 0:
-                        start_pos = 0
-                    if end_pos >= len(line_singular):
-                        end_pos = len(line_singular)
-
-                    # NPt is a NPh
-                    if pos_nph > pos_npt and line_singular[start_pos:pos].find(self.query_no_id) != -1:
-                        all_matched_NPhs.append(line_singular[pos + len(match_str):end_pos + 1])
-                        all_matched_NPts.append(line_singular[start_pos:pos])
-                    # NPh such as NPt
-                    elif pos_nph < pos_npt and line_singular[pos + len(match_str):end_pos + 1].find(self.query_no_id) != -1:
-                        all_matched_NPhs.append(line_singular[start_pos:pos])
-                        all_matched_NPts.append(line_singular[pos + len(match_str):end_pos + 1])
+        all_matched_NPhs, _ = self.get_query_pattern_matches()
 
         nph_tuples = self.get_freq_dicts(all_matched_NPhs)
-        nph_tuples = combine_freq_dicts(self.query_no_id, self.items, nph_tuples[0], nph_tuples[1], nph_tuples[2],
-                                        nph_tuples[3], nph_tuples[4], self.inflector)
-        nph_tuples = process_freq_dict(nph_tuples, self.inflector, self.query_no_id, self.items, self.parser)
+        nph_tuples = combine_freq_dicts(nph_tuples[0], nph_tuples[1], nph_tuples[2], nph_tuples[3], nph_tuples[4],
+                                        self.inflector)
+        nph_tuples = process_freq_dict(nph_tuples, self.inflector, self.query_no_id, self.items, self.parser,
+                                       self.pos_cache)
 
         for i in range(len(nph_tuples)):
             # if a candidate of query contains any item or the query itself, it is deemed not a good candidate
@@ -284,9 +360,10 @@ class CandidatesExtractorRanker:
         # candidates of items description are tuples extracted from list titles and items text contexts
         # 1. list titles
         title_tuples = self.get_freq_dicts(self.items_candidates_lists)
-        title_tuples = combine_freq_dicts(self.query_no_id, self.items, title_tuples[0], title_tuples[1],
-                                          title_tuples[2], title_tuples[3], title_tuples[4], self.inflector)
-        title_tuples = process_freq_dict(title_tuples, self.inflector, self.query_no_id, self.items, self.parser)
+        title_tuples = combine_freq_dicts(title_tuples[0], title_tuples[1], title_tuples[2], title_tuples[3],
+                                          title_tuples[4], self.inflector)
+        title_tuples = process_freq_dict(title_tuples, self.inflector, self.query_no_id, self.items, self.parser,
+                                         self.pos_cache)
 
         self.title_tuples = title_tuples
         for i in range(len(title_tuples)):
@@ -304,10 +381,7 @@ class CandidatesExtractorRanker:
         # 2. items text contexts
         all_contexts = []
         context_range = 50
-        for line in self.items_candidates_texts:
-            if line.find('[') != -1:
-                continue
-            line_singular = convert_singular_line(self.inflector, line)
+        for line_singular in self.get_singular_texts('items'):
             for item in self.items:
                 pos_s = [each.start() for each in re.finditer(item, line_singular)]
                 for pos in pos_s:
@@ -320,9 +394,10 @@ class CandidatesExtractorRanker:
                     all_contexts.append(line_singular[start_pos:end_pos])
 
         context_tuples = self.get_freq_dicts(all_contexts)
-        context_tuples = combine_freq_dicts(self.query_no_id, self.items, context_tuples[0], context_tuples[1],
-                                            context_tuples[2], context_tuples[3], context_tuples[4], self.inflector)
-        context_tuples = process_freq_dict(context_tuples, self.inflector, self.query_no_id, self.items, self.parser)
+        context_tuples = combine_freq_dicts(context_tuples[0], context_tuples[1], context_tuples[2],
+                                            context_tuples[3], context_tuples[4], self.inflector)
+        context_tuples = process_freq_dict(context_tuples, self.inflector, self.query_no_id, self.items, self.parser,
+                                           self.pos_cache)
 
         for i in range(len(context_tuples)):
             # if a candidate contains any item, it is deemed not a good candidate
@@ -362,80 +437,32 @@ class CandidatesExtractorRanker:
         print('items candidates:', len(self.items_candidates))
         print(self.items_candidates)
 
-    def get_freq_dicts(self, candidates_texts):
-        # candidates_lines: items_candidates_lines or query_candidates_lines
-        all_words = []
-        all_tuples = []
-        all_triples = []
-        all_4ples = []
-        all_5ples = []
+    def get_freq_dicts(self, candidates_texts, top_count=30):
+        # the top_count most frequent words (without stopwords) and 2- to 5-grams of the candidates texts,
+        # without words found in the query or items and n-grams made of query and items words only
+        counter = NgramCounter()
         for line in candidates_texts:
             if line.find('[') != -1:
                 continue
-            words = line.split(' ')
-            for i in range(len(words)):
-                words[i] = re.sub(r'[^A-Za-z0-9 ]+', '', words[i])
+            counter.add(re_non_alnum.sub('', line).split(' '))  # the pattern keeps spaces, same words as split first
 
-            # get words (without stopwords)
-            for word in words:
-                if word.startswith('-') or word in self.stopwords:
-                    continue
-                all_words.append(word)
-            # get tuples
-            for i in range(len(words) - 1):
-                all_tuples.append(words[i] + ' ' + words[i + 1])
-            # get triples
-            for i in range(len(words) - 2):
-                all_triples.append(words[i] + ' ' + words[i + 1] + ' ' + words[i + 2])
-            # get 4ples
-            for i in range(len(words) - 3):
-                all_4ples.append(words[i] + ' ' + words[i + 1] + ' ' + words[i + 2] + ' ' + words[i + 3])
-            # get 5ples
-            for i in range(len(words) - 4):
-                all_5ples.append(
-                    words[i] + ' ' + words[i + 1] + ' ' + words[i + 2] + ' ' + words[i + 3] + ' ' + words[i + 4])
-
-        dic_words = {}
-        for word in all_words:
-            if word not in dic_words:
-                dic_words[word] = 1
-            else:
-                dic_words[word] += 1
-        sorted_dic_words = sorted(dic_words.items(), key=lambda dic_words: dic_words[1], reverse=True)
-
-        dic_tuples = {}
-        for word in all_tuples:
-            if word not in dic_tuples:
-                dic_tuples[word] = 1
-            else:
-                dic_tuples[word] += 1
-        sorted_dic_tuples = sorted(dic_tuples.items(), key=lambda dic_tuples: dic_tuples[1], reverse=True)
-
-        dic_triples = {}
-        for word in all_triples:
-            if word not in dic_triples:
-                dic_triples[word] = 1
-            else:
-                dic_triples[word] += 1
-        sorted_dic_triples = sorted(dic_triples.items(), key=lambda dic_triples: dic_triples[1], reverse=True)
-
-        dic_4ples = {}
-        for word in all_4ples:
-            if word not in dic_4ples:
-                dic_4ples[word] = 1
-            else:
-                dic_4ples[word] += 1
-        sorted_dic_4ples = sorted(dic_4ples.items(), key=lambda dic_4ples: dic_4ples[1], reverse=True)
-
-        dic_5ples = {}
-        for word in all_5ples:
-            if word not in dic_5ples:
-                dic_5ples[word] = 1
-            else:
-                dic_5ples[word] += 1
-        sorted_dic_5ples = sorted(dic_5ples.items(), key=lambda dic_5ples: dic_5ples[1], reverse=True)
-
-        return sorted_dic_words, sorted_dic_tuples, sorted_dic_triples, sorted_dic_4ples, sorted_dic_5ples
+        items_text = ' '.join(self.items)
+        query_items_words = self.query_no_id.split(' ')
+        for item in self.items:
+            query_items_words.extend(item.split(' '))
+        in_query_items = [all_in([token], query_items_words) for token in counter.tokens]
+
+        def keep_word(gram):
+            word = counter.tokens[gram[0]]
+            return not (word.startswith('-') or word in self.stopwords or word == '' or word.isdigit() or
+                        self.query_no_id.find(word) != -1 or items_text.find(word) != -1)
+
+        def keep_ngram(gram):
+            return not all([in_query_items[i] for i in gram])
+
+        return counter.top(1, top_count, keep_word), counter.top(2, top_count, keep_ngram), \
+            counter.top(3, top_count, keep_ngram), counter.top(4, top_count, keep_ngram), \
+            counter.top(5, top_count, keep_ngram)
 
     # --------------------list statistical features--------------------
     def get_list_title_features(self, items_candidates):
@@ -461,85 +488,34 @@ class CandidatesExtractorRanker:
     # --------------------text statistical features--------------------
     def get_pattern_features(self, query_candidates, items_candidates):
         print('getting pattern features')
-        # read patterns
-        with open(isa_pattern_path, 'r', encoding='utf-8') as f:
-            patterns = f.read().split('\n')[:-1]
-
-        query_matched_NPhs = []
-        query_matched_NPts = []
+        query_matched_NPhs, query_matched_NPts = self.get_query_pattern_matches()
         items_matched_NPhs = []
         items_matched_NPts = []
 
         query_features = []
         items_features = []
 
-        for line in self.query_candidates_texts:
-            if line.find('[') != -1:
-                continue
-            line_singular = convert_singular_line(self.inflector, line)
-            for pattern in patterns:
-                match_str = pattern.replace('NPt', '').replace('NPh', '')  # is a, such as, et al.
-                pos_nph = pattern.find('NPh')
-                pos_npt = pattern.find('NPt')
-                # match patterns in each text line
-                pos_match = [each.start() for each in re.finditer(match_str, line_singular)]
-                for pos in pos_match:
-                    start_pos = pos - 1
-                    start_space_num = 0
-                    while start_space_num < 10 and start_pos > 0:
-                        start_pos -= 1
-                        if line_singular[start_pos] == ' ':
-                            start_space_num += 1
-
-                    end_pos = pos + len(match_str) + 1
-                    end_space_num = 0
-                    while end_space_num < 10 and end_pos < len(line_singular) - 1:
-                        end_pos += 1
-                        if line_singular[end_pos] == ' ':
-                            end_space_num += 1
+        scanner = get_pattern_scanner(isa_pattern_path)
+        for line_singular in self.get_singular_texts('items'):
+            for i, pos in scanner.find(line_singular):
+                match_str, pos_nph, pos_npt = scanner.patterns[i]
+                start_pos = pos - 40
+                end_pos = pos + len(match_str) + 40
+                if start_pos < 0:
+                    start_pos = 0
+                if end_pos >= len(line_singular):
+                    end_pos = len(line_singular)
 
-                    if start_pos < 0:
-                        start_pos = 0
-                    if end_pos >= len(line_singular):
-                        end_pos = len(line_singular)
-                    # for query
+                # for items
+                for item in self.items:
                     # NPt is a NPh
-                    if pos_nph > pos_npt and line_singular[start_pos:pos].find(self.query_no_id) != -1:
-                        query_matched_NPhs.append(line_singular[pos + len(match_str):end_pos + 1])
-                        query_matched_NPts.append(line_singular[start_pos:pos])
+                    if pos_nph > pos_npt and line_singular[start_pos:pos].find(item) != -1:
+                        items_matched_NPhs.append(line_singular[pos + len(match_str):end_pos + 1])
+                        items_matched_NPts.append(line_singular[start_pos:pos])
                     # NPh such as NPt
-                    elif pos_nph < pos_npt and line_singular[pos + len(match_str):end_pos + 1].find(self.query_no_id) != -1:
-                        query_matched_NPhs.append(line_singular[start_pos:pos])
-                        query_matched_NPts.append(line_singular[pos + len(match_str):end_pos + 1])
-
-        for line in self.items_candidates_texts:
-            if line.find('[') != -1:
-                continue
-            line_singular = convert_singular_line(self.inflector, line)
-            for pattern in patterns:
-                match_str = pattern.replace('NPt', '').replace('NPh', '')  # is a, such as, et al.
-                pos_nph = pattern.find('NPh')
-                pos_npt = pattern.find('NPt')
-                # match patterns in each text line
-                pos_match = [each.start() for each in re.finditer(match_str, line_singular)]
-                for pos in pos_match:
-                    start_pos = pos - 40
-                    end_pos = pos + len(match_str) + 40
-                    if start_pos < 0:
-                        start_pos = 0
-                    if end_pos >= len(line_singular):
-                        end_pos = len(line_singular)
-
-                    # for items
-                    for item in self.items:
-                        # NPt is a NPh
-                        if pos_nph > pos_npt and line_singular[start_pos:pos].find(item) != -1:
-                            items_matched_NPhs.append(line_singular[pos + len(match_str):end_pos + 1])
-                            items_matched_NPts.append(line_singular[start_pos:pos])
-                        # NPh such as NPt
-                        elif pos_nph < pos_npt and line_singular[pos + len(match_str):end_pos + 1].find(item) != -1:
-                            items_matched_NPhs.append(line_singular[start_pos:pos])
-                            items_matched_NPts.append(line_singular[pos + len(match_str):end_pos + 1])
+                    elif pos_nph < pos_npt and line_singular[pos + len(match_str):end_pos + 1].find(item) != -1:
+                        items_matched_NPhs.append(line_singular[start_pos:pos])
+                        items_matched_NPts.append(line_singular[pos + len(match_str):end_pos + 1])
 
         for q_candidate in query_candidates:
             q_feature = 0.0
@@ -579,10 +555,7 @@ class CandidatesExtractorRanker:
         query_features = []
         items_features = []
 
-        for line in self.query_candidates_texts:
-            if line.find('[') != -1:
-                continue
-            line_singular = convert_singular_line(self.inflector, line)
+        for line_singular in self.get_singular_texts('query'):
             pos_query_line = [each.start() for each in re.finditer(self.query_no_id, line_singular)]
             for pos in pos_query_line:
                 start_pos = pos - context_range
@@ -594,10 +567,7 @@ class CandidatesExtractorRanker:
                 query_pos_s.append(pos - start_pos)
                 query_all_contexts.append(line_singular[start_pos:end_pos])
 
-        for line in self.items_candidates_texts:
-            if line.find('[') != -1:
-                continue
-            line_singular = convert_singular_line(self.inflector, line)
+        for line_singular in self.get_singular_texts('items'):
 
             for item in self.items:
                 pos_item_line = [each.start() for each in re.finditer(item, line_singular)]
@@ -710,11 +680,10 @@ class CandidatesExtractorRanker:
     # --------------------semantic features--------------------
     def get_bert_features(self, query_candidates, items_candidates):
         print('getting contextual semantic features')
+        if not self.semantic_features:
+            return [0.0] * len(query_candidates), [0.0] * len(items_candidates)
 
-        return [0.0] * len(query_candidates), [0.0] * len(items_candidates)
-
-        tokenizer = AutoTokenizer.from_pretrained(bert_model_path)
-        model = TFAutoModel.from_pretrained(bert_model_path)
+        tokenizer, model = get_bert()
 
         # get encoding of query
         query_input = tokenizer(self.query_no_id, return_tensors='tf', padding=True)
@@ -815,11 +784,10 @@ class CandidatesExtractorRanker:
 
     # --------------------inhibition features--------------------
     def get_items_sim_features(self, items_candidates):
+        if not self.semantic_features:
+            return [0.0] * len(items_candidates)
 
-        return [0.0] * len(items_candidates)
-
-        tokenizer = AutoTokenizer.from_pretrained(bert_model_path)
-        model = TFAutoModel.from_pretrained(bert_model_path)
+        tokenizer, model = get_bert()
 
         items_input = tokenizer(self.items, return_tensors='tf', padding=True)
         items_encoding = model(items_input)
@@ -839,53 +807,41 @@ class CandidatesExtractorRanker:
             return [self.p_items_sim * (self.tau_is - sum_cos)] * len(items_candidates)
 
 
-def convert_singular_line(inflector, line):
-    words_with_s = ['this', 'as', 'is', 'news', 'windows', 'virus', 'supernoobs', 'does', 'os', 'ios', 'macos', 'pus',
-                    'bus', 'vs', 'ps', 'js', 'ls', 'us', 'cs', 'kiss', 'miss', 'ms', 'nds', 'nes', 'class', 'mass',
-                    'his', 'its', 'guess', 'success', 'business', 'happiness', 'abscess', 'across', 'has', 'diagnosis',
-                    'dress']
-    words = line.split(' ')
-    singular = []
-    for word in words:
-        if inflector.singular_noun(word) and word not in words_with_s:
-            singular.append(inflector.singular_noun(word))
-        else:
-            singular.append(word)
-    return ' '.join(singular)
+def preprocess_line(line):
+    # remove special characters, just maintain numbers and alphabets
+    line = line.replace('&amp;', 'and')
+    line = line.replace(' ', ' ')
+    line_process = re.sub(r'[^A-Za-z0-9 .,?!\']+', '', line)
 
+    # convert multiple spaces to just one
+    line_process = ' '.join(line_process.split())
+    line_process = line_process.strip()
+    return line_process
 
-def combine_freq_dicts(query, items, words, tuples, triples, fourples, fiveples, inflector):
-    query_split = query.split(' ')
-    items_split = []
-    for item in items:
-        items_split.extend(item.split(' '))
 
-    words_processed = []
-    tuples_processed = []
-    triples_processed = []
-    fourples_processed = []
-    fiveples_processed = []
+singular_words = {}  # {word: singular form}, memo of the lexicon and inflect shared by all rankers of the process
+max_singular_words = 1000000
 
-    for i in range(len(words)):
-        if not (words[i][0] == '' or words[i][0].isdigit() or query.find(words[i][0]) != -1 or ' '.join(items).find(
-                words[i][0]) != -1):
-            words_processed.append(words[i])
 
-    for i in range(len(tuples)):
-        if not (all_in(tuples[i][0].split(' '), query_split + items_split)):
-            tuples_processed.append(tuples[i])
-    for i in range(len(triples)):
-        if not (all_in(triples[i][0].split(' '), query_split + items_split)):
-            triples_processed.append(triples[i])
-    for i in range(len(fourples)):
-        if not (all_in(fourples[i][0].split(' '), query_split + items_split)):
-            fourples_processed.append(fourples[i])
-    for i in range(len(fiveples)):
-        if not (all_in(fiveples[i][0].split(' '), query_split + items_split)):
-            fiveples_processed.append(fiveples[i])
-
-    tuples = words_processed[:30] + tuples_processed[:30] + triples_processed[:30] + \
-             fourples_processed[:30] + fiveples_processed[:30]
+def convert_singular_word(inflector, word):
+    if word not in singular_words:
+        if len(singular_words) >= max_singular_words:
+            singular_words.clear()
+        lexicon = open_singular_lexicon()  # precomputed forms, see singular_lexicon.py
+        singular = lexicon.get(word) if lexicon is not None else None
+        if singular is None:  # out of the vocabulary of the lexicon
+            singular = singular_form(inflector, word)
+        singular_words[word] = singular
+    return singular_words[word]
+
+
+def convert_singular_line(inflector, line):
+    return ' '.join([convert_singular_word(inflector, word) for word in line.split(' ')])
+
+
+def combine_freq_dicts(words, tuples, triples, fourples, fiveples, inflector):
+    # merge the top n-grams of get_freq_dicts by their singular forms
+    tuples = words + tuples + triples + fourples + fiveples
 
     # convert to singular
     processed_tuples = []
@@ -907,7 +863,29 @@ def combine_freq_dicts(query, items, words, tuples, triples, fourples, fiveples,
     return combined_tuples
 
 
-def process_freq_dict(tuples, inflector, query, items, parser):
+def tag_phrases(parser, phrases, pos_cache=None):
+    # {phrase: POS tags of the words of its first sentence}, the phrases missing from pos_cache are tagged
+    # in one multi-document stanza call and added to it
+    phrase_tags = {}
+    new_phrases = []
+    for phrase in phrases:
+        tags = pos_cache.get(phrase) if pos_cache is not None else None
+        if tags is not None:
+            phrase_tags[phrase] = tags
+        elif phrase not in new_phrases:
+            new_phrases.append(phrase)
+    if len(new_phrases) > 0:
+        docs = parser(stanza_documents(new_phrases))
+        new_tags = {}
+        for phrase, doc in zip(new_phrases, docs):
+            new_tags[phrase] = [word.pos for word in doc.sentences[0].words]
+        if pos_cache is not None:
+            pos_cache.put_many(new_tags)
+        phrase_tags.update(new_tags)
+    return phrase_tags
+
+
+def process_freq_dict(tuples, inflector, query, items, parser, pos_cache=None):
     # convert to singular
     singular_tuples = []
     for i in range(len(tuples)):
@@ -933,15 +911,10 @@ def process_freq_dict(tuples, inflector, query, items, parser):
     combined_tuples = sorted(combined_tuples.items(), key=lambda combined_tuples: combined_tuples[1], reverse=True)
 
     # remove tuples without nouns
+    phrase_tags = tag_phrases(parser, [tuple[0] for tuple in combined_tuples], pos_cache)
     removed_nouns_tuples = []
     for tuple in combined_tuples:
-        doc = parser(tuple[0])
-        tuple_words = []
-        tuple_pos = []
-        for word in doc.sentences[0].words:
-            text, pos = word.text, word.pos  # parts-of-speech
-            tuple_words.append(text)
-            tuple_pos.append(pos)
+        tuple_pos = phrase_tags[tuple[0]]  # parts-of-speech
         if 'NOUN' in tuple_pos and (tuple_pos[-1] == 'NOUN' or tuple_pos[-1] == 'PROPN') and \
                 (tuple_pos[0] == 'NOUN' or tuple_pos[0] == 'PROPN' or tuple_pos[0] == 'ADJ'):
             removed_nouns_tuples.append(tuple)
@@ -987,13 +960,39 @@ class ItemsCandidateFeatures:
         self.score = list_f + pattern_f + distance_f + occur_f + freq_f + inc_f + semantic_f + entity_f - items_sim_f
 
 
-def extract_rank_candidates(query, items, top_results_path, result_save_path, full_feature):
+def is_ranked(query, result_save_path):
+    return os.path.exists(result_save_path + query + '_query.txt') or os.path.exists(result_save_path + query + '_items.txt')
+
+
+def prefetch_kb_terms(query_set, items_set):
+    # resolve the knowledge-base descriptions of all queries and items of a query set in one grouped pass,
+    # the rankers of the queries then only hit the caches
+    # a knowledge base that can not be read is only logged: the rankers look the terms left up one by one,
+    # so that only the queries needing it fail
+    terms = []
+    for query, items in zip(query_set, items_set):
+        terms.append(query.split('_')[0])
+        terms.extend(items)
+    for extractor in [WebisaExtractor(), ConceptGraphExtractor()]:
+        try:
+            extractor.find_descs(terms)
+        except Exception as e:
+            print('prefetch error:', type(extractor).__name__, type(e).__name__, e)
+
+
+def prefetch_unranked_kb_terms(query_set, items_set, result_save_paths):
+    # prefetch the terms of the queries not ranked yet, result_save_paths: result path of each query
+    unranked = [i for i in range(len(query_set)) if not is_ranked(query_set[i], result_save_paths[i])]
+    prefetch_kb_terms([query_set[i] for i in unranked], [items_set[i] for i in unranked])
+
+
+def extract_rank_candidates(query, items, top_results_path, result_save_path, full_feature, semantic_features=False):
     # get different types of features and combine them together to score each candidates
-    if os.path.exists(result_save_path + query + '_query.txt') or os.path.exists(result_save_path + query + '_items.txt'):
+    if is_ranked(query, result_save_path):
         print('result already exists')
         return
 
-    candidates_ranker = CandidatesExtractorRanker(query, items, top_results_path, full_feature)
+    candidates_ranker = CandidatesExtractorRanker(query, items, top_results_path, full_feature, semantic_features)
     # candidates for query and items, save as candidates_ranker.query_candidates and candidates_ranker.items_candidates
     candidates_ranker.get_query_candidates()
     candidates_ranker.get_items_candidates()
@@ -1099,34 +1098,38 @@ def extract_rank_candidates(query, items, top_results_path, result_save_path, fu
                     str(format(-items_candidate_features[i].items_sim_f, '.4f')) + '\t\n')
 
 
-def extract_rank_evaluation_candidates(full_feature=False):
+def extract_rank_evaluation_candidates(full_feature=False, semantic_features=False):
     # read evaluation data
     o_queries, o_items, l_queries, l_items, d_queries, d_items = read_evaluation_data()
+    prefetch_unranked_kb_terms(o_queries[:100] + l_queries[:100] + d_queries[:100],
+                               o_items[:100] + l_items[:100] + d_items[:100],
+                               [overall_good_candidates_path] * 100 + [query_log_candidates_path] * 100 +
+                               [query_dimension_candidates_path] * 100)
     for i in range(100):
         print(i + 1, o_queries[i], o_items[i])
         try:
-            extract_rank_candidates(o_queries[i], o_items[i], top_results_overall_good_path, overall_good_candidates_path, full_feature)
+            extract_rank_candidates(o_queries[i], o_items[i], top_results_overall_good_path, overall_good_candidates_path, full_feature, semantic_features)
         except Exception:
             print('Error')
             continue
     for i in range(100):
         print(i + 1, l_queries[i], l_items[i])
         try:
-            extract_rank_candidates(l_queries[i], l_items[i], top_results_query_log_path, query_log_candidates_path, full_feature)
+            extract_rank_candidates(l_queries[i], l_items[i], top_results_query_log_path, query_log_candidates_path, full_feature, semantic_features)
         except Exception:
             print('Error')
             continue
     for i in range(100):
         print(i + 1, d_queries[i], d_items[i])
         try:
-            extract_rank_candidates(d_queries[i], d_items[i], top_results_query_dimension_path, query_dimension_candidates_path, full_feature)
+            extract_rank_candidates(d_queries[i], d_items[i], top_results_query_dimension_path, query_dimension_candidates_path, full_feature, semantic_features)
         except Exception:
             print('Error')
             continue
 
 
-def extract_rank_srqg_ltr_candidates(full_feature=False):
-    # read training data
+def read_srqg_ltr_data():
+    # read training data of SRQG-LTR
     query_set = []
     items_set = []
     with open(srqg_ltr_training_data_path, 'r', encoding='utf-8') as f:
@@ -1137,21 +1140,14 @@ def extract_rank_srqg_ltr_candidates(full_feature=False):
             items = eval(line_split[1])
             query_set.append(query)
             items_set.append(items)
-
-    for i in range(0, 400):
-        print(i + 1, query_set[i], items_set[i])
-        try:
-            extract_rank_candidates(query_set[i], items_set[i], top_results_srqg_ltr_path, srqg_ltr_candidates_path, full_feature)
-        except Exception:
-            print('Error')
-            continue
+    return query_set, items_set
 
 
-def extract_rank_srqg_gen_candidates(full_feature=False):
-    # read training data
+def read_srqg_gen_data():
+    # read training data of SRQG-GEN
     query_set = []
     items_set = []
-    inflector = inflect.engine()
+    inflector = get_inflector()
     with open(qlm_data_5_build_path, 'r', encoding='utf-8') as f:
         contents = f.read().split('\n')[:-1]
         for i, line in enumerate(contents):
@@ -1165,13 +1161,34 @@ def extract_rank_srqg_gen_candidates(full_feature=False):
                     items.append(convert_singular_line(inflector, item))
             query_set.append(query)
             items_set.append(items)
+    return query_set, items_set
+
+
+def extract_rank_srqg_ltr_candidates(full_feature=False, semantic_features=False):
+    # read training data
+    query_set, items_set = read_srqg_ltr_data()
+    prefetch_unranked_kb_terms(query_set[:400], items_set[:400], [srqg_ltr_candidates_path] * 400)
+
+    for i in range(0, 400):
+        print(i + 1, query_set[i], items_set[i])
+        try:
+            extract_rank_candidates(query_set[i], items_set[i], top_results_srqg_ltr_path, srqg_ltr_candidates_path, full_feature, semantic_features)
+        except Exception:
+            print('Error')
+            continue
+
+
+def extract_rank_srqg_gen_candidates(full_feature=False, semantic_features=False):
+    # read training data
+    query_set, items_set = read_srqg_gen_data()
     print(len(query_set))
     print(len(items_set))
+    prefetch_unranked_kb_terms(query_set, items_set, [srqg_gen_candidates_path] * len(query_set))
 
     for i in range(len(query_set)):  # len(query_set)
         print(i + 1, query_set[i], items_set[i])
         try:
-            extract_rank_candidates(query_set[i], items_set[i], top_results_srqg_gen_path, srqg_gen_candidates_path, full_feature)
+            extract_rank_candidates(query_set[i], items_set[i], top_results_srqg_gen_path, srqg_gen_candidates_path, full_feature, semantic_features)
         except Exception:
             print('Error')
             continue
@@ -0,0 +1,76 @@
+import json
+import os
+
+# streaming store of candidate regions: one JSONL file per query with one typed record per region
+# {"mode": "q" | "qi" | "i", "url": index of the url in the Bing results of the mode,
+#  "target": "query" | "items", "kind": "list" | "text", "text": lower-cased region}
+# records are appended as pages finish, so memory stays bounded and every region is written once
+
+search_modes = {'query': 'q', 'query_items': 'qi', 'items': 'i'}
+
+# (target, kind) of each region returned by extract_url_regions for a search mode
+region_types = {'query': [('query', 'text')],
+                'query_items': [('query', 'text'), ('items', 'list'), ('items', 'text')],
+                'items': [('items', 'list'), ('items', 'text')]}
+
+
+def candidates_path(top_results_path, query):
+    return top_results_path + query + '_candidates.jsonl'
+
+
+class CandidatesWriter:
+    def __init__(self, path, done_urls=None):
+        # done_urls: set of (search mode, url index) completed by an earlier run, their records are kept
+        # and records of urls interrupted half-way are dropped; None to start a new file
+        self.path = path
+        if done_urls is not None and os.path.exists(path):
+            temp_path = path + '.tmp'
+            with open(path, 'r', encoding='utf-8') as f_in, open(temp_path, 'w', encoding='utf-8') as f_out:
+                for line in f_in:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:  # last line cut by a killed run
+                        continue
+                    if (record['mode'], record['url']) in done_urls:
+                        f_out.write(line)
+            os.replace(temp_path, path)
+            self.f = open(path, 'a', encoding='utf-8')
+        else:
+            self.f = open(path, 'w', encoding='utf-8')
+
+    def write_url_regions(self, query_or_items, url_id, regions):
+        # regions: the return value of extract_url_regions for the search mode
+        if query_or_items == 'query':
+            regions = [regions]
+        lines = []
+        for (target, kind), region in zip(region_types[query_or_items], regions):
+            for text in region:
+                if len(text) != 0:
+                    record = {'mode': search_modes[query_or_items], 'url': url_id, 'target': target, 'kind': kind,
+                              'text': text.lower()}
+                    lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        self.f.write(''.join(lines))  # all records of a url at once
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def read_candidates(path):
+    # {(search mode, target, kind): texts in the order of Bing results}, read in one pass
+    records = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            key = (record['mode'], record['target'], record['kind'])
+            if key not in records:
+                records[key] = []
+            records[key].append((record['url'], record['text']))
+    candidates = {}
+    for key in records:
+        records[key].sort(key=lambda record: record[0])  # stable, keeps the order of regions inside a page
+        candidates[key] = [text for _, text in records[key]]
+    return candidates
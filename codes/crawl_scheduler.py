@@ -0,0 +1,81 @@
+import time
+
+# deadline-aware crawl scheduling of the urls of a query:
+# urls are fetched in Bing rank order, the query stops at a wall-clock deadline or as soon as enough
+# query-text and item-list regions are extracted, and hosts failing repeatedly are skipped by a circuit breaker
+
+
+class DeadlineExceeded(Exception):
+    # the url was not fetched before the deadline of the query
+    pass
+
+
+class FetchCancelled(Exception):
+    # the url was not fetched because the query stopped early
+    pass
+
+
+class CircuitOpenError(Exception):
+    # the url was not fetched because its host failed repeatedly
+    pass
+
+
+class HostCircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        # failure_threshold: consecutive transient failures of a host that open its circuit
+        # reset_timeout: seconds before an open circuit lets one trial request through (half-open)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = {}  # {host: consecutive failures}
+        self.opened_at = {}  # {host: time its circuit opened or its last trial started}
+
+    def allow(self, host):
+        if host not in self.opened_at:
+            return True
+        now = time.time()
+        if now - self.opened_at[host] < self.reset_timeout:
+            return False
+        self.opened_at[host] = now  # half-open, later requests wait for the result of this trial
+        return True
+
+    def record_success(self, host):
+        self.failures.pop(host, None)
+        self.opened_at.pop(host, None)
+
+    def record_failure(self, host):
+        self.failures[host] = self.failures.get(host, 0) + 1
+        if self.failures[host] >= self.failure_threshold:
+            self.opened_at[host] = time.time()
+
+
+class CrawlScheduler:
+    def __init__(self, deadline=None, region_target=None):
+        # deadline: seconds of wall clock for the urls of a query, None for no deadline
+        # region_target: stop once this many query-text and item-list regions are extracted, None for all urls
+        self.deadline = deadline
+        self.region_target = region_target
+        self.deadline_time = None
+        self.regions = 0
+
+    def order(self, url_modes):
+        # urls by their best Bing rank in any search mode, ties in search mode order
+        urls = list(url_modes)
+        ranks = {url: min([i for _, i in url_modes[url]]) for url in urls}
+        urls.sort(key=lambda url: ranks[url])  # stable
+        return urls
+
+    def start(self):
+        self.regions = 0
+        self.deadline_time = time.time() + self.deadline if self.deadline is not None else None
+
+    def add(self, url_metrics):
+        self.regions += url_metrics.key_regions
+
+    def target_reached(self):
+        return self.region_target is not None and self.regions >= self.region_target
+
+    def deadline_passed(self):
+        return self.deadline_time is not None and time.time() >= self.deadline_time
+
+    def should_stop(self):
+        return self.target_reached() or self.deadline_passed()
@@ -0,0 +1,147 @@
+from lxml import etree
+from lxml import html as lxml_html
+
+# DOM-native lists and texts extractor: parses the page once with lxml and walks the tree a single time,
+# lists come from the entries of <ul>/<ol>/<table> elements, list titles from the nearest preceding heading,
+# and the result is the same (lists, lists_descs, texts) triple as HTMLAnalyzer.extract_lists_texts_of_url
+
+skip_tags = {'script', 'noscript', 'style', 'head', 'template', 'svg', 'iframe', 'object'}
+heading_tags = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+list_tags = {'ul', 'ol', 'table'}
+table_sections = {'thead', 'tbody', 'tfoot'}
+inline_tags = {'a', 'abbr', 'b', 'bdi', 'bdo', 'cite', 'code', 'data', 'dfn', 'em', 'font', 'i', 'kbd', 'mark',
+               'q', 's', 'samp', 'small', 'span', 'strike', 'strong', 'sub', 'sup', 'time', 'tt', 'u', 'var'}
+
+# same character cleaning as HTMLAnalyzer.html_get_content
+content_replacements = [('\t', ' '), ('* ', ' '), ('*', ' '), ('+ ', ' '), ('+', ' '), (' o ', '  '), ('Â', ''),
+                        ('â', ''), ('-', ' ')]
+
+utf8_parser = lxml_html.HTMLParser(encoding='utf-8', remove_comments=True, remove_pis=True)
+
+
+def tag_name(el):
+    # lower-cased tag of an element, None for comments and processing instructions
+    if not isinstance(el.tag, str):
+        return None
+    return el.tag.lower()
+
+
+def clean_text(text):
+    for old, new in content_replacements:
+        text = text.replace(old, new)
+    return ' '.join(text.split())
+
+
+def gather_text(el, is_stop, found):
+    # text of el with its descendants flattened, subtrees whose tag satisfies is_stop are not entered
+    # but appended to found, their tails still belong to el
+    parts = [el.text or '']
+    for child in el:
+        tag = tag_name(child)
+        if tag is not None and tag not in skip_tags:
+            if is_stop(tag):
+                found.append(child)
+            elif tag in inline_tags:
+                parts.append(gather_text(child, is_stop, found))
+            else:
+                parts.append(' ' + gather_text(child, is_stop, found) + ' ')
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def is_block(tag):
+    return tag not in inline_tags
+
+
+def is_list(tag):
+    return tag in list_tags
+
+
+class DOMExtractor:
+    def __init__(self, text_len_threshold=60, desc_len_threshold=60):
+        self.text_len_threshold = text_len_threshold
+        self.desc_len_threshold = desc_len_threshold
+
+    def parse(self, html):
+        try:
+            return lxml_html.document_fromstring(html.encode('utf-8', errors='replace'), parser=utf8_parser)
+        except (etree.ParserError, ValueError):  # empty or broken document
+            return None
+
+    def get_entries(self, el):
+        # rows of a list or a table, and the title of the table if it has a caption
+        tag = tag_name(el)
+        caption = ''
+        rows = []
+        for child in el:
+            child_tag = tag_name(child)
+            if tag != 'table':
+                if child_tag == 'li':
+                    rows.append(child)
+            elif child_tag == 'tr':
+                rows.append(child)
+            elif child_tag in table_sections:
+                rows.extend([row for row in child if tag_name(row) == 'tr'])
+            elif child_tag == 'caption':
+                caption = clean_text(gather_text(child, is_list, []))
+        return rows, caption
+
+    def extract(self, html):
+        lists = []
+        lists_descs = []
+        texts = []
+        root = self.parse(html)
+        if root is None:
+            return lists, lists_descs, texts
+
+        heading = ''  # nearest preceding heading in document order
+        stack = [(root, None)]  # (element, title given by its parent list entry)
+        while len(stack) > 0:
+            el, desc = stack.pop()
+            tag = tag_name(el)
+            if tag is None or tag in skip_tags:
+                continue
+
+            if tag in heading_tags:
+                heading = clean_text(gather_text(el, lambda t: False, []))
+                if len(heading) > self.desc_len_threshold:
+                    heading = ''
+                continue
+
+            if tag in list_tags:
+                rows, caption = self.get_entries(el)
+                entries = []
+                nested = []  # lists inside entries, titled by their entry
+                for row in rows:
+                    found = []
+                    entry = clean_text(gather_text(row, is_list, found))
+                    entries.append(entry)
+                    nested.extend([(child, entry) for child in found])
+                if desc is None:
+                    desc = caption if caption != '' else heading
+                self.add_list(entries, desc, lists, lists_descs, texts)
+                for child, entry in reversed(nested):
+                    stack.append((child, entry if len(entry) <= self.desc_len_threshold else ''))
+                continue
+
+            # any other element: its own text with inline tags flattened, block children are visited later
+            found = []
+            text = clean_text(gather_text(el, is_block, found))
+            if len(text) >= self.text_len_threshold:
+                texts.append(text)
+            for child in reversed(found):
+                stack.append((child, None))
+
+        return lists, lists_descs, texts
+
+    def add_list(self, entries, desc, lists, lists_descs, texts):
+        # long entries are texts, the short ones form the list
+        temp_list = []
+        for entry in entries:
+            if len(entry) >= self.text_len_threshold:
+                texts.append(entry)
+            elif len(entry) > 3:
+                temp_list.append(entry)
+        if len(temp_list) > 1:
+            lists.append(temp_list)
+            lists_descs.append(desc)
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# persistent on-disk cache of downloaded pages shared by all queries and datasets
+# pages are keyed by normalized url, stored once per content hash as gzip files,
+# expire after a ttl and are evicted in least-recently-used order above a size cap
+
+html_cache_path = '../data/html_cache/'
+html_cache_ttl = 30 * 24 * 3600  # seconds, 0 for never expire
+html_cache_max_bytes = 4 * 1024 ** 3  # compressed bytes on disk
+
+
+def normalize_url(url):
+    # lower scheme and host, drop default port and fragment, sort query parameters
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and not (scheme == 'http' and port == 80) and not (scheme == 'https' and port == 443):
+        netloc += ':' + str(port)
+    path = parts.path if parts.path else '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+class HTMLCache:
+    def __init__(self, path=html_cache_path, ttl=html_cache_ttl, max_bytes=html_cache_max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_interval = 100  # run eviction once every evict_interval puts
+        self.puts = 0
+        # access times of the hits are buffered and written with the next put, eviction or close, or once
+        # flush_interval hits are buffered: a commit per hit serialized the processes sharing the cache,
+        # access times not flushed by a killed process only make the LRU order slightly stale
+        self.flush_interval = 100
+        self.accesses = {}  # {normalized url: access time} not written yet
+        os.makedirs(path + 'objects/', exist_ok=True)
+        self.db = sqlite3.connect(path + 'index.db', timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS pages '
+                        '(url TEXT PRIMARY KEY, digest TEXT, fetched_at REAL, accessed_at REAL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)')
+        self.db.commit()
+
+    def blob_path(self, digest):
+        return self.path + 'objects/' + digest[:2] + '/' + digest + '.gz'
+
+    def get(self, url):
+        # return the cached html of url, None if it is not cached or expired
+        key = normalize_url(url)
+        row = self.db.execute('SELECT digest, fetched_at FROM pages WHERE url = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        digest, fetched_at = row
+        now = time.time()
+        if self.ttl and now - fetched_at > self.ttl:
+            return None
+        try:
+            with gzip.open(self.blob_path(digest), 'rb') as f:
+                html = f.read().decode('utf-8')
+        except (OSError, EOFError):  # blob removed by another process
+            self.db.execute('DELETE FROM pages WHERE url = ?', (key,))
+            self.db.commit()
+            return None
+        self.accesses[key] = now
+        if len(self.accesses) >= self.flush_interval:
+            self.flush()
+        return html
+
+    def flush(self):
+        # write the buffered access times
+        self.write_accesses()
+        self.db.commit()
+
+    def write_accesses(self):
+        if len(self.accesses) > 0:
+            self.db.executemany('UPDATE pages SET accessed_at = ? WHERE url = ?',
+                                [(accessed_at, key) for key, accessed_at in self.accesses.items()])
+            self.accesses = {}
+
+    def put(self, url, html):
+        key = normalize_url(url)
+        data = html.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        blob_path = self.blob_path(digest)
+        # the size is the one recorded or the one written, the blob is not read back: another process
+        # may be evicting it
+        row = self.db.execute('SELECT size FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if row is not None and os.path.exists(blob_path):
+            size = row[0]
+        else:
+            compressed = gzip.compress(data)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = blob_path + '.' + str(os.getpid()) + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(temp_path, blob_path)  # readers never see a partly written blob
+            size = len(compressed)
+        now = time.time()
+        self.db.execute('INSERT OR REPLACE INTO blobs (digest, size) VALUES (?, ?)', (digest, size))
+        self.db.execute('INSERT OR REPLACE INTO pages (url, digest, fetched_at, accessed_at) VALUES (?, ?, ?, ?)',
+                        (key, digest, now, now))
+        self.accesses.pop(key, None)
+        self.write_accesses()
+        self.db.commit()
+        self.puts += 1
+        if self.puts % self.evict_interval == 0:
+            self.evict()
+
+    def evict(self):
+        # remove expired pages, then least recently used pages until the cache fits in max_bytes
+        self.write_accesses()
+        if self.ttl:
+            self.db.execute('DELETE FROM pages WHERE fetched_at < ?', (time.time() - self.ttl,))
+        self.remove_orphan_blobs()
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        while total > self.max_bytes:
+            rows = self.db.execute('SELECT pages.url, blobs.digest, blobs.size FROM pages JOIN blobs '
+                                   'ON pages.digest = blobs.digest ORDER BY pages.accessed_at LIMIT 1000').fetchall()
+            if len(rows) == 0:
+                break
+            urls = []
+            freed = 0
+            digests = set()  # a blob shared by several urls is freed once
+            for url, digest, size in rows:
+                urls.append((url,))
+                if digest not in digests:
+                    digests.add(digest)
+                    freed += size
+                if total - freed <= self.max_bytes:
+                    break
+            self.db.executemany('DELETE FROM pages WHERE url = ?', urls)
+            self.remove_orphan_blobs()
+            total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        self.db.commit()
+
+    def remove_orphan_blobs(self):
+        # a blob can be shared by several urls, it is removed when no url refers to it
+        digests = self.db.execute('SELECT digest FROM blobs WHERE digest NOT IN (SELECT digest FROM pages)').fetchall()
+        for (digest,) in digests:
+            if os.path.exists(self.blob_path(digest)):
+                os.remove(self.blob_path(digest))
+        self.db.executemany('DELETE FROM blobs WHERE digest = ?', digests)
+
+    def close(self):
+        self.flush()
+        self.db.close()
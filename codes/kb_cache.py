@@ -0,0 +1,38 @@
+from collections import OrderedDict
+
+# memoized knowledge-base lookups shared by all rankers of a process: the descriptions of a term in WebIsA
+# and in the Concept Graph are resolved once, items such as 'symptom' or 'treatment' repeat across many queries
+# the caches are bounded and evict the least recently used terms
+
+kb_cache_size = 100000  # terms per knowledge base
+
+
+class LRUCache:
+    def __init__(self, max_size=kb_cache_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # cached value of key, None if it is not cached
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def contains(self, key):
+        # membership without touching the recency or the statistics
+        return key in self.entries
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+webisa_cache = LRUCache()  # {term: (descriptions, frequencies)}
+concept_graph_cache = LRUCache()  # {term: (concepts, counts)}
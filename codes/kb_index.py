@@ -0,0 +1,188 @@
+import argparse
+import heapq
+import mmap
+import os
+import time
+from array import array
+from config import *
+
+# prebuilt on-disk index of a knowledge base of (key, value, frequency) lines, such as the WebIsA files
+# (term -> description) or the Concept Graph (instance -> concept):
+# <name>.dat holds the lines sorted by key (utf-8 bytes), the postings of a key sorted by frequency, highest first
+# (ties in source order), <name>.idx holds the uint64 offset of each key block in <name>.dat plus the end offset
+# both files are memory-mapped, a lookup is a binary search over the key blocks and reads only the top-k lines
+# the mapped pages live in the OS page cache, so all worker processes share one copy of an index
+
+kb_index_path = '../data/kb_index/'
+
+open_indexes = {}  # {index path: KBIndex}, mapped once per process
+
+
+class KBIndex:
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.offsets = []
+        if os.path.getsize(path + '.dat') > 0:  # an empty file can not be mapped
+            with open(path + '.dat', 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(path + '.idx', 'rb') as f:
+                self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.offsets = memoryview(self.index).cast('Q')
+        self.keys = max(0, len(self.offsets) - 1)
+
+    def key_at(self, i):
+        start = self.offsets[i]
+        return self.data[start:self.data.find(b'\t', start)]
+
+    def find(self, key):
+        # number of the key block of key, -1 if it is not indexed
+        key = key.encode('utf-8')
+        low = 0
+        high = self.keys
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.keys and self.key_at(low) == key:
+            return low
+        return -1
+
+    def lookup(self, key, top_count=None):
+        # [(value, frequency string)] of key, highest frequencies first, at most top_count of them
+        i = self.find(key)
+        if i == -1:
+            return []
+        postings = []
+        start = self.offsets[i]
+        end = self.offsets[i + 1]
+        while start < end and (top_count is None or len(postings) < top_count):
+            line_end = self.data.find(b'\n', start, end)
+            fields = self.data[start:line_end].decode('utf-8').split('\t')
+            postings.append((fields[1], fields[2]))
+            start = line_end + 1
+        return postings
+
+
+def read_entries(source_path, key_field, value_field, freq_type, encoding):
+    # yield (key bytes, -frequency, line of the index) of the tab-separated lines of source_path,
+    # read like the extractors read them: a last line without line break is ignored
+    with open(source_path, 'r', encoding=encoding) as f:
+        for line in f:
+            if not line.endswith('\n'):
+                continue
+            fields = line[:-1].split('\t')
+            if len(fields) < 3:
+                continue
+            try:
+                freq = freq_type(fields[2])
+            except ValueError:
+                continue
+            key = fields[key_field].encode('utf-8')
+            value = fields[value_field].encode('utf-8')
+            yield key, -freq, key + b'\t' + value + b'\t' + fields[2].encode('utf-8') + b'\n'
+
+
+def sort_key(entry):
+    return entry[0], entry[1]  # stable sorts keep the source order of equal frequencies
+
+
+def write_run(entries, run_path):
+    entries.sort(key=sort_key)
+    with open(run_path, 'wb') as f:
+        for entry in entries:
+            f.write(entry[2])
+
+
+def iter_run(run_path, freq_type):
+    with open(run_path, 'rb') as f:
+        for line in f:
+            fields = line.split(b'\t')
+            yield fields[0], -freq_type(fields[2].decode('utf-8')), line
+
+
+def build_kb_index(source_path, path, key_field=0, value_field=1, freq_type=float, encoding=None,
+                   run_lines=1000000):
+    # index the tab-separated lines of source_path, files of more than run_lines lines are sorted externally:
+    # sorted runs are written to temp files and merged, so that multi-GB sources fit in memory
+    start = time.time()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    runs = []
+    entries = []
+    for entry in read_entries(source_path, key_field, value_field, freq_type, encoding):
+        entries.append(entry)
+        if len(entries) >= run_lines:
+            runs.append(path + '.run' + str(len(runs)))
+            write_run(entries, runs[-1])
+            entries = []
+    if len(runs) == 0:
+        entries.sort(key=sort_key)
+        sorted_entries = entries
+    else:
+        runs.append(path + '.run' + str(len(runs)))
+        write_run(entries, runs[-1])
+        entries = []
+        # heapq.merge keeps equal entries in the order of the runs, i.e. in source order
+        sorted_entries = heapq.merge(*[iter_run(run, freq_type) for run in runs], key=sort_key)
+
+    offsets = array('Q')
+    offset = 0
+    lines = 0
+    last_key = None
+    with open(path + '.dat.tmp', 'wb') as f:
+        for key, _, line in sorted_entries:
+            if key != last_key:
+                offsets.append(offset)
+                last_key = key
+            f.write(line)
+            offset += len(line)
+            lines += 1
+    offsets.append(offset)
+    with open(path + '.idx.tmp', 'wb') as f:
+        offsets.tofile(f)
+    for run in runs:
+        os.remove(run)
+    os.replace(path + '.dat.tmp', path + '.dat')
+    os.replace(path + '.idx.tmp', path + '.idx')  # last, an index is only used once both files are complete
+    print(source_path, len(offsets) - 1, 'keys', lines, 'lines indexed, time:', format(time.time() - start, '.1f'), 's')
+
+
+def open_kb_index(path, source_path):
+    # the index at path if it is built and newer than its source, None otherwise (callers scan the source)
+    if path in open_indexes:
+        return open_indexes[path]
+    if not os.path.exists(path + '.idx') or not os.path.exists(source_path) or \
+            os.path.getmtime(path + '.idx') < os.path.getmtime(source_path):
+        return None
+    open_indexes[path] = KBIndex(path)
+    return open_indexes[path]
+
+
+def webisa_index_path(initial_char):
+    # one index per WebIsA letter file, named like the file
+    return kb_index_path + 'webisa/' + initial_char + '_ten'
+
+
+def concept_graph_index_path():
+    return kb_index_path + 'concept_graph'
+
+
+def build_webisa_index():
+    for file_name in sorted(os.listdir(webisa_path)):
+        if file_name.endswith('_ten.txt'):
+            build_kb_index(webisa_path + file_name, webisa_index_path(file_name[:-len('_ten.txt')]))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='build the on-disk indexes of the knowledge bases')
+    arg_parser.add_argument('--webisa', action='store_true')
+    arg_parser.add_argument('--concept-graph', action='store_true')
+    args = arg_parser.parse_args()
+
+    if args.webisa:
+        build_webisa_index()
+    if args.concept_graph:  # lines of concept, instance, count
+        build_kb_index(concept_graph_path, concept_graph_index_path(), key_field=1, value_field=0, freq_type=int,
+                       encoding='utf-8')
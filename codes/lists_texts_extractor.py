@@ -1,9 +1,22 @@
 import requests
 import re
 import os
+import time
 from requests_html import HTMLSession
 from bs4 import BeautifulSoup
 from get_bing_results import parse_result
+from page_fetcher import PageFetcher, FetchResult
+from html_cache import HTMLCache
+from dom_extractor import DOMExtractor
+from multi_matcher import MultiMatcher
+from query_manifest import QueryManifest
+from candidates_store import CandidatesWriter, candidates_path, search_modes
+from bing_store import open_bing_store
+from pipeline_metrics import PipelineMetrics, MetricsSummary, UrlMetrics
+from warc_reader import WARCArchive
+from near_duplicate import PageFingerprint, NearDuplicateDetector
+from crawl_scheduler import CrawlScheduler
+from page_filter import PageFilter
 from utils import read_evaluation_data
 from config import *
 
@@ -13,20 +26,40 @@ requests.packages.urllib3.disable_warnings()
 # get all HTMLs and extract all lists and texts that related to query or items
 
 class HTMLAnalyzer:
-    def __init__(self, url, url_id, path, query, items):
+    def __init__(self, url, url_id, path, query, items, html=None, html_cache=None, dump_files=False, archive=None):
         self.url = url
         self.url_id = url_id
         self.path = path
         self.query = query
         self.items = items
-        self.html = self.get_html(url, url_id, path)
+        self.html_cache = html_cache
+        self.archive = archive  # WARCArchive of crawl dumps, read before the cache and the network
+        self.dump_files = dump_files  # save intermediate results of each stage to files for debugging
+        self.html = self.get_html(url, url_id, path, html)
+        self.content = ''  # html content lines, handed from html_get_content to extract_lists_texts_of_url
         self.text_len_threshold = 60
 
-    def get_html(self, url, url_id, path):
-        session = HTMLSession()
-        html = session.get(url, timeout=10).text
-        with open(path + '/html_' + url_id + '.txt', 'w', encoding='utf-8') as f:
-            f.write(html)
+    def get_html(self, url, url_id, path, html=None):
+        if html is None and self.archive is not None:
+            html = self.archive.get(url)
+        if html is None and self.html_cache is not None:
+            html = self.html_cache.get(url)
+        if html is None:  # not fetched by PageFetcher nor cached, download it here
+            session = HTMLSession()
+            response = session.get(url, timeout=10, stream=True)
+            try:  # same streaming filter as PageFetcher, PageRejected for pages that can not be used
+                reader = PageFilter().reader(response.headers.get('Content-Type', ''))
+                for chunk in response.iter_content(64 * 1024):
+                    if not reader.feed(chunk):
+                        break
+                html, _ = reader.finish()
+            finally:
+                response.close()
+            if self.html_cache is not None:
+                self.html_cache.put(url, html)
+        if self.dump_files:
+            with open(path + '/html_' + url_id + '.txt', 'w', encoding='utf-8') as f:
+                f.write(html)
         return html
 
     def html_pre_process(self):
@@ -63,8 +96,9 @@ class HTMLAnalyzer:
         soup = BeautifulSoup(self.html, "html.parser")
         self.html = soup.prettify()
 
-        with open(self.path + '/html-preprocess_' + self.url_id + '.txt', 'w', encoding='utf-8') as f:
-            f.write(self.html)
+        if self.dump_files:
+            with open(self.path + '/html-preprocess_' + self.url_id + '.txt', 'w', encoding='utf-8') as f:
+                f.write(self.html)
 
     def html_get_content(self):
         # remove lines with label
@@ -87,22 +121,27 @@ class HTMLAnalyzer:
             else:
                 html_content.append(html_lines[i])
 
-        with open(self.path + '/html-content_' + self.url_id + '.txt', 'w', encoding='utf-8') as f:
-            for i in range(len(html_content)):
-                html_content[i] = html_content[i].replace('\t', ' ')
-                html_content[i] = html_content[i].replace('* ', ' ')
-                html_content[i] = html_content[i].replace('*', ' ')
-                html_content[i] = html_content[i].replace('+ ', ' ')
-                html_content[i] = html_content[i].replace('+', ' ')
-                html_content[i] = html_content[i].replace(' o ', '  ')
-                html_content[i] = html_content[i].replace('Â', '')
-                html_content[i] = html_content[i].replace('â', '')
-                html_content[i] = html_content[i].replace('-', ' ')
-                if len(html_content[i].strip()) > 3:  # restrain the length
-                    f.write(html_content[i] + '\n')
+        content_lines = []
+        for i in range(len(html_content)):
+            html_content[i] = html_content[i].replace('\t', ' ')
+            html_content[i] = html_content[i].replace('* ', ' ')
+            html_content[i] = html_content[i].replace('*', ' ')
+            html_content[i] = html_content[i].replace('+ ', ' ')
+            html_content[i] = html_content[i].replace('+', ' ')
+            html_content[i] = html_content[i].replace(' o ', '  ')
+            html_content[i] = html_content[i].replace('Â', '')
+            html_content[i] = html_content[i].replace('â', '')
+            html_content[i] = html_content[i].replace('-', ' ')
+            if len(html_content[i].strip()) > 3:  # restrain the length
+                content_lines.append(html_content[i] + '\n')
+        self.content = ''.join(content_lines)
+
+        if self.dump_files:
+            with open(self.path + '/html-content_' + self.url_id + '.txt', 'w', encoding='utf-8') as f:
+                f.write(self.content)
 
     def extract_lists_texts_of_url(self):
-        # extract lists and texts from HTML content files and save
+        # extract lists and texts from HTML content and save
         lists = []
         texts = []
         lists_index = []  # start position of each list
@@ -110,8 +149,8 @@ class HTMLAnalyzer:
         space_nums = []
 
         # count space num for each line
-        with open(self.path + '/html-content_' + self.url_id + '.txt', 'r', encoding='utf-8') as f:
-            contents = f.read().split('\n')[:-1]
+        # split lines like reading the content back from a file in text mode, where '\r' also ends a line
+        contents = self.content.replace('\r\n', '\n').replace('\r', '\n').split('\n')[:-1]
         for i in range(len(contents)):
             num = 0
             for j in range(len(contents[i])):
@@ -170,6 +209,19 @@ class HTMLAnalyzer:
             else:
                 lists_descs.append('')
 
+        if self.dump_files:
+            self.save_lists_texts(lists, lists_descs, texts)
+        return lists, lists_descs, texts
+
+    def extract_lists_texts_dom(self):
+        # alternative to html_pre_process + html_get_content + extract_lists_texts_of_url:
+        # walk the parsed DOM once instead of prettifying the page and counting indentation
+        lists, lists_descs, texts = DOMExtractor(self.text_len_threshold).extract(self.html)
+        if self.dump_files:
+            self.save_lists_texts(lists, lists_descs, texts)
+        return lists, lists_descs, texts
+
+    def save_lists_texts(self, lists, lists_descs, texts):
         with open(self.path + '/html-lists_texts_' + self.url_id + '.txt', 'w', encoding='utf-8') as f:
             f.write(self.query + '\t' + self.url + '\t' + self.url_id + '\n')
             f.write('-----------------------------------------------------------\n')
@@ -184,25 +236,25 @@ class HTMLAnalyzer:
             f.write('-----------------------------------------------------------\n')
             for i in range(len(texts)):
                 f.write(texts[i] + '\n')
-        return lists, lists_descs, texts
 
 
 class ListExtractor:
     # get lists in html that contains some items
     def __init__(self):
         self.partly_contain_threshold = 0.3
+        self.matcher = None  # items matcher, compiled once per items set
+        self.matcher_items = None
+
+    def get_matcher(self, s):
+        if self.matcher_items != tuple(s):
+            self.matcher = MultiMatcher(s)
+            self.matcher_items = tuple(s)
+        return self.matcher
 
     def partly_contain(self, s, l):
         # s: items set, l: a list
         # if intersection(s, l) >= threshold*len(s) then s(l) partly contains l(s)
-        intersection = 0
-        for s_i in s:
-            for l_i in l:
-                s_i_reformat = s_i.replace(' ', '').lower()
-                l_i_reformat = l_i.replace(' ', '').lower()
-                if l_i_reformat.find(s_i_reformat) != -1:
-                    intersection += 1
-                    break
+        intersection = len(self.get_matcher(s).match_lines(l))  # items contained in any entry of the list
         if intersection >= self.partly_contain_threshold * len(s):
             return True
         else:
@@ -220,16 +272,19 @@ class TextExtractor:
     # get texts in html that contains query or some items
     def __init__(self):
         self.partly_contain_threshold = 0.3
+        self.matchers = {}  # {(items or query, strip spaces): matcher}, compiled once per query
+
+    def get_matcher(self, s, strip_spaces=True):
+        key = (tuple(s), strip_spaces)
+        if key not in self.matchers:
+            self.matchers[key] = MultiMatcher(s, strip_spaces)
+        return self.matchers[key]
 
     def partly_contain(self, s, t):
         # s: items set, t: a piece of plain text
         # if threshold of s are contained in t, then return True
-        intersection = 0
-        t_reformat = t.replace(' ', '').lower()
-        for s_i in s:
-            s_i_reformat = s_i.replace(' ', '').lower()
-            if t_reformat.find(s_i_reformat) != -1:
-                intersection += 1
+        matcher = self.get_matcher(s)
+        intersection = len(matcher.match(matcher.normalize(t)))
         if intersection >= self.partly_contain_threshold * len(s):
             return True
         else:
@@ -244,293 +299,389 @@ class TextExtractor:
 
     def get_query_candidates_region(self, q, T):
         candidate_set = []
-        q_lower = q.lower()
+        matcher = self.get_matcher([q], strip_spaces=False)
         for i in range(len(T)):
-            T_i_lower = T[i].lower()
-            if T_i_lower.find(q_lower) != -1:
+            if len(matcher.match(matcher.normalize(T[i]))) != 0:
                 candidate_set.append(T[i])
         return candidate_set
 
 
-def extract_lists_texts_one_url(query, items, url, url_id, top_results_path, query_or_items='query'):
-    # extract lists and texts from url for query and items
-    query_path = top_results_path + query + '_q/'
-    if not os.path.exists(query_path):
-        os.mkdir(query_path)
-    query_items_path = top_results_path + query + '_qi/'
-    if not os.path.exists(query_items_path):
-        os.mkdir(query_items_path)
-    items_path = top_results_path + query + '_i/'
-    if not os.path.exists(items_path):
-        os.mkdir(items_path)
+search_dirs = {'query': '_q/', 'query_items': '_qi/', 'items': '_i/'}  # folder of each search mode
 
-    url_id = str(url_id)
-    print('url: ' + url + '     ' + 'url_id: ' + url_id, end='')
-    if query_or_items == 'query':
-        print(' for query')
-    elif query_or_items == 'query_items':
-        print(' for query and items')
-    elif query_or_items == 'items':
-        print(' for items')
 
-    query_no_id = query.split('_')[0]
+def make_query_dirs(query, top_results_path):
+    for query_or_items in search_dirs:
+        path = top_results_path + query + search_dirs[query_or_items]
+        if not os.path.exists(path):
+            os.mkdir(path)
 
-    if query_or_items == 'query':  # only extract texts of query
-        # HTML Analyzer
-        html_analyzer = HTMLAnalyzer(url, url_id, query_path, query_no_id, items)
+
+def analyze_url(query, items, url, url_id, path, html=None, html_cache=None, dump_files=False,
+                extractor='prettify', url_metrics=None, archive=None):
+    # get all lists and texts in the url, stages hand off in memory unless dump_files is set
+    # extractor: 'prettify' for the indentation heuristics on prettified HTML, 'dom' for the DOM-native extractor
+    # url_metrics: UrlMetrics receiving the time of each stage, the stage is recorded with the error if one fails
+    query_no_id = query.split('_')[0]
+    if url_metrics is None:
+        url_metrics = UrlMetrics(url)
+    stage = 'fetch'
+    try:
+        start = time.time()
+        html_analyzer = HTMLAnalyzer(url, url_id, path, query_no_id, items, html, html_cache, dump_files, archive)
+        if html is None:  # downloaded by the analyzer itself
+            url_metrics.add_time(stage, time.time() - start)
+        if extractor == 'dom':
+            stage = 'segment'
+            start = time.time()
+            lists_texts = html_analyzer.extract_lists_texts_dom()
+            url_metrics.add_time(stage, time.time() - start)
+            return lists_texts
+        stage = 'preprocess'
+        start = time.time()
         html_analyzer.html_pre_process()
+        url_metrics.add_time(stage, time.time() - start)
+        stage = 'content'
+        start = time.time()
         html_analyzer.html_get_content()
-        lists, lists_descs, texts = html_analyzer.extract_lists_texts_of_url()  # get all lists and texts in the url
+        url_metrics.add_time(stage, time.time() - start)
+        stage = 'segment'
+        start = time.time()
+        lists_texts = html_analyzer.extract_lists_texts_of_url()
+        url_metrics.add_time(stage, time.time() - start)
+        return lists_texts
+    except Exception as e:
+        url_metrics.set_error(stage, e)
+        raise
+
+
+def extract_url_regions(query, items, lists, lists_descs, texts, query_or_items='query', list_extractor=None,
+                        text_extractor=None):
+    # extract candidate regions for query and items from the lists and texts of one url
+    # extractors can be shared by all urls of a query, so that their matchers are compiled once
+    query_no_id = query.split('_')[0]
+    if list_extractor is None:
+        list_extractor = ListExtractor()
+    if text_extractor is None:
+        text_extractor = TextExtractor()
 
+    if query_or_items == 'query':  # only extract texts of query
         # Text Extractor for query
-        text_extractor = TextExtractor()
         query_texts_candidates_region = text_extractor.get_query_candidates_region(query_no_id, texts)
-
-        # save text candidates for query
-        with open(top_results_path + query + '_q/html-candidates-query_' + url_id + '.txt', 'w', encoding='utf-8') as f:
-            for i in range(len(query_texts_candidates_region)):
-                if len(query_texts_candidates_region[i]) != 0:
-                    f.write(query_texts_candidates_region[i] + '\n')
-
         return query_texts_candidates_region
 
     elif query_or_items == 'query_items':  # extract texts of query and text and lists of items
-        # HTML Analyzer
-        html_analyzer = HTMLAnalyzer(url, url_id, query_items_path, query_no_id, items)
-        html_analyzer.html_pre_process()
-        html_analyzer.html_get_content()
-        lists, lists_descs, texts = html_analyzer.extract_lists_texts_of_url()  # get all lists and texts in the url
-
         # List Extractor and Text Extractor for items
-        list_extractor = ListExtractor()
-        text_extractor = TextExtractor()
         query_texts_candidates_region = text_extractor.get_query_candidates_region(query_no_id, texts)
         items_lists_candidates_region = list_extractor.get_items_candidates_region(items, lists, lists_descs)
         items_texts_candidates_region = text_extractor.get_items_candidates_region(items, texts)
-
-        # save text candidates for query
-        with open(top_results_path + query + '_qi/html-candidates-query_' + url_id + '.txt', 'w',
-                  encoding='utf-8') as f:
-            for i in range(len(query_texts_candidates_region)):
-                if len(query_texts_candidates_region[i]) != 0:
-                    f.write(query_texts_candidates_region[i] + '\n')
-        # save list candidates and text candidates for items
-        with open(top_results_path + query + '_qi/html-candidates-items_' + url_id + '.txt', 'w',
-                  encoding='utf-8') as f:
-            for i in range(len(items_lists_candidates_region)):
-                if len(items_lists_candidates_region[i]) != 0:
-                    f.write(items_lists_candidates_region[i] + '\n')
-            f.write('-----------------------------------------------------------\n')
-            for i in range(len(items_texts_candidates_region)):
-                if len(items_texts_candidates_region[i]) != 0:
-                    f.write(items_texts_candidates_region[i] + '\n')
-
         return query_texts_candidates_region, items_lists_candidates_region, items_texts_candidates_region
 
     elif query_or_items == 'items':  # extract texts and lists of items
-        # HTML Analyzer
-        html_analyzer = HTMLAnalyzer(url, url_id, items_path, query_no_id, items)
-        html_analyzer.html_pre_process()
-        html_analyzer.html_get_content()
-        lists, lists_descs, texts = html_analyzer.extract_lists_texts_of_url()  # get all lists and texts in the url
-
         # List Extractor and Text Extractor for items
-        list_extractor = ListExtractor()
-        text_extractor = TextExtractor()
         items_lists_candidates_region = list_extractor.get_items_candidates_region(items, lists, lists_descs)
         items_texts_candidates_region = text_extractor.get_items_candidates_region(items, texts)
-
-        # save list candidates and text candidates for items
-        with open(top_results_path + query + '_i/html-candidates-items_' + url_id + '.txt', 'w',
-                  encoding='utf-8') as f:
-            for i in range(len(items_lists_candidates_region)):
-                if len(items_lists_candidates_region[i]) != 0:
-                    f.write(items_lists_candidates_region[i] + '\n')
-            f.write('-----------------------------------------------------------\n')
-            for i in range(len(items_texts_candidates_region)):
-                if len(items_texts_candidates_region[i]) != 0:
-                    f.write(items_texts_candidates_region[i] + '\n')
-
         return items_lists_candidates_region, items_texts_candidates_region
 
 
-def extract_lists_texts(query, items, top_results_path):
+def extract_lists_texts_one_url(query, items, url, url_id, top_results_path, query_or_items='query', html=None,
+                                html_cache=None, dump_files=False, extractor='prettify', writer=None):
+    # extract lists and texts from url for query and items, records are appended to writer if given
+    url_id = str(url_id)
+    print('url: ' + url + '     ' + 'url_id: ' + url_id, end='')
+    if query_or_items == 'query':
+        print(' for query')
+    elif query_or_items == 'query_items':
+        print(' for query and items')
+    elif query_or_items == 'items':
+        print(' for items')
+
+    if dump_files:
+        make_query_dirs(query, top_results_path)
+    path = top_results_path + query + search_dirs[query_or_items]
+    lists, lists_descs, texts = analyze_url(query, items, url, url_id, path, html, html_cache, dump_files, extractor)
+    regions = extract_url_regions(query, items, lists, lists_descs, texts, query_or_items)
+    if writer is not None:
+        writer.write_url_regions(query_or_items, int(url_id), regions)
+    return regions
+
+
+def iter_pages(urls, fetcher, html_cache=None, archive=None, deadline_time=None):
+    # yield a FetchResult for each url, urls left at deadline_time fail with DeadlineExceeded
+    # the urls not archived nor cached are downloaded from the start, their pages are handed out between
+    # the archived and cached ones as they finish so that the deadline is not spent on local pages first
+    local_pages = []
+    missed_urls = []
+    for url in urls:
+        start = time.time()
+        html = archive.get(url) if archive is not None else None
+        if html is not None:
+            local_pages.append(FetchResult(url, url, html=html, elapsed=time.time() - start, source='archive'))
+            continue
+        html = html_cache.get(url) if html_cache is not None else None
+        if html is not None:
+            local_pages.append(FetchResult(url, url, html=html, elapsed=time.time() - start, source='cache'))
+        else:
+            missed_urls.append(url)
+    fetched = fetcher.fetch_iter([(url, url) for url in missed_urls], deadline_time)
+
+    def downloaded(result):
+        if result.error is None and html_cache is not None:
+            html_cache.put(result.url, result.html)
+        return result
+
+    try:
+        for page in local_pages:
+            result = fetched.poll()
+            while result is not None:
+                yield downloaded(result)
+                result = fetched.poll()
+            yield page
+        for result in fetched:
+            yield downloaded(result)
+    finally:
+        fetched.close()  # a consumer stopping early cancels the urls not fetched yet
+
+
+def read_bing_urls(query, top_results_path, bing_store=None):
+    # {search mode: urls} of a query, from the Bing store with one lookup if the query is ingested,
+    # else from the three Bing result files, None on error
+    urls_of_modes = None
+    if bing_store is not None:
+        urls_of_modes = bing_store.get_urls(query)
+    if urls_of_modes is None:
+        urls_of_modes = {}
+        for query_or_items in search_modes:
+            file_name = top_results_path + query + '_' + search_modes[query_or_items] + '_bing_result.json'
+            _, _, _, urls = parse_result(file_name)
+            urls_of_modes[query_or_items] = urls
+    for query_or_items in search_modes:
+        if urls_of_modes[query_or_items] == 'error':
+            print('query ', query, ' error')
+            return None
+    return urls_of_modes
+
+
+def extract_lists_texts(query, items, top_results_path, fetcher=None, html_cache=None, dump_files=False,
+                        extractor='prettify', bing_store=None, metrics=None, archive=None, near_duplicates='off',
+                        deadline=None, region_target=None):
     # extract lists and texts for query and items in all urls returned by Bing
+    # candidate regions are saved as records in <query>_candidates.jsonl (see candidates_store)
+    # metrics: PipelineMetrics receiving the stage timings, bytes, regions and errors of each url
+    # archive: WARCArchive of crawl dumps, pages found there are neither fetched nor cached
+    # near_duplicates: 'off' to analyze every page, 'collapse' pages near-duplicating a page already processed
+    # for the query onto that page (its regions are written for search modes it was not returned in), or 'skip'
+    # them (no regions for their search modes, even those the processed page was not returned in)
+    # deadline: seconds of wall clock for the urls of the query, None for no deadline
+    # region_target: stop once this many query-text and item-list regions are extracted, None for all urls
     print('query: ' + query + '     ' + 'items: ' + str(items))
 
-    if os.path.exists(top_results_path + query + '_qi/candidates-query.txt') and os.path.exists(
+    # earlier versions saved candidate regions to the four candidates files
+    manifest = QueryManifest(top_results_path + query + '_manifest.json')
+    if manifest.stage_done('candidates') or (os.path.exists(
+            top_results_path + query + '_qi/candidates-query.txt') and os.path.exists(
             top_results_path + query + '_qi/candidates-items.txt') and os.path.exists(
             top_results_path + query + '_q/candidates-query.txt') and os.path.exists(
-            top_results_path + query + '_i/candidates-items.txt'):
+            top_results_path + query + '_i/candidates-items.txt')):
         print('lists and texts are already extracted')
         return
 
     # ------------------------------get all urls for query and its corresponding items------------------------------
-    query_urls = []
-    query_items_urls = []
-    items_urls = []
-
-    # query for search
-    file_name = top_results_path + query + '_q_bing_result.json'
-    _, _, _, urls = parse_result(file_name)
-    query_urls.extend(urls)
-    if urls == 'error':
-        print('query ', query, ' error')
+    urls_of_modes = read_bing_urls(query, top_results_path, bing_store)
+    if urls_of_modes is None:
         return
-
-    # query + all items for search
-    file_name = top_results_path + query + '_qi_bing_result.json'
-    _, _, _, urls = parse_result(file_name)
-    query_items_urls.extend(urls)
-    if urls == 'error':
-        print('query ', query, ' error')
-        return
-
-    # items for search
-    file_name = top_results_path + query + '_i_bing_result.json'
-    _, _, _, urls = parse_result(file_name)
-    items_urls.extend(urls)
-    if urls == 'error':
-        print('query ', query, ' error')
+    query_urls = urls_of_modes['query']
+    query_items_urls = urls_of_modes['query_items']
+    items_urls = urls_of_modes['items']
+    manifest.set_stage_done('urls')
+
+    # ------------------------------fetch all urls of the query at once------------------------------
+    # the same url often appears in several search modes, it is fetched and analyzed only once
+    search_urls = [('query', 'use query for search', query_urls),
+                   ('query_items', 'use query + items for search', query_items_urls),
+                   ('items', 'use items for search', items_urls)]
+    url_modes = {}  # {url: [(search mode, url index), ...]}
+    for query_or_items, desc, urls in search_urls:
+        print(desc)
+        print(len(urls))
+        for i in range(len(urls)):
+            if urls[i] not in url_modes:
+                url_modes[urls[i]] = []
+            url_modes[urls[i]].append((query_or_items, i))
+    print('distinct urls:', len(url_modes))
+
+    if dump_files:
+        make_query_dirs(query, top_results_path)
+    list_extractor = ListExtractor()
+    text_extractor = TextExtractor()
+
+    # regions of urls completed by an earlier run are already in the candidates file
+    if not os.path.exists(candidates_path(top_results_path, query)):
+        manifest.urls = {}
+    done_urls = set()
+    for url in list(url_modes):
+        modes = []
+        for query_or_items, i in url_modes[url]:
+            if manifest.url_done(query_or_items, i):
+                done_urls.add((search_modes[query_or_items], i))
+            else:
+                modes.append((query_or_items, i))
+        if len(modes) == 0:
+            del url_modes[url]
+        else:
+            url_modes[url] = modes
+    if len(done_urls) > 0:
+        print('resume, urls already done:', len(done_urls), 'urls left:', len(url_modes))
+    writer = CandidatesWriter(candidates_path(top_results_path, query), done_urls if len(done_urls) > 0 else None)
+
+    # regions are written as pages finish, so memory is bounded by the pages in flight
+    duplicates = NearDuplicateDetector() if near_duplicates != 'off' else None
+    collapsed = {} if near_duplicates == 'collapse' else None
+    summary = MetricsSummary()
+    if metrics is not None:
+        metrics.start_query(query)
+    scheduler = CrawlScheduler(deadline, region_target)  # urls in Bing rank order
+    scheduler.start()
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = PageFetcher()
+    pages = iter_pages(scheduler.order(url_modes), fetcher, html_cache, archive, scheduler.deadline_time)
+    try:  # a failing url must not leak the downloads, the client session nor unflushed regions
+        for result in pages:
+            url_metrics = UrlMetrics(result.url, result.source)
+            url_metrics.add_time('fetch', result.elapsed)
+            url_metrics.bytes = result.size
+            if result.error is not None:
+                url_metrics.set_error('fetch', result.error)
+                print('url: ' + result.url + '     ' + 'fetch error: ' + type(result.error).__name__)
+            else:
+                extract_url(query, items, result, url_modes[result.url], top_results_path, dump_files, extractor,
+                            list_extractor, text_extractor, writer, manifest, url_metrics, duplicates, collapsed)
+            summary.add(url_metrics)
+            if metrics is not None:
+                metrics.add_url(url_metrics)
+            scheduler.add(url_metrics)
+            if scheduler.should_stop() and summary.urls < len(url_modes):
+                print('early stop:', 'region target reached' if scheduler.target_reached() else 'deadline passed',
+                      scheduler.regions, 'regions,', len(url_modes) - summary.urls, 'urls left')
+                break
+    finally:
+        pages.close()
+        writer.close()
+        if own_fetcher:
+            fetcher.close()
+    if metrics is not None:
+        metrics.end_query()
+    if duplicates is not None:
+        summary = summary.to_dict()
+        print('near duplicates:', summary['duplicates'], '/', summary['urls'], 'urls, skip rate:',
+              summary['duplicate_rate'], ' time saved:', summary['duplicate_saved_s'], 's')
+    # the query is done once every url was processed or the region target reached, urls left by the deadline
+    # or by fetch and analysis errors are picked up by the next run
+    urls_left = [url for url in url_modes if not all([manifest.url_done(query_or_items, i)
+                                                      for query_or_items, i in url_modes[url]])]
+    if len(urls_left) > 0 and not scheduler.target_reached():
+        print('urls left for a later run:', len(urls_left))
         return
-
-    # ------------------------------query for search------------------------------
-    print('use query for search')
-    urls = query_urls
-    print(len(urls))
-    urls_ids = [str(i) for i in range(len(urls))]
-
-    query_texts_candidates_region_q = []
-
-    for i in range(len(urls)):
-        try:
-            query_text_region = extract_lists_texts_one_url(query, items, urls[i], urls_ids[i], top_results_path, 'query')
-            query_texts_candidates_region_q.extend(query_text_region)
-        except Exception:
-            continue
-
-    # convert to lower
-    for i in range(len(query_texts_candidates_region_q)):
-        query_texts_candidates_region_q[i] = query_texts_candidates_region_q[i].lower()
-
-    # ------------------------------query + items for search------------------------------
-    print('use query + items for search')
-    urls = query_items_urls
-    print(len(urls))
-    urls_ids = [str(i) for i in range(len(urls))]
-
-    query_texts_candidates_region_qi = []
-    items_lists_candidates_region_qi = []
-    items_texts_candidates_region_qi = []
-
-    for i in range(len(urls)):
-        try:
-            query_text_region, items_list_region, items_text_region = extract_lists_texts_one_url(query, items, urls[i], urls_ids[i], top_results_path, 'query_items')
-            query_texts_candidates_region_qi.extend(query_text_region)
-            items_lists_candidates_region_qi.extend(items_list_region)
-            items_texts_candidates_region_qi.extend(items_text_region)
-        except Exception:
-            continue
-
-    # convert to lower
-    for i in range(len(query_texts_candidates_region_qi)):
-        query_texts_candidates_region_qi[i] = query_texts_candidates_region_qi[i].lower()
-    for i in range(len(items_lists_candidates_region_qi)):
-        items_lists_candidates_region_qi[i] = items_lists_candidates_region_qi[i].lower()
-    for i in range(len(items_texts_candidates_region_qi)):
-        items_texts_candidates_region_qi[i] = items_texts_candidates_region_qi[i].lower()
-
-    # ------------------------------items for search------------------------------
-    print('use items for search')
-    urls = items_urls
-    print(len(urls))
-    urls_ids = [str(i) for i in range(len(urls))]
-
-    items_lists_candidates_region_i = []
-    items_texts_candidates_region_i = []
-
-    for i in range(len(urls)):
-        try:
-            items_list_region, items_text_region = extract_lists_texts_one_url(query, items, urls[i], urls_ids[i],
-                                                                               top_results_path, 'items')
-            items_lists_candidates_region_i.extend(items_list_region)
-            items_texts_candidates_region_i.extend(items_text_region)
-        except Exception:
-            continue
-
-    # convert to lower
-    for i in range(len(items_lists_candidates_region_i)):
-        items_lists_candidates_region_i[i] = items_lists_candidates_region_i[i].lower()
-    for i in range(len(items_texts_candidates_region_i)):
-        items_texts_candidates_region_i[i] = items_texts_candidates_region_i[i].lower()
-
-    # save all regions
-    with open(top_results_path + query + '_q/candidates-query.txt', 'w', encoding='utf-8') as f:
-        f.write(query + '\t' + str(items) + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(query_texts_candidates_region_q)):
-            if len(query_texts_candidates_region_q[i]) != 0:
-                f.write(query_texts_candidates_region_q[i] + '\n')
-
-    with open(top_results_path + query + '_qi/candidates-query.txt', 'w', encoding='utf-8') as f:
-        f.write(query + '\t' + str(items) + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(query_texts_candidates_region_qi)):
-            if len(query_texts_candidates_region_qi[i]) != 0:
-                f.write(query_texts_candidates_region_qi[i] + '\n')
-    with open(top_results_path + query + '_qi/candidates-items.txt', 'w', encoding='utf-8') as f:
-        f.write(query + '\t' + str(items) + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(items_lists_candidates_region_qi)):
-            if len(items_lists_candidates_region_qi[i]) != 0:
-                f.write(items_lists_candidates_region_qi[i] + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(items_texts_candidates_region_qi)):
-            if len(items_texts_candidates_region_qi[i]) != 0:
-                f.write(items_texts_candidates_region_qi[i] + '\n')
-
-    with open(top_results_path + query + '_i/candidates-items.txt', 'w', encoding='utf-8') as f:
-        f.write(query + '\t' + str(items) + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(items_lists_candidates_region_i)):
-            if len(items_lists_candidates_region_i[i]) != 0:
-                f.write(items_lists_candidates_region_i[i] + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(items_texts_candidates_region_i)):
-            if len(items_texts_candidates_region_i[i]) != 0:
-                f.write(items_texts_candidates_region_i[i] + '\n')
-
-    # save useful regions to top_results_path (root path)
-    with open(top_results_path + query + '_candidates-query.txt', 'w', encoding='utf-8') as f:
-        f.write(query + '\t' + str(items) + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(query_texts_candidates_region_q)):
-            if len(query_texts_candidates_region_q[i]) != 0:
-                f.write(query_texts_candidates_region_q[i] + '\n')
-    
-    with open(top_results_path + query + '_qi/candidates-items.txt', 'w', encoding='utf-8') as f:
-        f.write(query + '\t' + str(items) + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(items_lists_candidates_region_qi)):
-            if len(items_lists_candidates_region_qi[i]) != 0:
-                f.write(items_lists_candidates_region_qi[i] + '\n')
-        f.write('-----------------------------------------------------------\n')
-        for i in range(len(items_texts_candidates_region_qi)):
-            if len(items_texts_candidates_region_qi[i]) != 0:
-                f.write(items_texts_candidates_region_qi[i] + '\n')
-
+    manifest.set_stage_done('regions')
+    manifest.set_stage_done('candidates')
     print('OK')
 
 
-def extract_eval_lists_texts():
+def extract_url(query, items, result, modes, top_results_path, dump_files, extractor, list_extractor,
+                text_extractor, writer, manifest, url_metrics, duplicates=None, collapsed=None):
+    # analyze a downloaded page once and write its regions for each search mode it was returned in
+    # duplicates: NearDuplicateDetector of the pages processed for the query, None to analyze every page
+    # collapsed: {url: (lists, lists_descs, texts, search modes written)} of processed pages to collapse
+    # near-duplicates onto, None to skip near-duplicates
+    first_mode, first_id = modes[0]
+    print('url: ' + result.url + '     ' + 'url_ids: ' + str(modes))
+    if duplicates is not None:
+        start = time.time()
+        fingerprint = PageFingerprint(result.html)
+        duplicate_of = duplicates.find(fingerprint)
+        url_metrics.add_time('fingerprint', time.time() - start)
+        if duplicate_of is not None:
+            url_metrics.duplicate_of = duplicate_of
+            print('url: ' + result.url + '     ' + 'near duplicate of: ' + duplicate_of)
+            if collapsed is not None:  # only search modes the page was not returned in yet
+                lists, lists_descs, texts, done_modes = collapsed[duplicate_of]
+                new_modes = [(query_or_items, i) for query_or_items, i in modes if query_or_items not in done_modes]
+                done_modes.update([query_or_items for query_or_items, _ in new_modes])
+                match_url_regions(query, items, result.url, lists, lists_descs, texts, new_modes, list_extractor,
+                                  text_extractor, writer, manifest, url_metrics)
+            for query_or_items, i in modes:
+                manifest.set_url_done(query_or_items, i)
+            return
+    try:
+        lists, lists_descs, texts = analyze_url(query, items, result.url, str(first_id),
+                                                top_results_path + query + search_dirs[first_mode], result.html,
+                                                dump_files=dump_files, extractor=extractor, url_metrics=url_metrics)
+    except Exception as e:
+        print('url: ' + result.url + '     ' + 'error: ' + type(e).__name__)
+        return
+    if duplicates is not None:
+        duplicates.add(fingerprint, result.url)
+    if collapsed is not None:
+        collapsed[result.url] = (lists, lists_descs, texts, set([query_or_items for query_or_items, _ in modes]))
+    match_url_regions(query, items, result.url, lists, lists_descs, texts, modes, list_extractor, text_extractor,
+                      writer, manifest, url_metrics)
+
+
+def match_url_regions(query, items, url, lists, lists_descs, texts, modes, list_extractor, text_extractor, writer,
+                      manifest, url_metrics):
+    # match and write the regions of the lists and texts of a page for each search mode
+    for query_or_items, i in modes:
+        start = time.time()
+        try:
+            regions = extract_url_regions(query, items, lists, lists_descs, texts, query_or_items,
+                                          list_extractor, text_extractor)
+            writer.write_url_regions(query_or_items, i, regions)
+            manifest.set_url_done(query_or_items, i)
+            if query_or_items == 'query':
+                url_metrics.regions[query_or_items] = len(regions)
+                url_metrics.key_regions += len(regions)  # query texts
+            else:
+                url_metrics.regions[query_or_items] = sum([len(region) for region in regions])
+                if query_or_items == 'query_items':  # query texts and items lists
+                    url_metrics.key_regions += len(regions[0]) + len(regions[1])
+                else:  # items lists
+                    url_metrics.key_regions += len(regions[0])
+        except Exception as e:
+            url_metrics.set_error('match', e)
+            print('url: ' + url + '     ' + 'error: ' + type(e).__name__)
+        url_metrics.add_time('match', time.time() - start)
+
+
+def extract_eval_lists_texts(dump_files=False, extractor='prettify', warc_index='', near_duplicates='off',
+                             deadline=None, region_target=None):
     # read evaluation data
     o_queries, o_items, l_queries, l_items, d_queries, d_items = read_evaluation_data()
+    fetcher = PageFetcher()  # one fetcher and page cache for all queries
+    html_cache = HTMLCache()
+    metrics = PipelineMetrics()
+    archive = WARCArchive(warc_index) if warc_index != '' else None  # index built by warc_reader.py
+    bing_stores = [open_bing_store(path) for path in [top_results_overall_good_path, top_results_query_log_path,
+                                                      top_results_query_dimension_path]]
     for i in range(100):
         print(i + 1, o_queries[i], o_items[i])
-        extract_lists_texts(o_queries[i], o_items[i], top_results_overall_good_path)
+        extract_lists_texts(o_queries[i], o_items[i], top_results_overall_good_path, fetcher, html_cache,
+                            dump_files, extractor, bing_stores[0], metrics, archive, near_duplicates,
+                            deadline, region_target)
     for i in range(100):
         print(i + 1, l_queries[i], l_items[i])
-        extract_lists_texts(l_queries[i], l_items[i], top_results_query_log_path)
+        extract_lists_texts(l_queries[i], l_items[i], top_results_query_log_path, fetcher, html_cache,
+                            dump_files, extractor, bing_stores[1], metrics, archive, near_duplicates,
+                            deadline, region_target)
     for i in range(100):
         print(i + 1, d_queries[i], d_items[i])
-        extract_lists_texts(d_queries[i], d_items[i], top_results_query_dimension_path)
+        extract_lists_texts(d_queries[i], d_items[i], top_results_query_dimension_path, fetcher, html_cache,
+                            dump_files, extractor, bing_stores[2], metrics, archive, near_duplicates,
+                            deadline, region_target)
+    fetcher.close()
+    html_cache.close()
+    metrics.close()
+    if archive is not None:
+        archive.close()
+    for bing_store in bing_stores:
+        if bing_store is not None:
+            bing_store.close()
@@ -0,0 +1,64 @@
+import glob
+import os
+from config import *
+
+# NLP models of the ranker, loaded once per process and handed to every CandidatesExtractorRanker:
+# loading the stanza pipeline took most of the time of a query when each ranker built its own
+# batch drivers load them before forking their workers, which then inherit the warm models
+# the libraries are imported on first use: a process that never ranks, or never computes the semantic features,
+# does not pay for importing stanza, inflect, transformers and tensorflow
+
+# the ranker only reads the POS tags of the words, mwt keeps the words of contractions as before
+stanza_processors = 'tokenize,mwt,pos'
+
+parsers = {}  # {use_gpu: stanza pipeline}
+inflectors = []  # the inflect engine, once loaded
+bert_models = []  # (tokenizer, TF model) of bert_model_path, once loaded
+
+
+def get_parser(use_gpu=True):
+    if use_gpu not in parsers:
+        import stanza
+        parsers[use_gpu] = stanza.Pipeline('en', stanza_path, processors=stanza_processors, use_gpu=use_gpu)
+    return parsers[use_gpu]
+
+
+def stanza_documents(texts):
+    # texts as stanza documents, to be processed by one multi-document pipeline call
+    import stanza
+    return [stanza.Document([], text=text) for text in texts]
+
+
+def get_inflector():
+    if len(inflectors) == 0:
+        import inflect
+        inflectors.append(inflect.engine())
+    return inflectors[0]
+
+
+def get_bert():
+    # (tokenizer, model) of the semantic features
+    if len(bert_models) == 0:
+        from transformers import AutoTokenizer, TFAutoModel
+        tokenizer = AutoTokenizer.from_pretrained(bert_model_path)
+        bert_models.append((tokenizer, TFAutoModel.from_pretrained(bert_model_path)))
+    return bert_models[0]
+
+
+def fork_safe():
+    # models on the GPU do not survive a fork, the workers then load their own on first use
+    # the check must not initialize CUDA in this process, forked workers could not use it anymore:
+    # no NVIDIA device files or no visible device means no GPU, else torch asks NVML instead of the CUDA runtime
+    if os.environ.get('CUDA_VISIBLE_DEVICES') in ['', '-1'] or len(glob.glob('/dev/nvidia[0-9]*')) == 0:
+        return True
+    os.environ['PYTORCH_NVML_BASED_CUDA_CHECK'] = '1'
+    import torch
+    return not torch.cuda.is_available()
+
+
+def warm_up():
+    # load the models in this process, before forking workers that share them
+    # (not the TF model of the semantic features, tensorflow does not support forking once initialized)
+    if fork_safe():
+        get_parser()
+    get_inflector()
@@ -0,0 +1,55 @@
+try:
+    import ahocorasick  # pyahocorasick, optional: a C automaton scanning each line once for all patterns
+except ImportError:
+    ahocorasick = None
+
+# multi-pattern matcher compiled once per query from the normalized items (or query),
+# reports which patterns a normalized line contains
+
+
+class MultiMatcher:
+    def __init__(self, patterns, strip_spaces=True):
+        self.strip_spaces = strip_spaces
+        self.num_patterns = len(patterns)
+        self.always = set()  # indexes of empty patterns, contained in every line
+        self.indexes = {}  # {normalized pattern: [indexes of the patterns]}, items may repeat
+        for i in range(len(patterns)):
+            pattern = self.normalize(patterns[i])
+            if pattern == '':
+                self.always.add(i)
+            elif pattern not in self.indexes:
+                self.indexes[pattern] = [i]
+            else:
+                self.indexes[pattern].append(i)
+
+        self.automaton = None
+        if ahocorasick is not None and len(self.indexes) > 1:
+            self.automaton = ahocorasick.Automaton()
+            for pattern in self.indexes:
+                self.automaton.add_word(pattern, self.indexes[pattern])
+            self.automaton.make_automaton()
+
+    def normalize(self, text):
+        text = text.lower()
+        if self.strip_spaces:
+            text = text.replace(' ', '')
+        return text
+
+    def match(self, line):
+        # line: a normalized line, return the set of indexes of the patterns contained in it
+        matched = set(self.always)
+        if self.automaton is not None:
+            for _, indexes in self.automaton.iter(line):
+                matched.update(indexes)
+        else:
+            for pattern in self.indexes:
+                if pattern in line:
+                    matched.update(self.indexes[pattern])
+        return matched
+
+    def match_lines(self, lines):
+        # patterns contained in any of the lines, scanned at once as one joined text:
+        # patterns have no line break, so no match can span two lines
+        if len(lines) == 0:
+            return set()
+        return self.match('\n'.join([self.normalize(line) for line in lines]))
@@ -0,0 +1,77 @@
+import hashlib
+import re
+import numpy as np
+
+# near-duplicate page detection with 64-bit SimHash on the cheaply stripped text of a page,
+# computed before the expensive stages so that mirrors, syndicated copies and pagination variants
+# of a page already processed for the query are skipped (or collapsed onto it) instead of analyzed again
+
+re_invisible = re.compile(r'<(script|style|noscript)[\s\S]*?</\1\s*>|<!--[\s\S]*?-->', re.IGNORECASE)
+re_tag = re.compile(r'<[^>]*>')
+re_word = re.compile(r'\w+')
+
+
+def strip_words(html):
+    # lower-cased words of the visible text, without parsing the page
+    return re_word.findall(re_tag.sub(' ', re_invisible.sub(' ', html)).lower())
+
+
+def shingle_hashes(words, shingle_size=3):
+    # 64-bit hashes of the distinct word shingles
+    shingles = set([' '.join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))])
+    return [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+            for shingle in shingles]
+
+
+def simhash(hashes):
+    # each bit is set if it is set in the majority of the shingle hashes
+    if len(hashes) == 0:
+        return 0
+    bits = np.unpackbits(np.array(hashes, dtype=np.uint64).view(np.uint8).reshape(-1, 8), axis=1,
+                         bitorder='little')
+    majority = (bits.sum(axis=0) * 2 > len(hashes)).astype(np.uint8)
+    return int.from_bytes(np.packbits(majority, bitorder='little').tobytes(), 'little')
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class PageFingerprint:
+    def __init__(self, html, shingle_size=3):
+        words = strip_words(html)
+        # pages without visible text (script-rendered, framesets, error pages) would all share one digest
+        self.empty = len(words) == 0
+        self.digest = hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=16).digest()  # exact copies
+        hashes = shingle_hashes(words, shingle_size)
+        self.shingles = len(hashes)
+        self.simhash = simhash(hashes)
+
+
+class NearDuplicateDetector:
+    def __init__(self, max_distance=3, min_shingles=20):
+        # max_distance: largest Hamming distance of the SimHashes of two near-duplicate pages
+        # min_shingles: shorter pages are only compared as exact copies, their SimHash is not reliable
+        self.max_distance = max_distance
+        self.min_shingles = min_shingles
+        self.digests = {}  # {exact digest: url}
+        self.fingerprints = []  # [(simhash, url)] of the pages processed for the query
+
+    def find(self, fingerprint):
+        # url of a processed page that fingerprint duplicates, None if the page is new or has no text
+        if fingerprint.empty:
+            return None
+        if fingerprint.digest in self.digests:
+            return self.digests[fingerprint.digest]
+        if fingerprint.shingles >= self.min_shingles:
+            for other, url in self.fingerprints:
+                if hamming_distance(fingerprint.simhash, other) <= self.max_distance:
+                    return url
+        return None
+
+    def add(self, fingerprint, url):
+        if fingerprint.empty:
+            return
+        self.digests[fingerprint.digest] = url
+        if fingerprint.shingles >= self.min_shingles:
+            self.fingerprints.append((fingerprint.simhash, url))
@@ -0,0 +1,50 @@
+import heapq
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+
+# n-gram counting of the candidates texts of the ranker: tokens are interned to integer ids and the n-grams
+# counted as tuples of ids in one C-level Counter pass per n, n-gram strings are only built for the few top entries
+
+
+class NgramCounter:
+    def __init__(self, max_n=5):
+        self.max_n = max_n
+        self.ids = {}  # {token: id}
+        self.tokens = []  # token of each id
+        self.lines = []  # token ids of each line
+        self.counts = {}  # {n: {n-gram as a tuple of ids: frequency}}, counted on first use
+
+    def add(self, tokens):
+        # add the tokens of a line, n-grams do not cross lines
+        ids = []
+        for token in tokens:
+            i = self.ids.get(token)
+            if i is None:
+                i = len(self.tokens)
+                self.ids[token] = i
+                self.tokens.append(token)
+            ids.append(i)
+        self.lines.append(ids)
+
+    def get_counts(self, n):
+        if n not in self.counts:
+            self.counts[n] = Counter(chain.from_iterable(zip(*[ids[i:] for i in range(n)]) for ids in self.lines))
+        return self.counts[n]
+
+    def top(self, n, count, keep=None):
+        # [(n-gram, frequency)] of the count most frequent n-grams whose tuple of ids passes keep, highest frequencies
+        # first, ties in order of first occurrence (like a stable sort)
+        counts = self.get_counts(n)
+        # keep is only called on the head of the ranking, widened until enough n-grams pass
+        pool = count
+        while True:
+            top_grams = heapq.nlargest(pool, counts.items(), key=itemgetter(1))  # stable like sorted
+            if keep is not None:
+                kept_grams = [gram for gram in top_grams if keep(gram[0])]
+            else:
+                kept_grams = top_grams
+            if len(kept_grams) >= count or len(top_grams) < pool:
+                break
+            pool *= 4
+        return [(' '.join([self.tokens[i] for i in gram]), freq) for gram, freq in kept_grams[:count]]
@@ -0,0 +1,226 @@
+import asyncio
+import concurrent.futures
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import aiohttp
+from crawl_scheduler import HostCircuitBreaker, DeadlineExceeded, FetchCancelled, CircuitOpenError
+from page_filter import PageFilter
+
+# asynchronous page fetcher: downloads all urls of a query concurrently through one pooled client, kept open
+# across queries on an event loop thread of the fetcher until close,
+# with a global concurrency limit and a per-host concurrency limit, and hands pages back as they finish
+# transient failures are retried with exponential backoff, hosts failing repeatedly are skipped by a circuit breaker,
+# and urls not fetched before the deadline of the query, or when the consumer stops early, are given up
+# bodies are streamed through a PageFilter: non-html and binary pages are dropped, optionally non-English pages
+# too and the size capped
+
+transient_statuses = {429, 500, 502, 503, 504}
+read_chunk_size = 64 * 1024
+
+
+class TransientHTTPError(Exception):
+    # a response status worth retrying
+    pass
+
+
+class FetchResult:
+    def __init__(self, key, url, html=None, error=None, elapsed=0.0, size=0, source='network'):
+        self.key = key  # caller's identifier of the url, e.g. (search mode, url id)
+        self.url = url
+        self.html = html
+        self.error = error  # exception raised while fetching, None if the page was downloaded
+        self.elapsed = elapsed
+        self.size = size  # downloaded bytes
+        self.source = source  # 'network', or where the page was read from without downloading it: 'cache', 'archive'
+
+
+class FetchControl:
+    # deadline and cancellation of one fetch_iter call, shared with its fetching thread
+    def __init__(self, deadline_time=None):
+        self.deadline_time = deadline_time  # time.time() after which urls are given up, None for no deadline
+        self.cancelled = threading.Event()
+
+    def expired(self):
+        return self.deadline_time is not None and time.time() >= self.deadline_time
+
+
+class FetchStream:
+    # results of one fetch_iter call, fetched on the event loop of the fetcher from the call on: iterating yields
+    # them in the order they finish, poll returns one only if it is ready, close cancels the urls not fetched yet
+    def __init__(self, count, results, control, future):
+        self.left = count
+        self.results = results
+        self.control = control
+        self.future = future  # concurrent future of the fetch_all call
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        result = self.get(True)
+        if result is None:
+            raise StopIteration
+        return result
+
+    def poll(self):
+        return self.get(False)
+
+    def get(self, block):
+        if self.left == 0:
+            self.close()
+            return None
+        try:
+            result = self.results.get(block)
+        except queue.Empty:
+            return None
+        if isinstance(result, Exception):
+            self.close()
+            raise result
+        self.left -= 1
+        return result
+
+    def close(self):
+        self.control.cancelled.set()
+        if self.left == 0:
+            concurrent.futures.wait([self.future])
+
+
+def is_transient(e):
+    return isinstance(e, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                          TransientHTTPError))
+
+
+class PageFetcher:
+    def __init__(self, max_concurrency=32, max_per_host=4, timeout=10, max_retries=2, backoff=0.5, breaker=None,
+                 page_filter=None):
+        # max_retries, backoff: retries of a transient failure, waiting backoff * 2^attempt seconds (jittered)
+        # breaker: HostCircuitBreaker kept across queries, a new one if None
+        # page_filter: PageFilter of the downloaded bodies, the default one if None
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker if breaker is not None else HostCircuitBreaker()
+        self.page_filter = page_filter if page_filter is not None else PageFilter()
+        self.headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/603.3.8 '
+                                      '(KHTML, like Gecko) Version/10.1.2 Safari/603.3.8'}
+        self.loop = None  # event loop of the downloads, run by loop_thread from the first fetch_iter call
+        self.loop_thread = None
+        self.session = None  # client session of all downloads, created on the loop on first use
+
+    def get_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.loop_thread.start()
+        return self.loop
+
+    async def get_session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_per_host,
+                                             ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self.session
+
+    def close(self):
+        # close the client session and stop the event loop, a later fetch_iter call starts new ones
+        if self.loop is None:
+            return
+        if self.session is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+            self.session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+        self.loop = None
+        self.loop_thread = None
+
+    def fetch_iter(self, urls, deadline_time=None):
+        # urls: list of (key, url), start fetching them and return a FetchStream of a FetchResult for each url
+        # deadline_time: time.time() after which the urls left fail with DeadlineExceeded
+        # closing the stream early cancels the urls not fetched yet
+        results = queue.Queue()
+        control = FetchControl(deadline_time)
+
+        def done(future):
+            if not future.cancelled() and future.exception() is not None:
+                results.put(future.exception())
+
+        future = asyncio.run_coroutine_threadsafe(self.fetch_all(urls, results.put, control), self.get_loop())
+        future.add_done_callback(done)
+        return FetchStream(len(urls), results, control, future)
+
+    async def fetch_all(self, urls, callback, control):
+        await self.schedule(await self.get_session(), urls, callback, control)
+
+    async def schedule(self, session, urls, callback, control):
+        # start all urls in order under the concurrency limits, give up the unfinished ones at the deadline
+        # or on cancellation, each url gets exactly one callback
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        host_semaphores = {}
+        tasks = {}
+        for key, url in urls:
+            host = urlsplit(url).hostname or ''
+            if host not in host_semaphores:
+                host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+            task = asyncio.ensure_future(self.fetch_one(session, semaphore, host_semaphores[host], host, key, url,
+                                                        callback, control))
+            tasks[task] = (key, url)
+        pending = set(tasks)
+        while len(pending) > 0:
+            timeout = 0.2  # poll for cancellation
+            if control.deadline_time is not None:
+                timeout = min(timeout, max(0.0, control.deadline_time - time.time()))
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+            if len(pending) > 0 and (control.cancelled.is_set() or control.expired()):
+                for task in pending:
+                    task.cancel()
+                    key, url = tasks[task]
+                    error = FetchCancelled() if control.cancelled.is_set() else DeadlineExceeded()
+                    callback(FetchResult(key, url, error=error))
+                await asyncio.gather(*pending, return_exceptions=True)
+                break
+
+    async def fetch_one(self, session, semaphore, host_semaphore, host, key, url, callback, control):
+        start = time.time()
+        attempt = 0
+        while True:
+            # wait for the host slot first so that a busy host does not hold global slots
+            async with host_semaphore:
+                async with semaphore:
+                    if not self.breaker.allow(host):
+                        error = CircuitOpenError(host)
+                    else:
+                        try:
+                            html, size = await self.download(session, url)
+                            self.breaker.record_success(host)
+                            callback(FetchResult(key, url, html=html, elapsed=time.time() - start, size=size))
+                            return
+                        except Exception as e:
+                            error = e
+                            if is_transient(e):
+                                self.breaker.record_failure(host)
+            # retry transient failures outside the slots, unless the backoff would end after the deadline
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            if not is_transient(error) or attempt >= self.max_retries or (
+                    control.deadline_time is not None and time.time() + delay >= control.deadline_time):
+                callback(FetchResult(key, url, error=error, elapsed=time.time() - start))
+                return
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def download(self, session, url):
+        # one request, return (html, downloaded bytes), PageRejected for pages the filter drops
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with session.get(url, timeout=timeout) as response:
+            if response.status in transient_statuses:
+                raise TransientHTTPError(response.status)
+            reader = self.page_filter.reader(response.headers.get('Content-Type', ''))
+            async for chunk in response.content.iter_chunked(read_chunk_size):
+                if not reader.feed(chunk):  # byte cap reached, the rest is not downloaded
+                    break
+        return reader.finish()
@@ -0,0 +1,137 @@
+import codecs
+import re
+from near_duplicate import strip_words
+
+# early filtering of downloaded pages, before any parsing: responses are read as a stream up to a byte cap,
+# non-html content types and binary bodies are rejected, the charset is sniffed from the BOM, the header
+# or a <meta> tag, and on request pages whose first chunk is clearly not English are dropped and larger pages
+# truncated (the pipeline is English-only, both are off by default so that the pages are downloaded as before)
+
+max_page_bytes = 2 * 1024 * 1024  # suggested byte cap, the tail of larger pages rarely holds lists
+head_bytes = 32 * 1024  # first chunk checked for binary content, charset and language
+html_content_types = ['text/html', 'application/xhtml+xml', 'text/xml', 'application/xml']
+binary_signatures = [b'%PDF', b'\x89PNG', b'GIF8', b'\xff\xd8\xff', b'PK\x03\x04', b'\x1f\x8b']
+english_stopwords = {'the', 'and', 'of', 'to', 'in', 'is', 'for', 'that', 'with', 'are', 'on', 'as', 'it', 'this',
+                     'be', 'by', 'or', 'from', 'an', 'at', 'you', 'your', 'can', 'was', 'not', 'have', 'which', 'more',
+                     'all', 'has', 'how', 'what', 'about', 'we', 'our', 'will', 'if', 'they', 'their', 'may', 'also'}
+
+re_header_charset = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+re_meta_charset = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+re_html_lang = re.compile(r'<html[^>]*?\blang\s*=\s*["\']?([a-zA-Z]+)', re.IGNORECASE)
+# markup without visible text: the <head> (meta tags, title, scripts) and the script, style and comment bodies,
+# including the one the first chunk ends in
+re_hidden = re.compile(r'<head[\s>][\s\S]*?</head\s*>|<(script|style|noscript)\b[\s\S]*?(?:</\1\s*>|\Z)'
+                       r'|<!--[\s\S]*?(?:-->|\Z)', re.IGNORECASE)
+
+
+class PageRejected(Exception):
+    # a downloaded page the pipeline can not use
+    pass
+
+
+class NotHTML(PageRejected):
+    pass
+
+
+class BinaryContent(PageRejected):
+    pass
+
+
+class NotEnglish(PageRejected):
+    pass
+
+
+def valid_charset(charset):
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def sniff_charset(content_type, head):
+    # charset of a page from its BOM, its Content-Type header or a <meta> tag in its head, utf-8 by default
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    match = re_header_charset.search(content_type)
+    if match is not None and valid_charset(match.group(1)) is not None:
+        return valid_charset(match.group(1))
+    match = re_meta_charset.search(head)
+    if match is not None:
+        charset = valid_charset(match.group(1).decode('ascii', errors='replace'))
+        if charset is not None:
+            return charset
+    return 'utf-8'
+
+
+def is_binary(head):
+    if any([head.startswith(signature) for signature in binary_signatures]):
+        return True
+    return b'\x00' in head[:8192] and not head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE))
+
+
+def is_english(head_text, min_words=100, min_stopword_rate=0.03, max_non_ascii_rate=0.3):
+    # decided on the first chunk only, pages without enough visible text there are kept
+    match = re_html_lang.search(head_text)
+    if match is not None:
+        return match.group(1).lower() == 'en'
+    words = strip_words(re_hidden.sub(' ', head_text))  # then the tags
+    letters = ''.join(words)
+    if len(letters) > 0 and sum([1 for c in letters if ord(c) > 127]) > max_non_ascii_rate * len(letters):
+        return False
+    if len(words) < min_words:
+        return True
+    return sum([1 for word in words if word in english_stopwords]) >= min_stopword_rate * len(words)
+
+
+class PageFilter:
+    def __init__(self, max_bytes=None, english_only=False):
+        # max_bytes: bytes kept of a page, None for no cap
+        # english_only: drop the pages whose first chunk is not English
+        self.max_bytes = max_bytes
+        self.english_only = english_only
+
+    def check_content_type(self, content_type):
+        content_type = content_type.lower()
+        if content_type != '' and not any([t in content_type for t in html_content_types]):
+            raise NotHTML(content_type.split(';')[0])
+
+    def reader(self, content_type):
+        self.check_content_type(content_type)
+        return PageReader(self, content_type)
+
+
+class PageReader:
+    # reads the chunks of one response, checks its head as soon as it is complete
+    def __init__(self, page_filter, content_type):
+        self.page_filter = page_filter
+        self.content_type = content_type
+        self.chunks = []
+        self.size = 0
+        self.charset = None
+
+    def feed(self, chunk):
+        # add a chunk, return False once the byte cap is reached, raise PageRejected for unusable pages
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.charset is None and self.size >= head_bytes:
+            self.check_head(b''.join(self.chunks))
+        max_bytes = self.page_filter.max_bytes
+        return max_bytes is None or self.size < max_bytes
+
+    def check_head(self, head):
+        if is_binary(head):
+            raise BinaryContent()
+        self.charset = sniff_charset(self.content_type, head)
+        if self.page_filter.english_only and not is_english(head[:head_bytes].decode(self.charset, errors='replace')):
+            raise NotEnglish()
+
+    def finish(self):
+        # (html, downloaded bytes)
+        body = b''.join(self.chunks)
+        if self.charset is None:  # page shorter than the head
+            self.check_head(body)
+        if self.page_filter.max_bytes is not None:
+            body = body[:self.page_filter.max_bytes]
+        return body.decode(self.charset, errors='replace'), self.size
@@ -0,0 +1,67 @@
+import re
+from bisect import bisect_left, bisect_right
+
+# Hearst-style is-a patterns of the ranker (NPt is a NPh, NPh such as NPt, ...) compiled once into a single scanner:
+# one regex pass per line finds the hits of all patterns, a table of the space offsets of the line then gives
+# the 10-word windows around a hit without walking the line character by character
+
+window_words = 10
+
+re_space = re.compile(' ')
+
+open_scanners = {}  # {patterns path: PatternScanner}, compiled once per process
+
+
+class PatternScanner:
+    def __init__(self, patterns):
+        # patterns: lines of the patterns file, the words around NPh and NPt are matched literally
+        self.patterns = []  # [(match string, position of NPh, position of NPt)]
+        for pattern in patterns:
+            match_str = pattern.replace('NPt', '').replace('NPh', '')  # is a, such as, et al.
+            if match_str != '':
+                self.patterns.append((match_str, pattern.find('NPh'), pattern.find('NPt')))
+        literals = sorted(set([match_str for match_str, _, _ in self.patterns]), key=len, reverse=True)
+        # zero-width lookahead: every position where some pattern starts, overlapping hits included
+        self.scanner = re.compile('(?=' + '|'.join([re.escape(literal) for literal in literals]) + ')') \
+            if len(literals) > 0 else None
+
+    def find(self, line):
+        # [(pattern number, position)] of the hits in line, by pattern then position, the hits of one pattern
+        # do not overlap (like re.finditer with each pattern)
+        hits = []
+        if self.scanner is None:
+            return hits
+        ends = [0] * len(self.patterns)
+        for match in self.scanner.finditer(line):
+            pos = match.start()
+            for i in range(len(self.patterns)):
+                match_str = self.patterns[i][0]
+                if pos >= ends[i] and line.startswith(match_str, pos):
+                    hits.append((i, pos))
+                    ends[i] = pos + len(match_str)
+        hits.sort()
+        return hits
+
+
+def space_offsets(line):
+    return [match.start() for match in re_space.finditer(line)]
+
+
+def word_window(line, spaces, pos, length):
+    # (start, end) of the window of window_words words before and after the hit at pos of the given length,
+    # the text before is line[start:pos], the text after line[pos + length:end + 1]
+    i = bisect_right(spaces, pos - 2)
+    start_pos = spaces[i - window_words] if i >= window_words else 0
+    i = bisect_left(spaces, pos + length + 2)
+    if len(spaces) - i >= window_words:
+        end_pos = spaces[i + window_words - 1]
+    else:
+        end_pos = min(max(pos + length + 1, len(line) - 1), len(line))
+    return start_pos, end_pos
+
+
+def get_pattern_scanner(path):
+    if path not in open_scanners:
+        with open(path, 'r', encoding='utf-8') as f:
+            open_scanners[path] = PatternScanner(f.read().split('\n')[:-1])
+    return open_scanners[path]
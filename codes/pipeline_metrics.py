@@ -0,0 +1,170 @@
+import json
+import os
+import time
+
+# per-url stage timings of the extraction pipeline, aggregated into per-query and per-run histograms
+# each url is appended as one record to <run>_urls.jsonl when it finishes,
+# the per-query and per-run summaries in <run>.json are rewritten after each query, so a killed run keeps them
+# stages: fetch (download or cache read), fingerprint (near-duplicate check), preprocess, content,
+# segment (lists and texts), match (regions)
+
+metrics_path = '../data/metrics/'
+stages = ['fetch', 'fingerprint', 'preprocess', 'content', 'segment', 'match']
+analysis_stages = ['preprocess', 'content', 'segment', 'match']  # saved on near-duplicate pages
+histogram_bounds = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]  # upper bounds in ms
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(histogram_bounds) + 1)  # the last bucket is above the largest bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        i = 0
+        while i < len(histogram_bounds) and ms > histogram_bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile, None above the largest bound
+        if self.count == 0:
+            return 0
+        rank = p * self.count
+        seen = 0
+        for i in range(len(self.counts)):
+            seen += self.counts[i]
+            if seen >= rank:
+                return histogram_bounds[i] if i < len(histogram_bounds) else None
+        return None
+
+    def to_dict(self):
+        return {'count': self.count, 'total_ms': round(self.total, 1), 'max_ms': round(self.max, 1),
+                'mean_ms': round(self.total / self.count, 1) if self.count else 0,
+                'p50_ms': self.percentile(0.5), 'p90_ms': self.percentile(0.9), 'p99_ms': self.percentile(0.99),
+                'buckets': {('<=' + str(histogram_bounds[i]) if i < len(histogram_bounds) else
+                             '>' + str(histogram_bounds[-1])): self.counts[i]
+                            for i in range(len(self.counts)) if self.counts[i] > 0}}
+
+
+class MetricsSummary:
+    # stage histograms, bytes, regions and error classes of a set of urls
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in stages}
+        self.total = Histogram()  # whole url, all stages
+        self.urls = 0
+        self.cached = 0  # urls read from the cache or an archive
+        self.bytes = 0
+        self.regions = 0
+        self.errors = {}  # {stage: {error class: count}}
+        self.duplicates = 0  # near-duplicate urls not analyzed
+        self.analyzed = 0
+        self.analysis_time = 0.0  # seconds of the analysis stages of the analyzed urls
+        self.start = time.time()
+
+    def add(self, url_metrics):
+        self.urls += 1
+        if url_metrics.source != 'network':
+            self.cached += 1
+        self.bytes += url_metrics.bytes
+        self.regions += sum(url_metrics.regions.values())
+        for stage in url_metrics.times:
+            self.histograms[stage].add(url_metrics.times[stage] * 1000)
+        self.total.add(sum(url_metrics.times.values()) * 1000)
+        if url_metrics.duplicate_of is not None:
+            self.duplicates += 1
+        elif url_metrics.error is None:
+            self.analyzed += 1
+            self.analysis_time += sum([url_metrics.times.get(stage, 0.0) for stage in analysis_stages])
+        if url_metrics.error is not None:
+            stage, error_class = url_metrics.error
+            if stage not in self.errors:
+                self.errors[stage] = {}
+            self.errors[stage][error_class] = self.errors[stage].get(error_class, 0) + 1
+
+    def duplicate_saved_time(self):
+        # analysis time of the skipped near-duplicates at the mean of the analyzed urls, minus the fingerprints
+        mean_analysis = self.analysis_time / self.analyzed if self.analyzed else 0.0
+        return self.duplicates * mean_analysis - self.histograms['fingerprint'].total / 1000
+
+    def to_dict(self):
+        elapsed = time.time() - self.start
+        return {'urls': self.urls, 'cached': self.cached, 'bytes': self.bytes, 'regions': self.regions,
+                'errors': self.errors, 'elapsed_s': round(elapsed, 1), 'duplicates': self.duplicates,
+                'duplicate_rate': round(self.duplicates / self.urls, 3) if self.urls else 0,
+                'duplicate_saved_s': round(self.duplicate_saved_time(), 2),
+                'urls_per_s': round(self.urls / elapsed, 2) if elapsed > 0 else 0,
+                'stages': {stage: self.histograms[stage].to_dict() for stage in stages},
+                'url_total': self.total.to_dict()}
+
+
+class UrlMetrics:
+    def __init__(self, url, source='network'):
+        self.url = url
+        self.source = source  # 'network', 'cache' or 'archive'
+        self.times = {}  # {stage: seconds}
+        self.bytes = 0  # downloaded bytes, 0 for cached pages
+        self.regions = {}  # {search mode: number of candidate regions}
+        self.key_regions = 0  # query texts and items lists, counted toward the region target of the query
+        self.error = None  # (stage, error class) of the first failure
+        self.duplicate_of = None  # url of the page this one near-duplicates, it was not analyzed
+
+    def add_time(self, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def set_error(self, stage, e):
+        if self.error is None:
+            self.error = (stage, type(e).__name__)
+
+    def to_dict(self):
+        return {'url': self.url, 'source': self.source, 'bytes': self.bytes, 'regions': self.regions,
+                'error': list(self.error) if self.error is not None else None, 'duplicate_of': self.duplicate_of,
+                'ms': {stage: round(self.times[stage] * 1000, 2) for stage in self.times}}
+
+
+class PipelineMetrics:
+    def __init__(self, path=metrics_path, run_name=None):
+        # one pair of files per run and process, so that the workers of the batch driver never share a file
+        if run_name is None:
+            run_name = time.strftime('%Y%m%d-%H%M%S') + '_' + str(os.getpid())
+        os.makedirs(path, exist_ok=True)
+        self.summary_path = path + run_name + '.json'
+        self.urls_file = open(path + run_name + '_urls.jsonl', 'a', encoding='utf-8')
+        self.run = MetricsSummary()
+        self.queries = {}  # {query: summary dict}
+        self.query = None
+        self.query_summary = None
+
+    def start_query(self, query):
+        self.query = query
+        self.query_summary = MetricsSummary()
+
+    def add_url(self, url_metrics):
+        record = url_metrics.to_dict()
+        record['query'] = self.query
+        self.urls_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.run.add(url_metrics)
+        if self.query_summary is not None:
+            self.query_summary.add(url_metrics)
+
+    def end_query(self):
+        if self.query_summary is not None:
+            self.queries[self.query] = self.query_summary.to_dict()
+        self.query = None
+        self.query_summary = None
+        self.save()
+
+    def save(self):
+        self.urls_file.flush()
+        temp_path = self.summary_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'run': self.run.to_dict(), 'queries': self.queries}, f, ensure_ascii=False)
+        os.replace(temp_path, self.summary_path)
+
+    def close(self):
+        self.save()
+        self.urls_file.close()
@@ -0,0 +1,44 @@
+import os
+import sqlite3
+
+# persistent cache of the part-of-speech tags of candidate phrases, shared by all queries, worker processes and runs:
+# the noun-phrase filter of the ranker tags the same short phrases for many queries, and stanza is its main cost
+# the tags depend on the stanza model, delete the file after changing the model
+
+pos_cache_path = '../data/pos_cache.db'
+
+open_caches = {}  # {cache path: PosCache of this process}
+
+
+class PosCache:
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60)
+        # tags: universal POS tags of the words of the first sentence of the phrase, separated by spaces
+        self.db.execute('CREATE TABLE IF NOT EXISTS phrases (phrase TEXT PRIMARY KEY, tags TEXT) WITHOUT ROWID')
+        self.db.commit()
+
+    def get(self, phrase):
+        # POS tags of phrase, None if it was never tagged
+        row = self.db.execute('SELECT tags FROM phrases WHERE phrase = ?', (phrase,)).fetchone()
+        if row is None:
+            return None
+        return row[0].split(' ') if row[0] != '' else []
+
+    def put_many(self, phrase_tags):
+        # add {phrase: POS tags} in one transaction
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO phrases VALUES (?, ?)',
+                                [(phrase, ' '.join(tags)) for phrase, tags in phrase_tags.items()])
+
+    def close(self):
+        self.db.close()
+
+
+def open_pos_cache(path=pos_cache_path):
+    # the cache at path, opened once per process: sqlite connections are not shared with forked workers
+    if path not in open_caches or open_caches[path].pid != os.getpid():
+        open_caches[path] = PosCache(path)
+    return open_caches[path]
@@ -0,0 +1,46 @@
+import json
+import os
+
+# per-query manifest of completed extraction stages and urls, so that a killed run resumes at url granularity
+# stages: 'urls' (Bing results read), 'regions' (all urls processed), 'candidates' (candidate files written)
+
+
+class QueryManifest:
+    def __init__(self, path):
+        self.path = path
+        self.stages = []
+        self.urls = {}  # {search mode: [indexes of completed urls]}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                self.stages = manifest['stages']
+                self.urls = manifest['urls']
+            except (ValueError, KeyError):  # broken manifest, start the query again
+                self.stages = []
+                self.urls = {}
+
+    def stage_done(self, stage):
+        return stage in self.stages
+
+    def set_stage_done(self, stage):
+        if stage not in self.stages:
+            self.stages.append(stage)
+            self.save()
+
+    def url_done(self, query_or_items, url_id):
+        return url_id in self.urls.get(query_or_items, [])
+
+    def set_url_done(self, query_or_items, url_id):
+        if query_or_items not in self.urls:
+            self.urls[query_or_items] = []
+        if url_id not in self.urls[query_or_items]:
+            self.urls[query_or_items].append(url_id)
+            self.save()
+
+    def save(self):
+        # write a temp file and rename it, a killed run never leaves a half written manifest
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'stages': self.stages, 'urls': self.urls}, f)
+        os.replace(temp_path, self.path)
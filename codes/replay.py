@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import gzip
+import json
+import random
+from page_fetcher import PageFetcher
+from html_cache import HTMLCache, normalize_url
+from bing_store import open_bing_store
+from lists_texts_extractor import read_bing_urls, iter_pages
+
+# record and replay of the pages of a query set, so that the extractor is measured on a fixed corpus offline
+# the archive is a gzip JSONL file with one record per (query, url):
+# {"query", "items", "url", "modes": [[search mode, url index], ...], "html", "size", "error": error class or null}
+# ReplayFetcher serves an archive in place of PageFetcher, with simulated latency and injected errors
+
+
+class RecordedError(Exception):
+    # a fetch that failed while recording, replayed as a failure
+    pass
+
+
+class ReplayMiss(Exception):
+    # url not in the archive
+    pass
+
+
+def record_archive(jobs, archive_path, fetcher=None, html_cache=None, bing_stores=None):
+    # jobs: (query, items, top results path, ...) as in batch_driver.get_jobs, fetch all urls of each query once
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = PageFetcher()
+    if bing_stores is None:
+        bing_stores = {}
+    with gzip.open(archive_path, 'wt', encoding='utf-8') as f:
+        for job in jobs:
+            query, items, top_results_path = job[:3]
+            urls_of_modes = read_bing_urls(query, top_results_path, bing_stores.get(top_results_path))
+            if urls_of_modes is None:
+                continue
+            url_modes = {}
+            for query_or_items in urls_of_modes:
+                urls = urls_of_modes[query_or_items]
+                for i in range(len(urls)):
+                    if urls[i] not in url_modes:
+                        url_modes[urls[i]] = []
+                    url_modes[urls[i]].append([query_or_items, i])
+            pages = 0
+            for result in iter_pages(list(url_modes), fetcher, html_cache):
+                record = {'query': query, 'items': items, 'url': result.url, 'modes': url_modes[result.url],
+                          'html': result.html, 'size': result.size,
+                          'error': type(result.error).__name__ if result.error is not None else None}
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                pages += 1
+            print('recorded', query, pages, 'pages')
+    if own_fetcher:
+        fetcher.close()
+
+
+class ReplayArchive:
+    def __init__(self, archive_path):
+        self.queries = {}  # {query: {'items': items, 'urls': {url: modes}}} in recording order
+        self.pages = {}  # {normalized url: record}
+        with gzip.open(archive_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record['query'] not in self.queries:
+                    self.queries[record['query']] = {'items': record['items'], 'urls': {}}
+                self.queries[record['query']]['urls'][record['url']] = [tuple(mode) for mode in record['modes']]
+                self.pages[normalize_url(record['url'])] = record
+
+    def get(self, url):
+        return self.pages.get(normalize_url(url))
+
+
+class ReplayFetcher(PageFetcher):
+    def __init__(self, archive, latency=0.0, latency_jitter=0.0, error_rate=0.0, seed=0, max_concurrency=32,
+                 max_per_host=4, max_retries=0):
+        # archive: a ReplayArchive or its path
+        # latency, latency_jitter: seconds of simulated download time, uniform in latency +- latency_jitter
+        # error_rate: share of downloads failing with a timeout, chosen per url, attempt and seed so that runs
+        # are repeatable, retried up to max_retries times like network timeouts
+        PageFetcher.__init__(self, max_concurrency, max_per_host, max_retries=max_retries)
+        self.archive = archive if isinstance(archive, ReplayArchive) else ReplayArchive(archive)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.seed = seed
+
+    async def fetch_all(self, urls, callback, control):
+        # same scheduling, retries and circuit breaker as PageFetcher, without network
+        self.attempts = {}  # {url: downloads so far}, so that each retry draws its own injected error
+        await self.schedule(None, urls, callback, control)
+
+    async def download(self, session, url):
+        attempt = self.attempts.get(url, 0)
+        self.attempts[url] = attempt + 1
+        rand = random.Random(str(self.seed) + url + str(attempt))
+        delay = max(0.0, self.latency + rand.uniform(-self.latency_jitter, self.latency_jitter))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        record = self.archive.get(url)
+        if rand.random() < self.error_rate:
+            raise asyncio.TimeoutError()
+        if record is None:
+            raise ReplayMiss(url)
+        if record['error'] is not None:
+            raise RecordedError(record['error'])
+        return record['html'], record['size']
+
+
+if __name__ == '__main__':
+    from batch_driver import get_jobs, datasets  # imports the ranker, only needed to record
+    arg_parser = argparse.ArgumentParser(description='record the pages of a dataset into a replay archive')
+    arg_parser.add_argument('--dataset', choices=datasets, default='eval')
+    arg_parser.add_argument('--archive', default='../data/replay_eval.jsonl.gz')
+    arg_parser.add_argument('--max-queries', type=int, default=0, help='0 for all queries')
+    arg_parser.add_argument('--no-cache', action='store_true', help='download all pages instead of the html cache')
+    args = arg_parser.parse_args()
+
+    jobs = get_jobs(args.dataset)
+    if args.max_queries > 0:
+        jobs = jobs[:args.max_queries]
+    stores = {job[2]: open_bing_store(job[2]) for job in jobs}
+    html_cache = None if args.no_cache else HTMLCache()
+    record_archive(jobs, args.archive, html_cache=html_cache, bing_stores=stores)
+    if html_cache is not None:
+        html_cache.close()
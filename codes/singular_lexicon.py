@@ -0,0 +1,119 @@
+import argparse
+import glob
+import os
+import re
+import time
+from candidates_store import read_candidates
+from kb_index import KBIndex, build_kb_index, kb_index_path
+from model_registry import get_inflector
+from config import *
+
+# precomputed singular forms of the vocabulary of the crawled corpora and the knowledge bases, built offline
+# with the exceptions below applied and stored in the on-disk format of kb_index (word -> singular form,
+# empty if the word is its own singular): the ranker looks words up here and only runs the rule engine of inflect
+# for words outside the vocabulary
+# rebuild the lexicon after changing words_with_s or upgrading inflect
+
+singular_lexicon_path = kb_index_path + 'singular_lexicon'
+
+# words ending with s that inflect wrongly converts
+words_with_s = {'this', 'as', 'is', 'news', 'windows', 'virus', 'supernoobs', 'does', 'os', 'ios', 'macos', 'pus',
+                'bus', 'vs', 'ps', 'js', 'ls', 'us', 'cs', 'kiss', 'miss', 'ms', 'nds', 'nes', 'class', 'mass',
+                'his', 'its', 'guess', 'success', 'business', 'happiness', 'abscess', 'across', 'has', 'diagnosis',
+                'dress'}
+
+re_non_alnum = re.compile(r'[^A-Za-z0-9 ]+')
+
+open_lexicons = {}  # {lexicon path: SingularLexicon or None if not built}, opened once per process
+
+
+class SingularLexicon:
+    def __init__(self, path):
+        self.index = KBIndex(path)
+
+    def get(self, word):
+        # singular form of word, None if word is not in the vocabulary
+        postings = self.index.lookup(word, 1)
+        if len(postings) == 0:
+            return None
+        return postings[0][0] if postings[0][0] != '' else word
+
+
+def open_singular_lexicon(path=singular_lexicon_path):
+    if path not in open_lexicons:
+        open_lexicons[path] = SingularLexicon(path) if os.path.exists(path + '.idx') else None
+    return open_lexicons[path]
+
+
+def singular_form(inflector, word):
+    # singular form of a word by the rules of inflect, with the exceptions
+    singular = inflector.singular_noun(word)
+    return singular if singular and word not in words_with_s else word
+
+
+def line_words(line):
+    # words of a line as the ranker singularizes them: texts split by spaces, n-grams without special characters
+    for word in line.split(' '):
+        yield word
+        yield re_non_alnum.sub('', word)
+
+
+def corpus_words(top_results_path, preprocess_line):
+    # words of the candidates texts of a dataset, from the candidates files and the files of earlier versions
+    for path in glob.glob(glob.escape(top_results_path) + '*_candidates.jsonl'):
+        for texts in read_candidates(path).values():
+            for text in texts:
+                yield from line_words(preprocess_line(text))
+    for path in glob.glob(glob.escape(top_results_path) + '*_candidates-*.txt'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield from line_words(preprocess_line(line[:-1]))
+
+
+def kb_words(source_path, encoding=None):
+    # words of the first two fields (term and description, or concept and instance) of a knowledge base
+    with open(source_path, 'r', encoding=encoding) as f:
+        for line in f:
+            for field in line[:-1].split('\t')[:2]:
+                yield from field.split(' ')
+
+
+def build_singular_lexicon(top_results_paths, webisa=False, concept_graph=False, path=singular_lexicon_path):
+    from candidates_extractor_ranker import preprocess_line  # the ranker imports this module
+    start = time.time()
+    words = set()
+    for top_results_path in top_results_paths:
+        words.update(corpus_words(top_results_path, preprocess_line))
+    if webisa:
+        for file_name in sorted(glob.glob(glob.escape(webisa_path) + '*_ten.txt')):
+            words.update(kb_words(file_name))
+    if concept_graph:
+        words.update(kb_words(concept_graph_path, 'utf-8'))
+    print(len(words), 'words, time:', format(time.time() - start, '.1f'), 's')
+
+    inflector = get_inflector()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tsv', 'w', encoding='utf-8') as f:
+        for word in words:
+            if word == '' or '\r' in word:
+                continue
+            singular = singular_form(inflector, word)
+            f.write(word + '\t' + (singular if singular != word else '') + '\t1\n')
+    build_kb_index(path + '.tsv', path, freq_type=int, encoding='utf-8')
+    os.remove(path + '.tsv')
+    open_lexicons.pop(path, None)
+
+
+if __name__ == '__main__':
+    dataset_paths = {'eval': [top_results_overall_good_path, top_results_query_log_path,
+                              top_results_query_dimension_path],
+                     'srqg-ltr': [top_results_srqg_ltr_path],
+                     'srqg-gen': [top_results_srqg_gen_path]}
+    arg_parser = argparse.ArgumentParser(description='build the singular forms of the vocabulary of the ranker')
+    arg_parser.add_argument('--dataset', nargs='+', choices=list(dataset_paths), default=list(dataset_paths))
+    arg_parser.add_argument('--webisa', action='store_true', help='add the words of the WebIsA files')
+    arg_parser.add_argument('--concept-graph', action='store_true', help='add the words of the Concept Graph')
+    args = arg_parser.parse_args()
+
+    build_singular_lexicon([path for dataset in args.dataset for path in dataset_paths[dataset]], args.webisa,
+                           args.concept_graph)
@@ -0,0 +1,240 @@
+import argparse
+import gzip
+import os
+import sqlite3
+import time
+import zlib
+from html_cache import normalize_url
+
+# streaming reader of WARC crawl dumps indexed by url, so that pages of existing crawls are read from disk
+# .warc.gz files are read member by member and must hold one gzip member per record, as written by crawlers:
+# a whole-file gzip can not be read from an offset, it is rejected (decompress it to a plain .warc, or recompress
+# it per record), plain .warc files are supported as well
+# the index is a SQLite file mapping each normalized url of an html response to
+# (warc file, member offset, member length, record offset inside the member), a lookup reads one member
+
+read_chunk_size = 1024 * 1024
+max_member_bytes = 64 * 1024 * 1024  # decompressed, larger members are taken for a whole-file gzip
+
+
+class NotPerRecordGzip(Exception):
+    # a .warc.gz file whose gzip members hold more than one record
+    pass
+
+
+def iter_gzip_members(f):
+    # yield (offset, compressed length, decompressed data) of each gzip member of a file
+    # NotPerRecordGzip once a member grows beyond max_member_bytes, before the whole file is held in memory
+    member_start = f.tell()
+    consumed = member_start
+    decompressor = zlib.decompressobj(31)
+    parts = []
+    member_bytes = 0
+    data = f.read(read_chunk_size)
+    while data:
+        parts.append(decompressor.decompress(data))
+        member_bytes += len(parts[-1])
+        if decompressor.eof:
+            end = consumed + len(data) - len(decompressor.unused_data)
+            yield member_start, end - member_start, b''.join(parts)
+            data = decompressor.unused_data
+            consumed = end
+            member_start = end
+            decompressor = zlib.decompressobj(31)
+            parts = []
+            member_bytes = 0
+            if not data:
+                data = f.read(read_chunk_size)
+            continue
+        consumed += len(data)
+        if member_bytes > max_member_bytes:
+            raise NotPerRecordGzip(getattr(f, 'name', '') + ': gzip member at offset ' + str(member_start) +
+                                   ' larger than ' + str(max_member_bytes) + ' bytes')
+        data = f.read(read_chunk_size)
+
+
+def iter_plain_records(f):
+    # yield (offset, length, data) of each record of an uncompressed WARC file
+    while True:
+        offset = f.tell()
+        line = f.readline()
+        while line in [b'\r\n', b'\n']:  # blank lines between records
+            offset = f.tell()
+            line = f.readline()
+        if not line:
+            return
+        lines = [line]
+        length = 0
+        while line not in [b'\r\n', b'\n', b'']:
+            line = f.readline()
+            lines.append(line)
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':', 1)[1].strip())
+        block = f.read(length)
+        yield offset, f.tell() - offset, b''.join(lines) + block
+
+
+def parse_records(data):
+    # yield (offset in data, headers, block) of each WARC record in data
+    position = 0
+    while position < len(data):
+        while data.startswith(b'\r\n', position):
+            position += 2
+        header_end = data.find(b'\r\n\r\n', position)
+        if header_end == -1 or not data.startswith(b'WARC/', position):
+            return
+        headers = parse_headers(data[position:header_end])
+        block_start = header_end + 4
+        length = int(headers.get('content-length', '0'))
+        yield position, headers, data[block_start:block_start + length]
+        position = block_start + length
+
+
+def parse_headers(data):
+    # {lower-cased name: value} of header lines, the first line (WARC version or HTTP status) is skipped
+    headers = {}
+    for line in data.decode('utf-8', errors='replace').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def dechunk(body):
+    # decode a chunked transfer encoding, return body unchanged if it is not well formed
+    parts = []
+    position = 0
+    while True:
+        line_end = body.find(b'\r\n', position)
+        if line_end == -1:
+            return body
+        try:
+            size = int(body[position:line_end].split(b';')[0], 16)
+        except ValueError:
+            return body
+        if size == 0:
+            return b''.join(parts)
+        parts.append(body[line_end + 2:line_end + 2 + size])
+        position = line_end + 2 + size + 2
+
+
+def response_html(block):
+    # html of the HTTP response stored in a WARC response block, None for failed or non-html responses
+    header_end = block.find(b'\r\n\r\n')
+    if header_end == -1:
+        return None
+    status = block[:block.find(b'\r\n')].split(b' ')
+    if len(status) < 2 or status[1] != b'200':
+        return None
+    headers = parse_headers(block[:header_end])
+    content_type = headers.get('content-type', 'text/html').lower()
+    if 'html' not in content_type:
+        return None
+    body = block[header_end + 4:]
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = dechunk(body)
+    if headers.get('content-encoding', '').lower() in ['gzip', 'x-gzip']:
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError, zlib.error):
+            return None
+    charset = 'utf-8'
+    if 'charset=' in content_type:
+        charset = content_type.split('charset=')[1].split(';')[0].strip().strip('"\'')
+    try:
+        return body.decode(charset, errors='replace')
+    except LookupError:  # unknown charset
+        return body.decode('utf-8', errors='replace')
+
+
+def iter_members(path, f):
+    if path.endswith('.gz'):
+        return iter_gzip_members(f)
+    return iter_plain_records(f)
+
+
+def iter_warc_pages(path):
+    # stream (url, html) of all html responses of a WARC file in file order
+    with open(path, 'rb') as f:
+        for _, _, data in iter_members(path, f):
+            for _, headers, block in parse_records(data):
+                if headers.get('warc-type') == 'response':
+                    html = response_html(block)
+                    if html is not None:
+                        yield headers.get('warc-target-uri', '').strip('<>'), html
+
+
+class WARCArchive:
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.db = sqlite3.connect(index_path, timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS records (url TEXT PRIMARY KEY, file TEXT, member_offset INTEGER, '
+                        'member_length INTEGER, record_offset INTEGER) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, mtime REAL)')
+        self.db.commit()
+        self.files = {}  # {file: open file}, kept open for lookups
+
+    def add_file(self, path):
+        # index the html responses of a WARC file, files unchanged since they were indexed are skipped
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        row = self.db.execute('SELECT mtime FROM files WHERE file = ?', (path,)).fetchone()
+        if row is not None and row[0] == mtime:
+            return 0
+        start = time.time()
+        rows = []
+        with self.db, open(path, 'rb') as f:
+            self.db.execute('DELETE FROM records WHERE file = ?', (path,))
+            for member_offset, member_length, data in iter_members(path, f):
+                records = list(parse_records(data))
+                if path.endswith('.gz') and len(records) > 1:  # every lookup would decompress all of them
+                    raise NotPerRecordGzip(path + ': gzip member at offset ' + str(member_offset) + ' holds ' +
+                                           str(len(records)) + ' records')
+                for record_offset, headers, block in records:
+                    if headers.get('warc-type') != 'response' or response_html(block) is None:
+                        continue
+                    url = normalize_url(headers.get('warc-target-uri', '').strip('<>'))
+                    rows.append((url, path, member_offset, member_length, record_offset))
+                if len(rows) >= 10000:
+                    self.db.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', rows)
+                    rows = []
+            self.db.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', rows)
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?)', (path, mtime))
+        count = self.db.execute('SELECT COUNT(*) FROM records WHERE file = ?', (path,)).fetchone()[0]
+        print(path, count, 'pages indexed, time:', format(time.time() - start, '.1f'), 's')
+        return count
+
+    def get(self, url):
+        # html of url in the indexed WARC files, None if it is not archived
+        row = self.db.execute('SELECT file, member_offset, member_length, record_offset FROM records WHERE url = ?',
+                              (normalize_url(url),)).fetchone()
+        if row is None:
+            return None
+        path, member_offset, member_length, record_offset = row
+        if path not in self.files:
+            self.files[path] = open(path, 'rb')
+        f = self.files[path]
+        f.seek(member_offset)
+        data = f.read(member_length)
+        if path.endswith('.gz'):
+            data = zlib.decompressobj(31).decompress(data)
+        for _, headers, block in parse_records(data[record_offset:]):
+            return response_html(block)
+        return None
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        self.db.close()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='index the html responses of WARC files by url')
+    arg_parser.add_argument('--index', default='../data/warc_index.db')
+    arg_parser.add_argument('warc_files', nargs='+')
+    args = arg_parser.parse_args()
+
+    archive = WARCArchive(args.index)
+    for warc_file in args.warc_files:
+        archive.add_file(warc_file)
+    archive.close()
@@ -0,0 +1,23 @@
+import os
+import sys
+import types
+
+# the modules live in codes/ and import config and utils, which hold the paths and helpers of each machine and are
+# not in the repository: stand-ins are registered when the real ones can not be imported, the tests set the paths
+# they use themselves
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'codes'))
+
+
+def register_stand_in(name, **attributes):
+    try:
+        __import__(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+register_stand_in('config', webisa_path='', concept_graph_path='', isa_pattern_path='')
+register_stand_in('utils', all_in=lambda a, b: all([x in b for x in a]), tanh=None, distance_score=None,
+                  read_evaluation_data=None, cos_sim=None)
@@ -0,0 +1,33 @@
+import pytest
+
+batch_driver = pytest.importorskip('batch_driver')  # needs requests, requests_html and aiohttp
+
+
+def run_job(job, stage, *args):
+    # module level so that it can be sent to the workers
+    if job[0] == 'bad' and not job[1]:
+        raise ValueError('bad query')
+    return job[0]
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    monkeypatch.setattr(batch_driver, 'run_job', run_job)
+    monkeypatch.setattr(batch_driver, 'prefetch_unranked_kb_terms', lambda *args: None)
+    monkeypatch.setattr(batch_driver, 'warm_up', lambda *args: None)
+    return batch_driver
+
+
+def test_failed_jobs_saved_and_run_again(tmp_path, driver):
+    jobs = [('good', [], '../top/', '../candidates/'), ('bad', [], '../top/', '../candidates/'),
+            ('other', ['é', 'b'], '../top/', '../candidates/')]
+    failed = driver.run_batch(jobs, 'rank', workers=2)
+    assert failed == [jobs[1]]
+    path = str(tmp_path) + '/failed.jsonl'
+    driver.save_jobs(jobs, path)
+    assert driver.load_jobs(path) == jobs
+    # a job list saved with --failed is run again with --jobs
+    driver.save_jobs(failed, path)
+    rerun = [(query, ['fixed'], top_results_path, candidates_path)
+             for query, _, top_results_path, candidates_path in driver.load_jobs(path)]
+    assert driver.run_batch(rerun, 'rank', workers=2) == []
@@ -0,0 +1,66 @@
+import json
+import os
+import pytest
+
+bing_store = pytest.importorskip('bing_store')  # needs get_bing_results
+from bing_store import BingStore, bing_store_path, open_bing_store, split_result_file_name
+
+
+def parse_result(file_name):
+    # urls of a result file, 'error' for files without web pages, like get_bing_results.parse_result
+    with open(file_name, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    if 'webPages' not in result:
+        return None, None, None, 'error'
+    return None, None, None, [page['url'] for page in result['webPages']['value']]
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    parsed = []
+
+    def counting_parse_result(file_name):
+        parsed.append(os.path.basename(file_name))
+        return parse_result(file_name)
+
+    monkeypatch.setattr(bing_store, 'parse_result', counting_parse_result)
+    return parsed
+
+
+def write_result(path, query, mode, urls):
+    result = {'webPages': {'value': [{'url': url, 'snippet': 'about ' + url} for url in urls]}} \
+        if urls is not None else {}
+    with open(path + query + '_' + mode + '_bing_result.json', 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def test_split_result_file_name():
+    assert split_result_file_name('/a/flu_symptoms_qi_bing_result.json') == ('flu_symptoms', 'query_items')
+    assert split_result_file_name('/a/bing_results.db') is None
+
+
+def test_ingest_and_get_urls(tmp_path, parsed):
+    path = str(tmp_path) + '/'
+    assert open_bing_store(path) is None
+    write_result(path, 'flu', 'q', ['http://a.com/', 'http://b.com/'])
+    write_result(path, 'flu', 'qi', ['http://b.com/'])
+    write_result(path, 'flu', 'i', None)
+    write_result(path, 'cold', 'q', ['http://c.com/'])
+    store = BingStore(bing_store_path(path))
+    store.ingest(path)
+    assert store.get_urls('flu') == {'query': ['http://a.com/', 'http://b.com/'], 'query_items': ['http://b.com/'],
+                                     'items': 'error'}
+    assert store.get_urls('cold') is None  # modes missing, read from the result files
+    assert store.get_results('flu', 'query') == [(0, 'http://a.com/', 'about http://a.com/'),
+                                                 (1, 'http://b.com/', 'about http://b.com/')]
+    store.close()
+
+    # only the files changed since the last ingestion are parsed again
+    del parsed[:]
+    write_result(path, 'flu', 'q', ['http://d.com/'])
+    os.utime(path + 'flu_q_bing_result.json', (1, 1))
+    store = open_bing_store(path)
+    store.ingest(path)
+    assert parsed == ['flu_q_bing_result.json']
+    assert store.get_urls('flu')['query'] == ['http://d.com/']
+    store.close()
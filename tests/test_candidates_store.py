@@ -0,0 +1,43 @@
+from candidates_store import CandidatesWriter, candidates_path, read_candidates
+
+
+def write_query(path, done_urls=None):
+    writer = CandidatesWriter(path, done_urls)
+    writer.write_url_regions('query_items', 2, [['Q text 2'], ['List 2a', 'List 2b'], ['']])
+    writer.write_url_regions('query', 1, ['Query Text 1', ''])
+    writer.write_url_regions('items', 0, [['List 0'], ['Items Text 0']])
+    writer.write_url_regions('query_items', 0, [['Q text 0'], [], ['Items text 0']])
+    writer.close()
+
+
+def test_round_trip(tmp_path):
+    path = candidates_path(str(tmp_path) + '/', 'flu')
+    assert path.endswith('/flu_candidates.jsonl')
+    write_query(path)
+    assert read_candidates(path) == {('qi', 'query', 'text'): ['q text 0', 'q text 2'],
+                                     ('qi', 'items', 'list'): ['list 2a', 'list 2b'],
+                                     ('qi', 'items', 'text'): ['items text 0'],
+                                     ('q', 'query', 'text'): ['query text 1'],
+                                     ('i', 'items', 'list'): ['list 0'],
+                                     ('i', 'items', 'text'): ['items text 0']}
+
+
+def test_resume_keeps_done_urls_only(tmp_path):
+    path = str(tmp_path / 'flu_candidates.jsonl')
+    write_query(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"mode": "q", "url": 5, "tar')  # cut by a killed run
+    writer = CandidatesWriter(path, {('qi', 2), ('q', 1)})
+    writer.write_url_regions('items', 3, [['List 3'], []])
+    writer.close()
+    assert read_candidates(path) == {('qi', 'query', 'text'): ['q text 2'],
+                                     ('qi', 'items', 'list'): ['list 2a', 'list 2b'],
+                                     ('q', 'query', 'text'): ['query text 1'],
+                                     ('i', 'items', 'list'): ['list 3']}
+
+
+def test_new_file_replaces_old(tmp_path):
+    path = str(tmp_path / 'flu_candidates.jsonl')
+    write_query(path)
+    CandidatesWriter(path).close()
+    assert read_candidates(path) == {}
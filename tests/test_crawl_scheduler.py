@@ -0,0 +1,85 @@
+import pytest
+import crawl_scheduler
+from crawl_scheduler import CrawlScheduler, HostCircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class UrlMetrics:
+    def __init__(self, key_regions):
+        self.key_regions = key_regions
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(crawl_scheduler.time, 'time', clock.time)
+    return clock
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = HostCircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure('a.com')
+    assert breaker.allow('a.com')
+    breaker.record_failure('a.com')
+    assert not breaker.allow('a.com') and breaker.allow('b.com')
+    clock.now += 59
+    assert not breaker.allow('a.com')
+
+
+def test_breaker_half_open_trial(clock):
+    breaker = HostCircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure('a.com')
+    clock.now += 60
+    assert breaker.allow('a.com')  # one trial
+    assert not breaker.allow('a.com')
+    breaker.record_failure('a.com')  # trial failed, open again
+    clock.now += 59
+    assert not breaker.allow('a.com')
+    clock.now += 1
+    assert breaker.allow('a.com')
+    breaker.record_success('a.com')
+    assert breaker.allow('a.com') and breaker.allow('a.com')
+
+
+def test_success_resets_failures(clock):
+    breaker = HostCircuitBreaker(failure_threshold=2)
+    breaker.record_failure('a.com')
+    breaker.record_success('a.com')
+    breaker.record_failure('a.com')
+    assert breaker.allow('a.com')
+
+
+def test_deadline(clock):
+    scheduler = CrawlScheduler(deadline=5)
+    assert scheduler.deadline_time is None and not scheduler.should_stop()
+    scheduler.start()
+    assert scheduler.deadline_time == 1005.0
+    clock.now += 4.9
+    assert not scheduler.should_stop()
+    clock.now += 0.1
+    assert scheduler.deadline_passed() and scheduler.should_stop()
+    assert CrawlScheduler().deadline_time is None
+
+
+def test_region_target(clock):
+    scheduler = CrawlScheduler(region_target=10)
+    scheduler.start()
+    scheduler.add(UrlMetrics(6))
+    assert not scheduler.should_stop()
+    scheduler.add(UrlMetrics(4))
+    assert scheduler.target_reached() and scheduler.should_stop()
+    scheduler.start()  # next query
+    assert not scheduler.should_stop()
+
+
+def test_order_by_best_rank():
+    url_modes = {'c': [('query', 2)], 'a': [('query', 5), ('items', 0)], 'b': [('query_items', 2)], 'd': [('items', 9)]}
+    assert CrawlScheduler().order(url_modes) == ['a', 'c', 'b', 'd']
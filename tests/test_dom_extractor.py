@@ -0,0 +1,43 @@
+from dom_extractor import DOMExtractor, clean_text
+
+
+def test_lists_titled_by_the_nearest_heading():
+    html = '<html><head><title>t</title><script>var x = "<ul><li>no</li></ul>";</script></head><body>' \
+           '<h2>Common <b>symptoms</b></h2><div><ul><li>fever</li><li><a href="/c">cough</a></li><li>x</li>' \
+           '<li>sore-throat</li></ul></div><h3>treatments</h3><ol><li>rest</li><li>fluids</li></ol></body></html>'
+    lists, lists_descs, texts = DOMExtractor().extract(html)
+    # entries of three characters or less are dropped, '-' is cleaned as in html_get_content
+    assert lists == [['fever', 'cough', 'sore throat'], ['rest', 'fluids']]
+    assert lists_descs == ['Common symptoms', 'treatments']
+    assert texts == []
+
+
+def test_tables_and_captions():
+    html = '<h2>prices</h2><table><caption>fruit prices</caption><thead><tr><th>name</th><th>price</th></tr></thead>' \
+           '<tbody><tr><td>apple</td><td>1</td></tr><tr><td>banana</td><td>2</td></tr></tbody></table>' \
+           '<table><tr><td>north</td></tr><tr><td>south</td></tr></table>'
+    lists, lists_descs, texts = DOMExtractor().extract(html)
+    assert lists == [['name price', 'apple 1', 'banana 2'], ['north', 'south']]
+    assert lists_descs == ['fruit prices', 'prices']
+
+
+def test_nested_lists_titled_by_their_entry():
+    html = '<ul><li>fruits<ul><li>apple</li><li>pear</li></ul></li><li>vegetables<ul><li>leek</li><li>kale</li>' \
+           '</ul></li></ul>'
+    lists, lists_descs, texts = DOMExtractor().extract(html)
+    assert lists == [['fruits', 'vegetables'], ['apple', 'pear'], ['leek', 'kale']]
+    assert lists_descs == ['', 'fruits', 'vegetables']
+
+
+def test_texts_and_long_descriptions():
+    sentence = 'Influenza is a contagious respiratory illness caused by influenza viruses that infect the nose.'
+    html = '<h1>' + 'a very long heading that is not taken for the title of the following list at all' + '</h1>' \
+           '<p>' + sentence + '</p><ul><li>' + sentence + '</li><li>fever</li><li>chills</li></ul>'
+    lists, lists_descs, texts = DOMExtractor().extract(html)
+    assert texts == [sentence, sentence]  # long entries are texts
+    assert lists == [['fever', 'chills']] and lists_descs == ['']
+
+
+def test_broken_documents():
+    assert DOMExtractor().extract('') == ([], [], [])
+    assert clean_text(' a\t*b+ -c ') == 'a b c'
@@ -0,0 +1,124 @@
+import os
+import pytest
+import html_cache
+from html_cache import HTMLCache, normalize_url
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(html_cache.time, 'time', clock.time)
+    return clock
+
+
+def blobs(cache):
+    return sorted([name for _, _, names in os.walk(cache.path + 'objects/') for name in names])
+
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Example.COM:80/a?b=2&a=1#top') == 'http://example.com/a?a=1&b=2'
+    assert normalize_url('https://example.com:8443') == 'https://example.com:8443/'
+
+
+def test_put_get_and_shared_blob(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/', ttl=100)
+    assert cache.get('http://a.com/') is None
+    cache.put('http://a.com/', '<html>same é</html>')
+    cache.put('http://b.com/x', '<html>same é</html>')
+    assert cache.get('HTTP://A.com') == '<html>same é</html>'
+    assert len(blobs(cache)) == 1  # content-addressed
+    cache.close()
+
+
+def test_ttl(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/', ttl=100)
+    cache.put('http://a.com/', 'a')
+    clock.now += 101
+    assert cache.get('http://a.com/') is None
+    cache.evict()
+    assert blobs(cache) == []
+    cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/', ttl=0, max_bytes=10 ** 9)
+    for i in range(3):
+        clock.now += 1
+        cache.put('http://h.com/' + str(i), str(i) * 5000)
+    size = os.path.getsize(cache.blob_path(cache.db.execute('SELECT digest FROM pages').fetchone()[0]))
+    clock.now += 1
+    assert cache.get('http://h.com/0') is not None  # buffered access, written by evict
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.get('http://h.com/1') is None
+    assert cache.get('http://h.com/0') is not None and cache.get('http://h.com/2') is not None
+    assert len(blobs(cache)) == 2
+    cache.close()
+
+
+def test_access_times_are_buffered(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/')
+    cache.flush_interval = 2
+    cache.put('http://a.com/', 'a')
+    cache.put('http://b.com/', 'b')
+    put_time = clock.now
+
+    def accessed_at(url):
+        return cache.db.execute('SELECT accessed_at FROM pages WHERE url = ?', (url,)).fetchone()[0]
+
+    clock.now += 5
+    cache.get('http://a.com/')
+    cache.get('http://a.com/')
+    assert accessed_at('http://a.com/') == put_time  # one url buffered
+    cache.get('http://b.com/')
+    assert accessed_at('http://a.com/') == put_time + 5 and accessed_at('http://b.com/') == put_time + 5
+    clock.now += 5
+    cache.get('http://a.com/')
+    cache.close()
+    cache = HTMLCache(str(tmp_path) + '/')
+    assert accessed_at('http://a.com/') == put_time + 10  # written by close
+    cache.close()
+
+
+def test_removed_blob(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/')
+    cache.put('http://a.com/', 'a')
+    os.remove(cache.blob_path(cache.db.execute('SELECT digest FROM pages').fetchone()[0]))
+    assert cache.get('http://a.com/') is None
+    assert cache.db.execute('SELECT COUNT(*) FROM pages').fetchone()[0] == 0
+    cache.close()
+
+
+def test_blob_size_and_rewrite(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/')
+    cache.put('http://a.com/', 'a' * 1000)
+    digest, size = cache.db.execute('SELECT digest, size FROM blobs').fetchone()
+    assert size == os.path.getsize(cache.blob_path(digest))
+    os.remove(cache.blob_path(digest))  # evicted by another process
+    cache.put('http://b.com/', 'a' * 1000)
+    assert cache.get('http://a.com/') == 'a' * 1000
+    cache.close()
+
+
+def test_shared_blob_freed_once(tmp_path, clock):
+    cache = HTMLCache(str(tmp_path) + '/', ttl=0)
+    clock.now += 1
+    cache.put('http://a.com/', 'x' * 5000)
+    cache.put('http://b.com/', 'x' * 5000)  # same blob
+    clock.now += 1
+    cache.put('http://c.com/', 'y' * 5000)
+    size = cache.db.execute('SELECT size FROM blobs ORDER BY size DESC').fetchone()[0]
+    cache.max_bytes = 2 * size - 1
+    cache.evict()
+    # the shared blob is freed once both of its urls are gone, the newer page is kept
+    assert cache.get('http://a.com/') is None and cache.get('http://b.com/') is None
+    assert cache.get('http://c.com/') == 'y' * 5000
+    cache.close()
@@ -0,0 +1,77 @@
+import random
+import pytest
+import candidates_extractor_ranker as ranker
+import kb_index
+from kb_index import KBIndex, build_kb_index
+
+# the on-disk index of the knowledge bases against the linear scans of the WebIsA letter files and the Concept Graph
+
+terms = ['apple', 'apples', 'apple pie', 'apricot', 'ant', 'a', 'aéro', 'avocado']
+values = ['fruit', 'company', 'tree', 'dessert', 'food', 'insect', 'plane', 'brand', 'thing']
+
+
+def write_source(path, key_field, freqs, seed=0):
+    # tab-separated lines with repeated keys, tied frequencies and a last line without line break
+    rand = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(300):
+            fields = [rand.choice(terms), rand.choice(values)]
+            if key_field == 1:
+                fields.reverse()
+            f.write('\t'.join(fields) + '\t' + str(rand.choice(freqs)) + '\n')
+        f.write('apple\tlast line\t99')
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(ranker, 'webisa_path', str(tmp_path) + '/webisa/')
+    monkeypatch.setattr(ranker, 'concept_graph_path', str(tmp_path) + '/concept_graph.txt')
+    monkeypatch.setattr(kb_index, 'kb_index_path', str(tmp_path) + '/kb_index/')
+    monkeypatch.setattr(kb_index, 'open_indexes', {})
+    (tmp_path / 'webisa').mkdir()
+    write_source(ranker.webisa_path + 'a_ten.txt', 0, [0.5, 1.0, 2.0, 2.0, 3.25])
+    write_source(ranker.concept_graph_path, 1, [1, 2, 2, 7], seed=1)
+    return tmp_path
+
+
+def test_webisa_index_matches_scan(paths):
+    extractor = ranker.WebisaExtractor()
+    scanned = {term: extractor.lookup_desc(term) for term in terms + ['absent']}
+    build_kb_index(ranker.webisa_path + 'a_ten.txt', kb_index.webisa_index_path('a'))
+    assert kb_index.open_kb_index(kb_index.webisa_index_path('a'), ranker.webisa_path + 'a_ten.txt') is not None
+    assert {term: extractor.lookup_desc(term) for term in scanned} == scanned
+
+
+def test_concept_graph_index_matches_scan(paths):
+    extractor = ranker.ConceptGraphExtractor()
+    scanned = {term: extractor.lookup_desc(term) for term in terms + ['absent']}
+    build_kb_index(ranker.concept_graph_path, kb_index.concept_graph_index_path(), key_field=1, value_field=0,
+                   freq_type=int, encoding='utf-8')
+    assert {term: extractor.lookup_desc(term) for term in scanned} == scanned
+
+
+def test_external_sort_matches_in_memory(paths):
+    source = ranker.webisa_path + 'a_ten.txt'
+    build_kb_index(source, str(paths) + '/memory')
+    build_kb_index(source, str(paths) + '/runs', run_lines=7)
+    for extension in ['.dat', '.idx']:
+        with open(str(paths) + '/memory' + extension, 'rb') as f1, open(str(paths) + '/runs' + extension, 'rb') as f2:
+            assert f1.read() == f2.read()
+    assert not list(paths.glob('runs.run*'))  # temp runs removed
+
+
+def test_stale_and_empty_indexes(paths):
+    source = ranker.webisa_path + 'a_ten.txt'
+    path = kb_index.webisa_index_path('a')
+    assert kb_index.open_kb_index(path, source) is None  # not built
+    build_kb_index(source, path)
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write('\n')
+    stale_time = kb_index.os.path.getmtime(path + '.idx') + 10
+    kb_index.os.utime(source, (stale_time, stale_time))
+    assert kb_index.open_kb_index(path, source) is None  # source changed since
+    empty = str(paths) + '/empty.txt'
+    open(empty, 'w').close()
+    build_kb_index(empty, str(paths) + '/empty')
+    index = KBIndex(str(paths) + '/empty')
+    assert index.keys == 0 and index.lookup('apple') == []
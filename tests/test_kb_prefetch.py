@@ -0,0 +1,63 @@
+import pytest
+import candidates_extractor_ranker as ranker
+import kb_index
+from kb_cache import LRUCache
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch):
+    monkeypatch.setattr(ranker, 'webisa_path', str(tmp_path) + '/webisa/')
+    monkeypatch.setattr(ranker, 'concept_graph_path', str(tmp_path) + '/concept_graph.txt')
+    monkeypatch.setattr(kb_index, 'kb_index_path', str(tmp_path) + '/kb_index/')
+    monkeypatch.setattr(kb_index, 'open_indexes', {})
+    monkeypatch.setattr(ranker, 'webisa_cache', LRUCache())
+    monkeypatch.setattr(ranker, 'concept_graph_cache', LRUCache())
+    (tmp_path / 'webisa').mkdir()
+    with open(ranker.webisa_path + 'f_ten.txt', 'w') as f:
+        f.write('flu\tdisease\t3.0\nflu\tillness\t5.0\nfever\tsymptom\t2.0\n')
+    with open(ranker.webisa_path + 's_ten.txt', 'w') as f:
+        f.write('symptom\tsign\t1.0\n')
+    with open(ranker.concept_graph_path, 'w', encoding='utf-8') as f:
+        f.write('disease\tflu\t7\nvirus\tflu\t9\nsign\tfever\t1\n')
+    return tmp_path
+
+
+def test_lru_cache():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # b is now the least recently used
+    cache.put('c', 3)
+    assert not cache.contains('b') and cache.contains('a') and cache.contains('c')
+    assert cache.get('b') is None and (cache.hits, cache.misses) == (1, 1)
+
+
+def test_prefetch_fills_caches(kb):
+    ranker.prefetch_kb_terms(['flu_1', 'symptom_2'], [['fever'], ['zebra']])
+    assert ranker.webisa_cache.get('flu') == (('illness', 'disease'), (5.0, 3.0))
+    assert ranker.webisa_cache.get('zebra') is None  # no letter file, left to find_desc
+    assert ranker.concept_graph_cache.get('flu') == (('virus', 'disease'), (9, 7))
+    assert ranker.concept_graph_cache.get('zebra') == ((), ())
+    for extractor in [ranker.WebisaExtractor(), ranker.ConceptGraphExtractor()]:
+        for term in ['flu', 'fever', 'symptom']:  # served by the caches as looked up
+            descs, freqs = extractor.lookup_desc(term)
+            assert extractor.find_desc(term) == (list(descs), list(freqs))
+
+
+def test_prefetch_error_falls_back_to_lookups(kb, capsys):
+    (kb / 'concept_graph.txt').unlink()
+    ranker.prefetch_kb_terms(['flu_1'], [['fever']])
+    assert 'prefetch error: ConceptGraphExtractor' in capsys.readouterr().out
+    assert ranker.webisa_cache.get('fever') == (('symptom',), (2.0,))  # the other knowledge base still prefetched
+    assert not ranker.concept_graph_cache.contains('flu')
+    with pytest.raises(OSError):  # only a query looking the term up fails
+        ranker.ConceptGraphExtractor().find_desc('flu')
+
+
+def test_prefetch_skips_ranked_queries(kb):
+    results_path = str(kb) + '/results/'
+    (kb / 'results').mkdir()
+    open(results_path + 'flu_1_query.txt', 'w').close()
+    ranker.prefetch_unranked_kb_terms(['flu_1', 'fever_2'], [['symptom'], []], [results_path] * 2)
+    assert not ranker.webisa_cache.contains('flu') and not ranker.webisa_cache.contains('symptom')
+    assert ranker.webisa_cache.contains('fever')
@@ -0,0 +1,126 @@
+import os
+import pytest
+
+lists_texts_extractor = pytest.importorskip('lists_texts_extractor')  # needs requests and requests_html
+from page_fetcher import FetchResult
+from candidates_store import read_candidates
+from query_manifest import QueryManifest
+
+
+class FakeStream:
+    def __init__(self, results):
+        self.results = results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if len(self.results) == 0:
+            raise StopIteration
+        return self.results.pop(0)
+
+    def poll(self):
+        return self.results.pop(0) if len(self.results) > 0 else None
+
+    def close(self):
+        self.results = []
+
+
+class FakeFetcher:
+    def __init__(self, pages):
+        self.pages = pages  # {url: html}, urls missing fail
+        self.fetched = []
+
+    def fetch_iter(self, urls, deadline_time=None):
+        self.fetched.extend([url for _, url in urls])
+        return FakeStream([FetchResult(key, url, html=self.pages[url]) if url in self.pages else
+                           FetchResult(key, url, error=ConnectionError(url)) for key, url in urls])
+
+    def close(self):
+        pass
+
+
+class FakeBingStore:
+    def __init__(self, urls_of_modes):
+        self.urls_of_modes = urls_of_modes
+
+    def get_urls(self, query):
+        return self.urls_of_modes
+
+
+def page(name):
+    return '<html><body><h2>fruits of ' + name + '</h2><ul><li>apple</li><li>banana</li><li>cherry</li></ul>' \
+           '<p>the best fruit salad recipes use seasonal fruits, ' + name + ' said about it yesterday</p>' \
+           '<p>contact us</p></body></html>'
+
+
+urls_of_modes = {'query': ['http://a.com/', 'http://b.com/'], 'query_items': ['http://b.com/', 'http://c.com/'],
+                 'items': ['http://a.com/', 'http://c.com/', 'http://b.com/']}
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    analyzed = []
+    analyze_url = lists_texts_extractor.analyze_url
+
+    def counting_analyze_url(query, items, url, *args, **kwargs):
+        analyzed.append(url)
+        return analyze_url(query, items, url, *args, **kwargs)
+
+    monkeypatch.setattr(lists_texts_extractor, 'analyze_url', counting_analyze_url)
+    return analyzed
+
+
+def test_each_url_fetched_and_analyzed_once(tmp_path, analyzed):
+    fetcher = FakeFetcher(dict([(url, page('salad')) for url in ['http://a.com/', 'http://b.com/', 'http://c.com/']]))
+    lists_texts_extractor.extract_lists_texts('salad', ['apple', 'banana', 'cherry'], str(tmp_path) + '/',
+                                              fetcher=fetcher, bing_store=FakeBingStore(urls_of_modes))
+    assert sorted(fetcher.fetched) == ['http://a.com/', 'http://b.com/', 'http://c.com/']
+    assert sorted(analyzed) == sorted(fetcher.fetched)
+    # the regions of a shared page are written for every search mode and index it was returned at
+    candidates = read_candidates(str(tmp_path) + '/salad_candidates.jsonl')
+    assert len(candidates[('q', 'query', 'text')]) == 2
+    assert len(candidates[('qi', 'query', 'text')]) == 2 and len(candidates[('qi', 'items', 'list')]) == 2
+    assert len(candidates[('i', 'items', 'list')]) == 3 and len(set(candidates[('i', 'items', 'list')])) == 1
+    assert QueryManifest(str(tmp_path) + '/salad_manifest.json').stage_done('candidates')
+
+
+def test_stages_hand_off_in_memory(tmp_path):
+    path = str(tmp_path)
+    in_memory = lists_texts_extractor.analyze_url('salad', ['apple'], 'http://a.com/', '0', path, page('salad'))
+    assert os.listdir(path) == []
+    dumped = lists_texts_extractor.analyze_url('salad', ['apple'], 'http://a.com/', '0', path, page('salad'),
+                                               dump_files=True)
+    assert dumped == in_memory
+    assert sorted(os.listdir(path)) == ['html-content_0.txt', 'html-lists_texts_0.txt', 'html-preprocess_0.txt',
+                                        'html_0.txt']
+
+
+def test_content_lines_split_as_a_text_mode_read(tmp_path):
+    # the content used to be read back from html-content_*.txt, where a lone '\r' also ends a line
+    analyzer = lists_texts_extractor.HTMLAnalyzer('http://a.com/', '0', str(tmp_path), 'salad', ['apple'], html='')
+    analyzer.content = '   menu\n fruits\n  apple\r  banana\r\n  cherry\n the end\n'
+    with open(str(tmp_path) + '/content.txt', 'w', encoding='utf-8', newline='') as f:
+        f.write(analyzer.content)
+    lists_texts = analyzer.extract_lists_texts_of_url()
+    with open(str(tmp_path) + '/content.txt', 'r', encoding='utf-8') as f:
+        analyzer.content = f.read()
+    assert analyzer.extract_lists_texts_of_url() == lists_texts
+    assert lists_texts[0] == [['apple', 'banana', 'cherry']] and lists_texts[1] == ['fruits']
+
+
+def test_resume_fetches_only_the_urls_left(tmp_path):
+    pages = dict([(url, page('salad')) for url in ['http://a.com/', 'http://b.com/', 'http://c.com/']])
+    failing = FakeFetcher(dict([(url, pages[url]) for url in ['http://a.com/', 'http://c.com/']]))
+    top_results_path = str(tmp_path) + '/'
+    lists_texts_extractor.extract_lists_texts('salad', ['apple', 'banana', 'cherry'], top_results_path,
+                                              fetcher=failing, bing_store=FakeBingStore(urls_of_modes))
+    manifest = QueryManifest(top_results_path + 'salad_manifest.json')
+    assert not manifest.stage_done('candidates') and manifest.url_done('items', 0) and not manifest.url_done('items', 2)
+    fetcher = FakeFetcher(pages)
+    lists_texts_extractor.extract_lists_texts('salad', ['apple', 'banana', 'cherry'], top_results_path,
+                                              fetcher=fetcher, bing_store=FakeBingStore(urls_of_modes))
+    assert fetcher.fetched == ['http://b.com/']
+    assert QueryManifest(top_results_path + 'salad_manifest.json').stage_done('candidates')
+    candidates = read_candidates(top_results_path + 'salad_candidates.jsonl')
+    assert len(candidates[('i', 'items', 'list')]) == 3 and len(candidates[('q', 'query', 'text')]) == 2
@@ -0,0 +1,66 @@
+import sys
+import types
+import pytest
+import model_registry
+
+
+class Pipeline:
+    built = []
+
+    def __init__(self, lang, path, processors='', use_gpu=True):
+        Pipeline.built.append((lang, processors, use_gpu))
+
+
+@pytest.fixture
+def models(monkeypatch):
+    # stand-ins of the libraries, imported by the registry on first use
+    Pipeline.built = []
+    monkeypatch.setitem(sys.modules, 'stanza', types.SimpleNamespace(Pipeline=Pipeline))
+    monkeypatch.setitem(sys.modules, 'inflect', types.SimpleNamespace(engine=lambda: object()))
+    monkeypatch.setattr(model_registry, 'stanza_path', '', raising=False)
+    monkeypatch.setattr(model_registry, 'parsers', {})
+    monkeypatch.setattr(model_registry, 'inflectors', [])
+    monkeypatch.delenv('CUDA_VISIBLE_DEVICES', raising=False)
+    monkeypatch.delenv('PYTORCH_NVML_BASED_CUDA_CHECK', raising=False)
+    return model_registry
+
+
+def fake_torch(monkeypatch, available):
+    cuda = types.SimpleNamespace(is_available=lambda: available)
+    monkeypatch.setitem(sys.modules, 'torch', types.SimpleNamespace(cuda=cuda))
+
+
+def test_models_loaded_once(models):
+    parser = models.get_parser()
+    assert models.get_parser() is parser and models.get_parser(use_gpu=False) is not parser
+    assert Pipeline.built == [('en', 'tokenize,mwt,pos', True), ('en', 'tokenize,mwt,pos', False)]
+    assert models.get_inflector() is models.get_inflector()
+
+
+def test_fork_safe_without_gpu(models, monkeypatch):
+    fake_torch(monkeypatch, True)  # never asked without devices
+    monkeypatch.setattr(models.glob, 'glob', lambda pattern: [])
+    assert models.fork_safe()
+    monkeypatch.setattr(models.glob, 'glob', lambda pattern: ['/dev/nvidia0'])
+    monkeypatch.setenv('CUDA_VISIBLE_DEVICES', '-1')
+    assert models.fork_safe()
+    assert 'PYTORCH_NVML_BASED_CUDA_CHECK' not in models.os.environ
+
+
+def test_fork_safe_asks_nvml(models, monkeypatch):
+    monkeypatch.setattr(models.glob, 'glob', lambda pattern: ['/dev/nvidia0'])
+    fake_torch(monkeypatch, True)
+    assert not models.fork_safe()
+    assert models.os.environ['PYTORCH_NVML_BASED_CUDA_CHECK'] == '1'  # CUDA is not initialized by the check
+    fake_torch(monkeypatch, False)
+    assert models.fork_safe()
+
+
+def test_warm_up(models, monkeypatch):
+    monkeypatch.setattr(models.glob, 'glob', lambda pattern: ['/dev/nvidia0'])
+    fake_torch(monkeypatch, True)
+    models.warm_up()
+    assert Pipeline.built == [] and len(models.inflectors) == 1  # workers load their parser on the GPU themselves
+    fake_torch(monkeypatch, False)
+    models.warm_up()
+    assert len(Pipeline.built) == 1 and len(models.inflectors) == 1
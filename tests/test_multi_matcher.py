@@ -0,0 +1,65 @@
+import random
+import pytest
+import multi_matcher
+from multi_matcher import MultiMatcher
+
+# the matcher of the items against the nested substring loops of the list and text extractors it replaced,
+# with the pyahocorasick automaton when it is installed and with the substring fallback
+
+words = ['New York', 'york', 'Paris', 'par', 'is', 'san francisco', 'San Francisco', 'los angeles', 'la', 'A', '']
+
+
+def old_list_intersection(s, l):
+    intersection = 0
+    for s_i in s:
+        for l_i in l:
+            if l_i.replace(' ', '').lower().find(s_i.replace(' ', '').lower()) != -1:
+                intersection += 1
+                break
+    return intersection
+
+
+def old_text_intersection(s, t):
+    t_reformat = t.replace(' ', '').lower()
+    return sum([1 for s_i in s if t_reformat.find(s_i.replace(' ', '').lower()) != -1])
+
+
+def random_cases(seed):
+    rand = random.Random(seed)
+    for _ in range(300):
+        items = [rand.choice(words) for _ in range(rand.randint(1, 6))]
+        entries = [' '.join([rand.choice(words) for _ in range(rand.randint(0, 4))]) for _ in range(rand.randint(0, 5))]
+        yield items, entries
+
+
+@pytest.fixture(params=['automaton', 'substrings'])
+def backend(request, monkeypatch):
+    if request.param == 'automaton':
+        pytest.importorskip('ahocorasick')
+    else:
+        monkeypatch.setattr(multi_matcher, 'ahocorasick', None)
+    return request.param
+
+
+def test_lists_match_old_loop(backend):
+    for items, entries in random_cases(0):
+        assert len(MultiMatcher(items).match_lines(entries)) == old_list_intersection(items, entries)
+
+
+def test_texts_match_old_loop(backend):
+    for items, entries in random_cases(1):
+        matcher = MultiMatcher(items)
+        for text in entries:
+            assert len(matcher.match(matcher.normalize(text))) == old_text_intersection(items, text)
+
+
+def test_query_keeps_spaces(backend):
+    matcher = MultiMatcher(['New York'], strip_spaces=False)
+    for text in ['I love new york', 'NewYork city', 'new  york', '']:
+        assert (len(matcher.match(matcher.normalize(text))) != 0) == (text.lower().find('new york') != -1)
+
+
+def test_repeated_and_empty_items(backend):
+    matcher = MultiMatcher(['Paris', 'paris', '', 'Rome'])
+    assert matcher.match_lines(['a trip to PARIS']) == {0, 1, 2}
+    assert matcher.match_lines([]) == set()
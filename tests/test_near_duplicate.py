@@ -0,0 +1,68 @@
+import random
+from near_duplicate import NearDuplicateDetector, PageFingerprint, hamming_distance, shingle_hashes, simhash, \
+    strip_words
+
+
+def page(words):
+    return '<html><head><style>p {color: red}</style></head><body><p>' + ' '.join(words) + \
+           '</p><script>var hidden = 1;</script><!-- comment --></body></html>'
+
+
+def random_words(seed, count):
+    rand = random.Random(seed)
+    return ['w' + str(rand.randint(0, 5000)) for _ in range(count)]
+
+
+def test_simhash_matches_bitwise_majority():
+    # the numpy SimHash against a bit by bit count
+    for seed in range(5):
+        hashes = shingle_hashes(random_words(seed, 200))
+        expected = 0
+        for bit in range(64):
+            if sum([(h >> bit) & 1 for h in hashes]) * 2 > len(hashes):
+                expected |= 1 << bit
+        assert simhash(hashes) == expected
+    assert simhash([]) == 0
+
+
+def test_strip_words():
+    assert strip_words(page(['Hello', 'World'])) == ['hello', 'world']
+
+
+def test_exact_and_near_copies():
+    detector = NearDuplicateDetector()
+    words = random_words(0, 500)
+    detector.add(PageFingerprint(page(words)), 'http://a.com/')
+    assert detector.find(PageFingerprint('<div>' + page(words) + '</div>')) == 'http://a.com/'  # same text
+    assert detector.find(PageFingerprint(page(words[:-1] + ['changed']))) == 'http://a.com/'
+    assert detector.find(PageFingerprint(page(random_words(1, 500)))) is None
+
+
+def test_distance_threshold():
+    detector = NearDuplicateDetector(max_distance=3)
+    kept = PageFingerprint(page(random_words(0, 100)))
+    detector.add(kept, 'http://a.com/')
+    other = PageFingerprint(page(random_words(1, 100)))
+    other.simhash = kept.simhash ^ 0b111
+    assert hamming_distance(kept.simhash, other.simhash) == 3 and detector.find(other) == 'http://a.com/'
+    other.simhash = kept.simhash ^ 0b1111
+    assert detector.find(other) is None
+
+
+def test_short_pages_only_exact():
+    detector = NearDuplicateDetector(min_shingles=20)
+    short = PageFingerprint(page(['a', 'b', 'c', 'd', 'e']))
+    detector.add(short, 'http://a.com/')
+    other = PageFingerprint(page(['a', 'b', 'c', 'd', 'f']))
+    other.simhash = short.simhash
+    assert detector.find(other) is None
+    assert detector.find(PageFingerprint(page(['a', 'b', 'c', 'd', 'e']))) == 'http://a.com/'
+
+
+def test_pages_without_text_never_duplicate():
+    detector = NearDuplicateDetector()
+    empty = PageFingerprint('<html><body><script>render()</script></body></html>')
+    assert empty.empty
+    detector.add(empty, 'http://a.com/')
+    assert detector.find(PageFingerprint('<frameset><frame src="b.html"></frameset>')) is None
+    assert detector.digests == {} and detector.fingerprints == []
@@ -0,0 +1,97 @@
+import random
+import re
+import pytest
+import candidates_extractor_ranker as ranker
+from ngram_counter import NgramCounter
+
+# the n-gram counting of the ranker against the dictionary counting and filtering it replaced
+
+vocab = ['disease', 'symptoms', 'pains', 'is', 'a', 'an', 'such', 'as,', 'like', 'the', 'of', 'cancer', 'flu',
+         'headaches', 'fever', '12', 'the-end', '-', ',', 'dress', 'treatment', 'heart']
+stopwords = ['the', 'a', 'an', 'of', 'is', 'as']
+
+
+class SuffixInflector:
+    def singular_noun(self, word):
+        return word[:-1] if len(word) > 3 and word.endswith('s') else False
+
+
+def random_texts(seed, count):
+    rand = random.Random(seed)
+    texts = [' '.join([rand.choice(vocab) for _ in range(rand.randint(1, 30))]) for _ in range(count)]
+    return texts + ['[skip] this line', 'a  b', '']
+
+
+def old_get_freq_dicts(candidates_texts, stopwords):
+    grams = [[], [], [], [], []]  # words without stopwords, then 2- to 5-grams
+    for line in candidates_texts:
+        if line.find('[') != -1:
+            continue
+        words = [re.sub(r'[^A-Za-z0-9 ]+', '', word) for word in line.split(' ')]
+        grams[0].extend([word for word in words if not (word.startswith('-') or word in stopwords)])
+        for n in range(2, 6):
+            grams[n - 1].extend([' '.join(words[i:i + n]) for i in range(len(words) - n + 1)])
+    sorted_dicts = []
+    for n_grams in grams:
+        freq = {}
+        for gram in n_grams:
+            freq[gram] = freq.get(gram, 0) + 1
+        sorted_dicts.append(sorted(freq.items(), key=lambda item: item[1], reverse=True))
+    return sorted_dicts
+
+
+def old_combine_freq_dicts(query, items, words, tuples, triples, fourples, fiveples, inflector):
+    query_items_words = query.split(' ')
+    for item in items:
+        query_items_words.extend(item.split(' '))
+    words = [word for word in words if not (word[0] == '' or word[0].isdigit() or query.find(word[0]) != -1 or
+                                            ' '.join(items).find(word[0]) != -1)]
+    grams = words[:30]
+    for n_grams in [tuples, triples, fourples, fiveples]:
+        grams += [gram for gram in n_grams if not all([w in query_items_words for w in gram[0].split(' ')])][:30]
+    combined = {}
+    for gram, freq in grams:
+        gram = ranker.convert_singular_line(inflector, gram)
+        combined[gram] = combined.get(gram, 0) + freq
+    return sorted(combined.items(), key=lambda item: item[1], reverse=True)
+
+
+@pytest.fixture(autouse=True)
+def no_lexicon(monkeypatch):
+    monkeypatch.setattr(ranker, 'open_singular_lexicon', lambda: None)
+    monkeypatch.setattr(ranker, 'singular_words', {})
+
+
+def new_ranker(query, items):
+    r = ranker.CandidatesExtractorRanker.__new__(ranker.CandidatesExtractorRanker)
+    r.query_no_id = query
+    r.items = items
+    r.stopwords = set(stopwords)
+    return r
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_freq_dicts_match_old_path(seed):
+    texts = random_texts(seed, 400)
+    r = new_ranker('heart disease', ['symptom', 'cause', 'fever'])
+    old = old_combine_freq_dicts(r.query_no_id, r.items, *old_get_freq_dicts(texts, stopwords), SuffixInflector())
+    new = ranker.combine_freq_dicts(*r.get_freq_dicts(texts), SuffixInflector())
+    assert new == old
+
+
+def test_top_keeps_stable_order_of_ties():
+    counter = NgramCounter()
+    counter.add(['b', 'a', 'c', 'a', 'b', 'd'])
+    assert counter.top(1, 3) == [('b', 2), ('a', 2), ('c', 1)]
+    assert counter.top(2, 10) == [('b a', 1), ('a c', 1), ('c a', 1), ('a b', 1), ('b d', 1)]
+
+
+def test_top_widens_past_rejected_head():
+    counter = NgramCounter()
+    counter.add(['x'] * 50 + ['y'] * 10 + ['z'] * 5)
+    counter.add(['w'])
+    x = counter.ids['x']
+    assert counter.top(1, 2, lambda gram: gram[0] != x) == [('y', 10), ('z', 5)]
+    assert counter.top(6, 2) == [('x x x x x x', 45), ('y y y y y y', 5)]
+    assert 'z w' not in dict(counter.top(2, 100))  # n-grams do not cross lines
+    assert counter.top(1, 3, lambda gram: False) == []
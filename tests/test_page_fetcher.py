@@ -0,0 +1,101 @@
+import asyncio
+import time
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from page_fetcher import PageFetcher, TransientHTTPError
+from crawl_scheduler import HostCircuitBreaker, CircuitOpenError, DeadlineExceeded, FetchCancelled
+
+
+class ScriptedFetcher(PageFetcher):
+    # downloads fail with the errors scripted for their url, then return the url as html
+    def __init__(self, script, **kwargs):
+        PageFetcher.__init__(self, backoff=0.001, **kwargs)
+        self.script = script  # {url: [exception, ...]} raised by the first downloads
+        self.downloads = []
+
+    async def download(self, session, url):
+        self.downloads.append(url)
+        errors = self.script.get(url, [])
+        if len(errors) > 0:
+            raise errors.pop(0)
+        return url, len(url)
+
+
+def fetch(fetcher, urls, deadline_time=None):
+    results = {result.url: result for result in fetcher.fetch_iter([(url, url) for url in urls], deadline_time)}
+    fetcher.close()
+    return results
+
+
+def test_transient_failures_retried():
+    fetcher = ScriptedFetcher({'http://a.com/': [aiohttp.ClientConnectionError(), TransientHTTPError(503)],
+                               'http://b.com/': [ValueError()],
+                               'http://c.com/': [TransientHTTPError(502)] * 3}, max_retries=2)
+    results = fetch(fetcher, ['http://a.com/', 'http://b.com/', 'http://c.com/'])
+    assert results['http://a.com/'].html == 'http://a.com/' and results['http://a.com/'].error is None
+    assert isinstance(results['http://b.com/'].error, ValueError)  # not transient, not retried
+    assert isinstance(results['http://c.com/'].error, TransientHTTPError)
+    assert [fetcher.downloads.count(url) for url in ['http://a.com/', 'http://b.com/', 'http://c.com/']] == [3, 1, 3]
+
+
+def test_open_circuit_skips_the_host():
+    breaker = HostCircuitBreaker(failure_threshold=2, reset_timeout=60)
+    fetcher = ScriptedFetcher({'http://down.com/1': [aiohttp.ClientConnectionError()],
+                               'http://down.com/2': [aiohttp.ClientConnectionError()]}, breaker=breaker,
+                              max_retries=0, max_per_host=1)  # the urls of a host in order
+    results = fetch(fetcher, ['http://down.com/1', 'http://down.com/2', 'http://down.com/3', 'http://up.com/'])
+    assert isinstance(results['http://down.com/3'].error, CircuitOpenError)
+    assert 'http://down.com/3' not in fetcher.downloads
+    assert results['http://up.com/'].error is None
+    # the breaker is kept across queries until the reset timeout
+    results = fetch(fetcher, ['http://down.com/4'])
+    assert isinstance(results['http://down.com/4'].error, CircuitOpenError)
+    breaker.opened_at['down.com'] -= 60
+    assert fetch(fetcher, ['http://down.com/4'])['http://down.com/4'].error is None
+    assert 'down.com' not in breaker.opened_at
+
+
+def test_no_retry_past_the_deadline():
+    fetcher = ScriptedFetcher({'http://a.com/': [aiohttp.ClientConnectionError()] * 3}, max_retries=2)
+    fetcher.backoff = 10
+    start = time.time()
+    result = fetch(fetcher, ['http://a.com/'], time.time() + 1)['http://a.com/']
+    assert isinstance(result.error, aiohttp.ClientConnectionError) and time.time() - start < 1
+    assert fetcher.downloads == ['http://a.com/']
+
+
+def test_urls_left_at_the_deadline_or_on_close():
+    class SlowFetcher(ScriptedFetcher):
+        async def download(self, session, url):
+            if 'slow' in url:
+                await asyncio.sleep(10)
+            return await ScriptedFetcher.download(self, session, url)
+
+    results = fetch(SlowFetcher({}), ['http://slow.com/', 'http://a.com/'], time.time() + 0.3)
+    assert isinstance(results['http://slow.com/'].error, DeadlineExceeded)
+    assert results['http://a.com/'].error is None
+    fetcher = SlowFetcher({})
+    stream = fetcher.fetch_iter([(url, url) for url in ['http://slow.com/', 'http://a.com/']])
+    assert next(stream).url == 'http://a.com/'
+    stream.close()
+    assert isinstance(next(stream).error, FetchCancelled)
+    fetcher.close()
+
+
+def test_one_session_until_close():
+    sessions = []
+
+    class SessionFetcher(ScriptedFetcher):
+        async def download(self, session, url):
+            sessions.append(session)
+            return await ScriptedFetcher.download(self, session, url)
+
+    fetcher = SessionFetcher({})
+    for urls in [['http://a.com/', 'http://b.com/'], ['http://c.com/']]:
+        assert all([result.error is None for result in fetcher.fetch_iter([(url, url) for url in urls])])
+    assert len(sessions) == 3 and sessions[0] is sessions[1] is sessions[2]
+    fetcher.close()
+    assert sessions[0].closed and fetcher.loop is None
+    assert list(fetch(fetcher, ['http://a.com/']).values())[0].error is None  # a new session after close
+    assert sessions[3] is not sessions[0]
@@ -0,0 +1,56 @@
+import codecs
+import pytest
+from page_filter import BinaryContent, NotEnglish, NotHTML, PageFilter, head_bytes, is_english, sniff_charset
+
+english = ' '.join(['the list of the best places to visit in the city and what to see there'] * 20)
+french = ' '.join(['la liste des meilleurs endroits a visiter dans la ville et ce qu il faut voir'] * 20)
+script = '<script>' + ' '.join(['var the = function() { return this.and || that.of; };'] * 300)
+
+
+def read(page_filter, body, content_type='text/html', chunk_size=4096):
+    reader = page_filter.reader(content_type)
+    for i in range(0, len(body), chunk_size):
+        if not reader.feed(body[i:i + chunk_size]):
+            break
+    return reader.finish()
+
+
+def test_language_of_visible_text():
+    assert is_english('<html><body><p>' + english + '</p>' + script)
+    assert not is_english('<html><body><p>' + french + '</p>' + script)  # script cut by the end of the chunk
+    head = '<head><meta name="description" content="' + english + '"><title>' + english + '</title></head>'
+    assert not is_english('<html>' + head + '<body><p>' + french + '</p></body>')
+    assert is_english('<html lang="en"><body>' + french)
+    assert is_english('<body>' + 'too short')
+
+
+def test_defaults_keep_pages():
+    body = ('<html><body><p>' + french + '</p></body></html>').encode('utf-8') * 200
+    html, size = read(PageFilter(), body)
+    assert size == len(body) and html == body.decode('utf-8')
+
+
+def test_english_only_and_byte_cap():
+    body = ('<html><body><p>' + french + '</p></body></html>').encode('utf-8') * 200
+    with pytest.raises(NotEnglish):
+        read(PageFilter(english_only=True), body)
+    html, size = read(PageFilter(max_bytes=head_bytes * 2), body)
+    assert len(html) == head_bytes * 2 and size < len(body)
+
+
+def test_rejected_pages():
+    with pytest.raises(NotHTML):
+        PageFilter().reader('application/pdf')
+    with pytest.raises(BinaryContent):
+        read(PageFilter(), b'%PDF-1.4 ...')
+    with pytest.raises(BinaryContent):
+        read(PageFilter(), b'<html>\x00\x00</html>')
+
+
+def test_charsets():
+    assert sniff_charset('text/html; charset=ISO-8859-1', b'<html>') == 'iso8859-1'
+    assert sniff_charset('text/html', b'<meta charset="windows-1252"><html>') == 'cp1252'
+    assert sniff_charset('text/html; charset=bogus', codecs.BOM_UTF8 + b'<html>') == 'utf-8-sig'
+    assert sniff_charset('', b'<html>') == 'utf-8'
+    html, _ = read(PageFilter(), 'caf\xe9'.encode('cp1252'), 'text/html; charset=windows-1252')
+    assert html == 'café'
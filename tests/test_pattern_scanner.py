@@ -0,0 +1,68 @@
+import random
+import re
+from pattern_scanner import PatternScanner, space_offsets, word_window
+
+# the single-pass scanner and the word windows against the per-pattern regex loop and character walk it replaced
+
+patterns = ['NPt is a NPh', 'NPh such as NPt', 'NPh including NPt', 'NPt and other NPh', 'NPt is an NPh',
+            'NPh like NPt', 'NPt and NPh', 'NPh']
+vocab = ['disease', 'symptom', 'pain', 'is', 'a', 'an', 'such', 'as', 'like', 'including', 'and', 'other', 'cause',
+         'fever', 'the', 'of', 'cancer', 'flu', 'headache', 'island']
+
+
+def old_windows(line):
+    # (pattern number, text before, text after) of each hit, by pattern then position
+    hits = []
+    for number, pattern in enumerate([pattern for pattern in patterns if pattern.replace('NPt', '').replace(
+            'NPh', '') != '']):
+        match_str = pattern.replace('NPt', '').replace('NPh', '')
+        for pos in [match.start() for match in re.finditer(match_str, line)]:
+            start_pos = pos - 1
+            n = 0
+            while n < 10 and start_pos > 0:
+                start_pos -= 1
+                if line[start_pos] == ' ':
+                    n += 1
+            end_pos = pos + len(match_str) + 1
+            n = 0
+            while n < 10 and end_pos < len(line) - 1:
+                end_pos += 1
+                if line[end_pos] == ' ':
+                    n += 1
+            if start_pos < 0:
+                start_pos = 0
+            if end_pos >= len(line):
+                end_pos = len(line)
+            hits.append((number, line[start_pos:pos], line[pos + len(match_str):end_pos + 1]))
+    return hits
+
+
+def new_windows(scanner, line):
+    hits = []
+    spaces = space_offsets(line)
+    for number, pos in scanner.find(line):
+        length = len(scanner.patterns[number][0])
+        start_pos, end_pos = word_window(line, spaces, pos, length)
+        hits.append((number, line[start_pos:pos], line[pos + length:end_pos + 1]))
+    return hits
+
+
+def test_windows_match_old_loop():
+    scanner = PatternScanner(patterns)
+    rand = random.Random(0)
+    lines = [' '.join([rand.choice(vocab) for _ in range(rand.randint(0, 40))]) for _ in range(500)]
+    lines += ['is a disease', ' is a disease', 'disease and and other x', 'a and and and b disease', 'is a',
+              'x  is a  y', 'and and and']
+    for line in lines:
+        assert new_windows(scanner, line) == old_windows(line), line
+
+
+def test_pattern_positions():
+    scanner = PatternScanner(patterns)
+    assert [match_str for match_str, _, _ in scanner.patterns][:2] == [' is a ', ' such as ']
+    assert scanner.patterns[0][1] > scanner.patterns[0][2]  # NPt is a NPh: NPh after NPt
+    assert len(scanner.patterns) == len(patterns) - 1  # a pattern without words is dropped
+
+
+def test_no_patterns():
+    assert PatternScanner([]).find('flu is a disease') == []
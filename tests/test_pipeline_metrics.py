@@ -0,0 +1,57 @@
+import json
+from pipeline_metrics import Histogram, MetricsSummary, PipelineMetrics, UrlMetrics
+
+
+def url_metrics(url, fetch, segment=None, source='network', error=None, duplicate_of=None):
+    metrics = UrlMetrics(url, source)
+    metrics.add_time('fetch', fetch)
+    if segment is not None:
+        metrics.add_time('segment', segment)
+    if error is not None:
+        metrics.set_error(*error)
+        metrics.set_error('match', KeyError())  # only the first failure is kept
+    metrics.duplicate_of = duplicate_of
+    return metrics
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram()
+    for ms in [0.5, 1, 3, 3, 40, 40000]:
+        histogram.add(ms)
+    assert histogram.counts[0] == 2 and histogram.counts[2] == 2 and histogram.counts[-1] == 1
+    assert histogram.percentile(0.5) == 5 and histogram.percentile(0.99) is None
+    summary = histogram.to_dict()
+    assert summary['count'] == 6 and summary['max_ms'] == 40000
+    assert summary['buckets'] == {'<=1': 2, '<=5': 2, '<=50': 1, '>30000': 1}
+    assert Histogram().percentile(0.5) == 0
+
+
+def test_summary_counts():
+    summary = MetricsSummary()
+    summary.add(url_metrics('http://a.com/', 0.010, 0.100))
+    summary.add(url_metrics('http://b.com/', 0.001, source='cache', error=('fetch', TimeoutError())))
+    summary.add(url_metrics('http://c.com/', 0.002, source='archive', duplicate_of='http://a.com/'))
+    summary = summary.to_dict()
+    assert summary['urls'] == 3 and summary['cached'] == 2 and summary['duplicates'] == 1
+    assert summary['errors'] == {'fetch': {'TimeoutError': 1}}
+    assert summary['stages']['fetch']['count'] == 3 and summary['stages']['segment']['count'] == 1
+    assert summary['duplicate_saved_s'] == 0.1  # the segment time of the analyzed url
+
+
+def test_run_files(tmp_path):
+    metrics = PipelineMetrics(str(tmp_path) + '/', 'run')
+    metrics.start_query('flu')
+    metrics.add_url(url_metrics('http://a.com/', 0.010, 0.100))
+    metrics.end_query()
+    metrics.start_query('cold')
+    metrics.add_url(url_metrics('http://b.com/', 0.020))
+    metrics.close()
+    with open(str(tmp_path) + '/run_urls.jsonl', 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [(record['query'], record['url']) for record in records] == [('flu', 'http://a.com/'),
+                                                                      ('cold', 'http://b.com/')]
+    assert records[0]['ms'] == {'fetch': 10.0, 'segment': 100.0}
+    with open(str(tmp_path) + '/run.json', 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+    # a query not ended is only counted in the run
+    assert summary['run']['urls'] == 2 and list(summary['queries']) == ['flu']
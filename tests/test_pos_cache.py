@@ -0,0 +1,71 @@
+import os
+import types
+import pytest
+import candidates_extractor_ranker as ranker
+import pos_cache
+from pos_cache import PosCache, open_pos_cache
+
+tags = {'red': 'ADJ', 'the': 'DET', 'of': 'ADP', 'runs': 'VERB', 'fast': 'ADV'}  # other words are nouns
+
+
+class FakeParser:
+    # tags each document in one call like a multi-document stanza pipeline
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, docs):
+        self.calls.append(list(docs))
+        return [types.SimpleNamespace(sentences=[types.SimpleNamespace(
+            words=[types.SimpleNamespace(pos=tags.get(word, 'NOUN')) for word in doc.split(' ')])]) for doc in docs]
+
+
+class TableInflector:
+    def singular_noun(self, word):
+        return {'rashes': 'rash', 'coughs': 'cough'}.get(word, False)
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    monkeypatch.setattr(ranker, 'stanza_documents', lambda texts: texts)
+    monkeypatch.setattr(ranker, 'open_singular_lexicon', lambda: None)
+    monkeypatch.setattr(ranker, 'singular_words', {})
+    return FakeParser()
+
+
+def test_cache_across_processes_and_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(pos_cache, 'open_caches', {})
+    path = str(tmp_path) + '/pos/pos_cache.db'
+    cache = open_pos_cache(path)
+    assert open_pos_cache(path) is cache
+    cache.put_many({'red fever': ['ADJ', 'NOUN'], '': []})
+    assert cache.get('red fever') == ['ADJ', 'NOUN'] and cache.get('') == [] and cache.get('cough') is None
+    cache.pid = -1  # opened by the parent of a forked worker
+    assert open_pos_cache(path) is not cache
+    cache.close()
+    assert PosCache(path).get('red fever') == ['ADJ', 'NOUN']
+    os.remove(path)
+
+
+def test_tag_phrases_once(tmp_path, parser):
+    cache = PosCache(str(tmp_path) + '/pos_cache.db')
+    cache.put_many({'fever': ['NOUN']})
+    phrase_tags = ranker.tag_phrases(parser, ['fever', 'red rash', 'the cough', 'red rash'], cache)
+    assert phrase_tags == {'fever': ['NOUN'], 'red rash': ['ADJ', 'NOUN'], 'the cough': ['DET', 'NOUN']}
+    assert parser.calls == [['red rash', 'the cough']]  # one call, the cached phrase is not tagged again
+    assert ranker.tag_phrases(parser, ['red rash', 'the cough'], cache) == \
+        {'red rash': ['ADJ', 'NOUN'], 'the cough': ['DET', 'NOUN']}
+    assert len(parser.calls) == 1
+    cache.close()
+
+
+def test_process_freq_dict_keeps_noun_phrases(tmp_path, parser):
+    tuples = [('red rashes', 3), ('red rash', 2), ('the cough', 4), ('runs fast', 5), ('flu', 6), ('12', 1),
+              ('shortness of breath', 2)]
+    cache = PosCache(str(tmp_path) + '/pos_cache.db')
+    expected = [('red rash', 5), ('shortness of breath', 2)]
+    assert ranker.process_freq_dict(tuples, TableInflector(), 'flu', ['fever'], parser, cache) == expected
+    assert ranker.process_freq_dict(tuples, TableInflector(), 'flu', ['fever'], parser) == expected
+    assert len(parser.calls) == 2  # tagged again without the cache
+    assert ranker.process_freq_dict(tuples, TableInflector(), 'flu', ['fever'], parser, cache) == expected
+    assert len(parser.calls) == 2
+    cache.close()
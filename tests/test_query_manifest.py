@@ -0,0 +1,24 @@
+import os
+from query_manifest import QueryManifest
+
+
+def test_resume_from_saved_manifest(tmp_path):
+    path = str(tmp_path) + '/q_manifest.json'
+    manifest = QueryManifest(path)
+    manifest.set_stage_done('urls')
+    manifest.set_url_done('query', 0)
+    manifest.set_url_done('items', 3)
+    manifest.set_url_done('items', 3)
+    manifest = QueryManifest(path)
+    assert manifest.stage_done('urls') and not manifest.stage_done('candidates')
+    assert manifest.url_done('query', 0) and manifest.url_done('items', 3) and not manifest.url_done('query', 3)
+    assert manifest.urls == {'query': [0], 'items': [3]}
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_broken_manifest_starts_again(tmp_path):
+    path = str(tmp_path) + '/q_manifest.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"stages": ["urls"], "ur')  # cut short
+    manifest = QueryManifest(path)
+    assert manifest.stages == [] and manifest.urls == {}
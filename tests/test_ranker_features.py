@@ -0,0 +1,62 @@
+import pytest
+import candidates_extractor_ranker as ranker
+from candidates_store import CandidatesWriter, candidates_path
+
+query_texts = ['the flu is a contagious respiratory illness of the lungs',
+               'flu viruses spread through the droplets of coughs [1] and sneezes']
+items_texts = ['symptoms such as fevers, coughs and headaches come on suddenly',
+               'other symptoms include sore throats and runny noses for days']
+
+
+class TableInflector:
+    def singular_noun(self, word):
+        return {'fevers': 'fever', 'coughs': 'cough', 'headaches': 'headache', 'symptoms': 'symptom'}.get(word, False)
+
+
+@pytest.fixture
+def candidates_ranker(tmp_path, monkeypatch):
+    top_results_path = str(tmp_path) + '/'
+    writer = CandidatesWriter(candidates_path(top_results_path, 'flu_1'))
+    writer.write_url_regions('query', 0, query_texts)
+    writer.write_url_regions('query_items', 0, [[], ['fever, cough'], items_texts])
+    writer.close()
+    with open(top_results_path + 'stopwords.txt', 'w') as f:
+        f.write('the\na\n')
+    monkeypatch.setattr(ranker, 'stopword_path', top_results_path + 'stopwords.txt', raising=False)
+    monkeypatch.setattr(ranker, 'get_inflector', lambda: TableInflector())
+    monkeypatch.setattr(ranker, 'get_parser', lambda: None)
+    monkeypatch.setattr(ranker, 'open_pos_cache', lambda: None)
+    monkeypatch.setattr(ranker, 'open_singular_lexicon', lambda: None)
+    monkeypatch.setattr(ranker, 'singular_words', {})
+
+    def get_bert():
+        raise AssertionError('BERT loaded')
+
+    monkeypatch.setattr(ranker, 'get_bert', get_bert)
+    return ranker.CandidatesExtractorRanker('flu_1', ['fever', 'cough'], top_results_path)
+
+
+def test_singular_texts_converted_once(candidates_ranker, monkeypatch):
+    converted = []
+    convert_singular_line = ranker.convert_singular_line
+
+    def counting_convert_singular_line(inflector, line):
+        converted.append(line)
+        return convert_singular_line(inflector, line)
+
+    monkeypatch.setattr(ranker, 'convert_singular_line', counting_convert_singular_line)
+    items = candidates_ranker.get_singular_texts('items')
+    assert items == ['symptom such as fevers, cough and headache come on suddenly',
+                     'other symptom include sore throats and runny noses for days']
+    assert candidates_ranker.get_singular_texts('items') is items and len(converted) == 2
+    assert candidates_ranker.get_singular_texts('query')[1] == \
+        'flu viruses spread through the droplets of cough 1 and sneezes'
+    assert len(converted) == 4
+
+
+def test_semantic_features_off(candidates_ranker):
+    assert candidates_ranker.get_bert_features(['disease', 'illness'], ['symptom']) == ([0.0, 0.0], [0.0])
+    assert candidates_ranker.get_items_sim_features(['symptom', 'sign']) == [0.0, 0.0]
+    candidates_ranker.semantic_features = True
+    with pytest.raises(AssertionError, match='BERT loaded'):
+        candidates_ranker.get_items_sim_features(['symptom'])
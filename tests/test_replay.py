@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+
+replay = pytest.importorskip('replay')  # needs requests, requests_html and aiohttp
+from page_fetcher import FetchResult
+from replay import RecordedError, ReplayArchive, ReplayFetcher, ReplayMiss, record_archive
+from benchmark_extractor import run_benchmark
+
+
+class FakeStream:
+    def __init__(self, results):
+        self.results = results
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def poll(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeFetcher:
+    def fetch_iter(self, urls, deadline_time=None):
+        return FakeStream([FetchResult(key, url, error=ConnectionError(url)) if 'dead' in url else
+                           FetchResult(key, url, html=page(url), size=100) for key, url in urls])
+
+
+class FakeBingStore:
+    def get_urls(self, query):
+        return {'query': ['http://a.com/', 'http://dead.com/'], 'query_items': ['http://a.com/'],
+                'items': ['http://b.com/']}
+
+
+def page(url):
+    return '<html><body><h2>symptoms</h2><ul><li>fever</li><li>cough</li><li>chills</li></ul>' \
+           '<p>flu symptoms usually come on suddenly, people who have the flu often feel ' + url + '</p>' \
+           '<p>contact us</p></body></html>'
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    archive_path = str(tmp_path) + '/replay.jsonl.gz'
+    record_archive([('flu', ['fever', 'cough'], '../top/')], archive_path, fetcher=FakeFetcher(),
+                   bing_stores={'../top/': FakeBingStore()})
+    return archive_path
+
+
+def fetch(fetcher, urls):
+    results = {result.url: result for result in fetcher.fetch_iter([(url, url) for url in urls])}
+    fetcher.close()
+    return results
+
+
+def test_record_and_replay(archive_path):
+    archive = ReplayArchive(archive_path)
+    assert list(archive.queries) == ['flu']
+    assert archive.queries['flu']['urls']['http://a.com/'] == [('query', 0), ('query_items', 0)]
+    assert archive.get('HTTP://A.com') is not None
+    results = fetch(ReplayFetcher(archive), ['http://a.com/', 'http://dead.com/', 'http://c.com/'])
+    assert results['http://a.com/'].html == page('http://a.com/') and results['http://a.com/'].size == 100
+    assert isinstance(results['http://dead.com/'].error, RecordedError)
+    assert isinstance(results['http://c.com/'].error, ReplayMiss)
+
+
+def test_injected_errors_are_repeatable(archive_path):
+    urls = ['http://a.com/', 'http://b.com/']
+    assert all([isinstance(result.error, asyncio.TimeoutError)
+                for result in fetch(ReplayFetcher(archive_path, error_rate=1.0), urls).values()])
+    failed = [[url for url, result in fetch(ReplayFetcher(archive_path, error_rate=0.5, seed=seed), urls).items()
+               if result.error is not None] for seed in [3, 3]]
+    assert failed[0] == failed[1]
+
+
+def test_benchmark(archive_path):
+    report = run_benchmark(archive_path, repeat=2)
+    assert report['queries'] == 2 and report['pages'] == 4 and report['errors'] == 2
+    assert report['stages']['fetch']['count'] == 6 and report['stages']['segment']['count'] == 4
+    assert report['regions'] > 0
+    assert run_benchmark(archive_path, extractor='dom')['pages'] == 2
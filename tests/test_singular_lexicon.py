@@ -0,0 +1,69 @@
+import pytest
+import candidates_extractor_ranker as ranker
+import singular_lexicon
+from candidates_store import CandidatesWriter, candidates_path
+from singular_lexicon import build_singular_lexicon, open_singular_lexicon, singular_form
+
+# the precomputed singular forms against the rule engine of inflect they replace
+
+texts = ['Flu is a disease of the lungs', 'Diseases such as measles, mumps and rubella',
+         'This virus causes headaches', 'News about Windows and iOS', 'the dress and the dresses',
+         'Cacti, oxen, geese and analyses of 12 cases']
+
+
+class SuffixInflector:
+    # stands for inflect where it is not installed, the lexicon has to reproduce whatever the engine says
+    def singular_noun(self, word):
+        if word.endswith('ies'):
+            return word[:-3] + 'y'
+        return word[:-1] if len(word) > 3 and word.endswith('s') else False
+
+
+def build(tmp_path, monkeypatch, inflector):
+    top_results_path = str(tmp_path) + '/'
+    writer = CandidatesWriter(candidates_path(top_results_path, 'flu'))
+    writer.write_url_regions('query_items', 0, [texts[:2], texts[2:4], texts[4:]])
+    writer.close()
+    monkeypatch.setattr(singular_lexicon, 'get_inflector', lambda: inflector)
+    path = str(tmp_path) + '/lexicon/singular_lexicon'
+    build_singular_lexicon([top_results_path], path=path)
+    return open_singular_lexicon(path)
+
+
+def check_lexicon(lexicon, inflector):
+    words = set()
+    for text in texts:
+        words.update(singular_lexicon.line_words(ranker.preprocess_line(text.lower())))
+    words.discard('')
+    for word in words:
+        assert lexicon.get(word) == singular_form(inflector, word), word
+    assert lexicon.get('unseenwords') is None  # left to the rule engine
+
+
+def test_lexicon_matches_inflector(tmp_path, monkeypatch):
+    inflector = SuffixInflector()
+    lexicon = build(tmp_path, monkeypatch, inflector)
+    check_lexicon(lexicon, inflector)
+    assert lexicon.get('virus') == 'virus'  # exceptions of words_with_s
+
+
+def test_lexicon_matches_inflect(tmp_path, monkeypatch):
+    inflect = pytest.importorskip('inflect')
+    inflector = inflect.engine()
+    check_lexicon(build(tmp_path, monkeypatch, inflector), inflector)
+
+
+def test_ranker_words_with_and_without_lexicon(tmp_path, monkeypatch):
+    inflector = SuffixInflector()
+    lexicon = build(tmp_path, monkeypatch, inflector)
+    lines = [ranker.preprocess_line(text.lower()) for text in texts] + ['unseen puppies']
+    monkeypatch.setattr(ranker, 'open_singular_lexicon', lambda: None)
+    monkeypatch.setattr(ranker, 'singular_words', {})
+    without = [ranker.convert_singular_line(inflector, line) for line in lines]
+    monkeypatch.setattr(ranker, 'open_singular_lexicon', lambda: lexicon)
+    monkeypatch.setattr(ranker, 'singular_words', {})
+    assert [ranker.convert_singular_line(inflector, line) for line in lines] == without
+
+
+def test_missing_lexicon(tmp_path):
+    assert open_singular_lexicon(str(tmp_path) + '/none') is None
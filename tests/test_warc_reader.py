@@ -0,0 +1,109 @@
+import gzip
+import zlib
+import pytest
+import warc_reader
+from warc_reader import NotPerRecordGzip, WARCArchive, dechunk, iter_gzip_members, iter_plain_records, \
+    iter_warc_pages, response_html
+
+
+def warc_record(warc_type, url, block):
+    headers = 'WARC/1.0\r\nWARC-Type: ' + warc_type + '\r\nWARC-Target-URI: <' + url + '>\r\n' + \
+              'Content-Length: ' + str(len(block)) + '\r\n\r\n'
+    return headers.encode('utf-8') + block + b'\r\n\r\n'
+
+
+def http_response(body, status=b'200 OK', headers=b'Content-Type: text/html; charset=utf-8\r\n'):
+    return b'HTTP/1.1 ' + status + b'\r\n' + headers + b'\r\n' + body
+
+
+records = [warc_record('warcinfo', '', b'software: test\r\n'),
+           warc_record('request', 'http://a.com/', b'GET / HTTP/1.1\r\n\r\n'),
+           warc_record('response', 'http://a.com/', http_response('<html>é a</html>'.encode('utf-8'))),
+           warc_record('response', 'http://b.com/?y=1&x=2', http_response(
+               b'6\r\n<html>\r\n8;ext=1\r\nchunked!\r\n7\r\n</html>\r\n0\r\n\r\n',
+               headers=b'Content-Type: text/html\r\nTransfer-Encoding: chunked\r\n')),
+           warc_record('response', 'http://c.com/', http_response(
+               gzip.compress(b'<html>zipped</html>'),
+               headers=b'Content-Type: text/html\r\nContent-Encoding: gzip\r\n')),
+           warc_record('response', 'http://d.com/', http_response(b'gone', status=b'404 Not Found')),
+           warc_record('response', 'http://e.com/', http_response(
+               b'%PDF', headers=b'Content-Type: application/pdf\r\n')),
+           warc_record('response', 'http://f.com/', http_response(
+               'caf\xe9'.encode('latin-1'), headers=b'Content-Type: text/html; charset=latin-1\r\n'))]
+expected = {'http://a.com/': '<html>é a</html>', 'http://b.com/?y=1&x=2': '<html>chunked!</html>',
+            'http://c.com/': '<html>zipped</html>', 'http://f.com/': 'café'}
+
+
+@pytest.fixture(params=['members.warc.gz', 'plain.warc'])
+def warc_path(request, tmp_path):
+    path = str(tmp_path / request.param)
+    with open(path, 'wb') as f:
+        for record in records:
+            f.write(gzip.compress(record) if path.endswith('.gz') else record)
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1024 * 1024])
+def test_gzip_member_offsets(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(warc_reader, 'read_chunk_size', chunk_size)  # members spanning reads
+    path = str(tmp_path / 'members.warc.gz')
+    with open(path, 'wb') as f:
+        f.write(b''.join([gzip.compress(record) for record in records]))
+    with open(path, 'rb') as f:
+        members = list(iter_gzip_members(f))
+        assert [data for _, _, data in members] == records
+        for offset, length, data in members:
+            f.seek(offset)
+            assert zlib.decompressobj(31).decompress(f.read(length)) == data
+
+
+def test_plain_record_offsets(tmp_path):
+    path = str(tmp_path / 'plain.warc')
+    with open(path, 'wb') as f:
+        f.write(b''.join(records))
+    with open(path, 'rb') as f:
+        assert [data.rstrip(b'\r\n') for _, _, data in iter_plain_records(f)] == \
+               [record.rstrip(b'\r\n') for record in records]
+
+
+def test_iter_warc_pages(warc_path):
+    assert dict(iter_warc_pages(warc_path)) == expected
+
+
+def test_archive_lookups(warc_path, tmp_path):
+    archive = WARCArchive(str(tmp_path / 'index.db'))
+    assert archive.add_file(warc_path) == len(expected)
+    assert archive.add_file(warc_path) == 0  # unchanged file
+    for url in expected:
+        assert archive.get(url) == expected[url]
+    assert archive.get('HTTP://B.COM/?x=2&y=1') == expected['http://b.com/?y=1&x=2']  # normalized
+    assert archive.get('http://d.com/') is None and archive.get('http://missing.com/') is None
+    archive.close()
+
+
+def test_dechunk():
+    assert dechunk(b'3\r\nabc\r\n2;x\r\nde\r\n0\r\n\r\n') == b'abcde'
+    assert dechunk(b'<html>not chunked</html>') == b'<html>not chunked</html>'
+    assert dechunk(b'zz\r\nabc\r\n') == b'zz\r\nabc\r\n'
+
+
+def test_bad_responses():
+    assert response_html(b'HTTP/1.1 200 OK') is None  # no header end
+    assert response_html(http_response(b'not gzip', headers=b'Content-Type: text/html\r\nContent-Encoding: gzip\r\n'))\
+        is None
+    assert response_html(http_response(b'ok', headers=b'Content-Type: text/html; charset=nope\r\n')) == 'ok'
+
+
+def test_whole_file_gzip_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / 'whole.warc.gz')
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(b''.join(records)))
+    archive = WARCArchive(str(tmp_path / 'index.db'))
+    with pytest.raises(NotPerRecordGzip):
+        archive.add_file(path)
+    assert archive.get('http://a.com/') is None
+    archive.close()
+    monkeypatch.setattr(warc_reader, 'max_member_bytes', 100)  # never held whole in memory
+    monkeypatch.setattr(warc_reader, 'read_chunk_size', 16)
+    with pytest.raises(NotPerRecordGzip):
+        list(iter_warc_pages(path))